@@ -0,0 +1,364 @@
+import os
+import re
+import json
+import math
+import time
+import logging
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+from starlette.datastructures import Headers
+
+from serialization import dumps
+
+logger = logging.getLogger(__name__)
+
+# Solicitudes simultáneas en todo el proceso; las de baja prioridad solo usan una parte
+ADMISSION_MAX_INFLIGHT = int(os.environ.get('ADMISSION_MAX_INFLIGHT', '200'))
+ADMISSION_LOW_PRIORITY_SHARE = float(os.environ.get('ADMISSION_LOW_PRIORITY_SHARE', '0.5'))
+ADMISSION_MAX_KEYS = int(os.environ.get('ADMISSION_MAX_KEYS', '10000'))
+# Cuerpo máximo que se lee para obtener la cuenta (un login es pequeño)
+ADMISSION_ACCOUNT_BODY_LIMIT = int(os.environ.get('ADMISSION_ACCOUNT_BODY_LIMIT', '4096'))
+# Detrás de un proxy (Render, ingress) la IP real es la última de X-Forwarded-For
+TRUST_PROXY_HEADERS = os.environ.get('TRUST_PROXY_HEADERS', 'true').lower() in ('1', 'true', 'yes')
+
+PRIORITY_HIGH = 'high'      # lecturas del escáner: solo sus propios límites
+PRIORITY_NORMAL = 'normal'  # se rechaza al llegar al máximo del proceso
+PRIORITY_LOW = 'low'        # reportes y carnets: ceden capacidad antes que el resto
+
+KEY_IP = 'ip'
+KEY_DEVICE = 'device'
+KEY_ACCOUNT = 'account'  # IP + campo `email` del cuerpo JSON (login)
+ACCOUNT_FIELD = 'email'
+
+SHED_RATE = 'rate'
+SHED_CONCURRENCY = 'concurrency'
+SHED_PRIORITY = 'priority'
+
+
+class TokenBucket:
+    """Cubeta de fichas: `rate` fichas por segundo, hasta `burst` acumuladas"""
+
+    __slots__ = ('rate', 'burst', 'tokens', 'updated', 'window', 'window_count')
+
+    def __init__(self, rate: float, burst: float, now: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+        # Conteo por segundo para medir el pico real por clave
+        self.window = int(now)
+        self.window_count = 0
+
+    def wait(self, now: float) -> float:
+        """Segundos hasta tener una ficha (0 si ya la hay), sin consumirla"""
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self, now: float) -> float:
+        """Consume una ficha; devuelve 0 si se admite o los segundos a esperar"""
+        wait = self.wait(now)
+        if not wait:
+            self.tokens -= 1
+        return wait
+
+
+class AdmissionRule:
+    """
+    Límites de una clase de rutas: patrón y métodos, prioridad, tasa por
+    clave (fichas por segundo y ráfaga) y máximo de solicitudes simultáneas.
+    Con clave por dispositivo o por cuenta, `ip_rate` agrega un tope por IP
+    para todas sus claves: X-Device-Id y el email los envía el cliente y
+    rotarlos no evade el límite.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        pattern: str,
+        methods: Tuple[str, ...] = ('GET', 'POST', 'PUT', 'DELETE'),
+        priority: str = PRIORITY_NORMAL,
+        rate: Optional[float] = None,
+        burst: Optional[float] = None,
+        concurrency: Optional[int] = None,
+        key: str = KEY_IP,
+        ip_rate: Optional[float] = None,
+        ip_burst: Optional[float] = None
+    ):
+        self.name = name
+        self.pattern = re.compile(pattern)
+        self.methods = methods
+        self.priority = priority
+        self.rate = rate
+        self.burst = burst if burst is not None else rate
+        self.concurrency = concurrency
+        self.key = key
+        self.ip_rate = ip_rate
+        self.ip_burst = ip_burst if ip_burst is not None else ip_rate
+        self.buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self.ip_buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self.in_flight = 0
+        self.window = 0
+        self.window_count = 0
+        self.counters = {
+            'admitted': 0, 'shed_rate': 0, 'shed_concurrency': 0, 'shed_priority': 0,
+            'peak_in_flight': 0, 'peak_rate': 0, 'peak_key_rate': 0,
+        }
+
+    def matches(self, method: str, path: str) -> bool:
+        return method in self.methods and self.pattern.match(path) is not None
+
+
+def client_ip(scope) -> str:
+    """IP del cliente (la última de X-Forwarded-For detrás de un proxy confiable)"""
+    forwarded = Headers(scope=scope).get('x-forwarded-for') if TRUST_PROXY_HEADERS else None
+    if forwarded:
+        return forwarded.split(',')[-1].strip()
+    client = scope.get('client')
+    return client[0] if client else 'unknown'
+
+
+def client_key(scope, key_type: str, account: Optional[str] = None) -> str:
+    """
+    Clave del límite: IP + X-Device-Id (regla por dispositivo), IP + cuenta
+    (regla por cuenta) o la IP. La IP va en la clave para que nadie agote la
+    cubeta de un escáner o de una cuenta ajena enviando su identificador.
+    """
+    ip = client_ip(scope)
+    if key_type == KEY_DEVICE:
+        device = Headers(scope=scope).get('x-device-id')
+        if device:
+            return f"device:{ip}:{device}"
+    if key_type == KEY_ACCOUNT and account:
+        return f"account:{ip}:{account}"
+    return f"ip:{ip}"
+
+
+def account_from_body(body: bytes) -> Optional[str]:
+    """Cuenta (`email`) de un cuerpo JSON, o None si no se puede leer"""
+    try:
+        data = json.loads(body)
+    except ValueError:
+        return None
+    value = data.get(ACCOUNT_FIELD) if isinstance(data, dict) else None
+    return value.strip().lower() if isinstance(value, str) and value.strip() else None
+
+
+async def buffer_body(receive, limit: int = ADMISSION_ACCOUNT_BODY_LIMIT):
+    """
+    Lee el cuerpo (hasta `limit` bytes) y devuelve (cuerpo o None si es más
+    grande, receive que vuelve a entregar los mensajes leídos a la ruta).
+    """
+    messages, size = [], 0
+    while True:
+        message = await receive()
+        messages.append(message)
+        if message['type'] != 'http.request':
+            break
+        size += len(message.get('body', b''))
+        if size > limit or not message.get('more_body', False):
+            break
+    complete = size <= limit and not messages[-1].get('more_body', False)
+    body = b''.join(m.get('body', b'') for m in messages) if complete else None
+
+    async def replay():
+        if messages:
+            return messages.pop(0)
+        return await receive()
+
+    return body, replay
+
+
+class AdmissionController:
+    """
+    Control de admisión en memoria (por proceso).
+
+    Antes de ejecutar una ruta se decide, sin esperar: tasa por clave con
+    cubetas de fichas, cupo de solicitudes simultáneas por clase de ruta y
+    prioridad frente a la carga total. Lo que no entra se rechaza de inmediato
+    con 429 y Retry-After, en vez de encolarse y degradar todo el servicio.
+
+    Las cubetas de tasa se separan por campus con la partición del middleware.
+    Los cupos de concurrencia, la carga total y los contadores de `stats` son
+    del proceso a propósito: protegen el mismo proceso y el mismo event loop,
+    que todos los campus comparten.
+    """
+
+    def __init__(
+        self,
+        rules: List[AdmissionRule],
+        max_inflight: int = ADMISSION_MAX_INFLIGHT,
+        low_priority_share: float = ADMISSION_LOW_PRIORITY_SHARE,
+        max_keys: int = ADMISSION_MAX_KEYS,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.rules = rules
+        self.max_inflight = max_inflight
+        self.low_priority_limit = max(1, int(max_inflight * low_priority_share))
+        self.max_keys = max_keys
+        self.clock = clock
+        self.in_flight = 0
+        self.peak_in_flight = 0
+
+    def match(self, method: str, path: str) -> Optional[AdmissionRule]:
+        for rule in self.rules:
+            if rule.matches(method, path):
+                return rule
+        return None
+
+    def admit(self, rule: Optional[AdmissionRule], key: str, ip_key: str = '') -> Tuple[Optional[str], float]:
+        """
+        Decide si se admite la solicitud. Devuelve (None, 0) y reserva el cupo,
+        o (motivo, segundos para reintentar). Cada admisión requiere un `release`.
+        `ip_key` es la clave del tope por IP de las reglas con `ip_rate`.
+        """
+        priority = rule.priority if rule else PRIORITY_NORMAL
+        if priority == PRIORITY_LOW and self.in_flight >= self.low_priority_limit:
+            return self._shed(rule, SHED_PRIORITY, 1.0)
+        if priority == PRIORITY_NORMAL and self.in_flight >= self.max_inflight:
+            return self._shed(rule, SHED_PRIORITY, 1.0)
+
+        if rule is not None:
+            if rule.concurrency is not None and rule.in_flight >= rule.concurrency:
+                return self._shed(rule, SHED_CONCURRENCY, 1.0)
+            # Se revisan todas las cubetas antes de consumir: un rechazo no gasta fichas
+            now = self.clock()
+            buckets = []
+            if rule.ip_rate and ip_key:
+                buckets.append(self._bucket(rule.ip_buckets, ip_key, rule.ip_rate, rule.ip_burst, now))
+            if rule.rate:
+                buckets.append(self._key_bucket(rule, key, now))
+            wait = max((bucket.wait(now) for bucket in buckets), default=0.0)
+            if wait:
+                return self._shed(rule, SHED_RATE, wait)
+            for bucket in buckets:
+                bucket.tokens -= 1
+            rule.in_flight += 1
+            rule.counters['admitted'] += 1
+            rule.counters['peak_in_flight'] = max(rule.counters['peak_in_flight'], rule.in_flight)
+
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        return None, 0.0
+
+    def release(self, rule: Optional[AdmissionRule]):
+        self.in_flight -= 1
+        if rule is not None:
+            rule.in_flight -= 1
+
+    def _bucket(self, buckets: "OrderedDict[str, TokenBucket]", key: str, rate: float, burst: float, now: float) -> TokenBucket:
+        bucket = buckets.get(key)
+        if bucket is None:
+            bucket = buckets[key] = TokenBucket(rate, burst, now)
+            while len(buckets) > self.max_keys:
+                buckets.popitem(last=False)
+        else:
+            buckets.move_to_end(key)
+        return bucket
+
+    def _key_bucket(self, rule: AdmissionRule, key: str, now: float) -> TokenBucket:
+        bucket = self._bucket(rule.buckets, key, rule.rate, rule.burst, now)
+
+        # Picos por segundo (de la ruta y de la clave más activa) para dimensionar límites
+        second = int(now)
+        if bucket.window != second:
+            bucket.window, bucket.window_count = second, 0
+        bucket.window_count += 1
+        if rule.window != second:
+            rule.window, rule.window_count = second, 0
+        rule.window_count += 1
+        rule.counters['peak_key_rate'] = max(rule.counters['peak_key_rate'], bucket.window_count)
+        rule.counters['peak_rate'] = max(rule.counters['peak_rate'], rule.window_count)
+        return bucket
+
+    def _shed(self, rule: Optional[AdmissionRule], reason: str, retry_after: float) -> Tuple[str, float]:
+        if rule is not None:
+            rule.counters[f'shed_{reason}'] += 1
+        return reason, retry_after
+
+    def stats(self) -> dict:
+        return {
+            'in_flight': self.in_flight,
+            'peak_in_flight': self.peak_in_flight,
+            'max_inflight': self.max_inflight,
+            'low_priority_limit': self.low_priority_limit,
+            'rules': {
+                rule.name: {
+                    'priority': rule.priority,
+                    'rate': rule.rate,
+                    'burst': rule.burst,
+                    'concurrency': rule.concurrency,
+                    'in_flight': rule.in_flight,
+                    'keys': len(rule.buckets),
+                    'ip_rate': rule.ip_rate,
+                    'ip_keys': len(rule.ip_buckets),
+                    **rule.counters,
+                }
+                for rule in self.rules
+            },
+        }
+
+    def reset_peaks(self):
+        """Reinicia los picos (para medir una ventana nueva, ej. la entrada de la mañana)"""
+        self.peak_in_flight = self.in_flight
+        for rule in self.rules:
+            rule.counters.update(peak_in_flight=rule.in_flight, peak_rate=0, peak_key_rate=0)
+
+
+SHED_MESSAGES = {
+    SHED_RATE: "Demasiadas solicitudes, intente de nuevo en unos segundos",
+    SHED_CONCURRENCY: "Servicio ocupado, intente de nuevo",
+    SHED_PRIORITY: "Servicio ocupado, intente de nuevo",
+}
+
+
+class AdmissionMiddleware:
+    """
+    Middleware ASGI que aplica `AdmissionController` y responde 429 sin tocar la ruta.
+    `partition` (ej: el campus de la solicitud) antecede a las claves de tasa:
+    una IP o un dispositivo tiene cubetas separadas en cada campus.
+    """
+
+    def __init__(self, app, controller: AdmissionController, partition: Optional[Callable[[dict], str]] = None):
+        self.app = app
+        self.controller = controller
+        self.partition = partition
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or scope['method'] == 'OPTIONS':
+            await self.app(scope, receive, send)
+            return
+
+        rule = self.controller.match(scope['method'], scope['path'])
+        account = None
+        if rule is not None and rule.rate and rule.key == KEY_ACCOUNT:
+            body, receive = await buffer_body(receive)
+            account = account_from_body(body) if body is not None else None
+        key = client_key(scope, rule.key, account) if rule is not None and rule.rate else ''
+        ip_key = f"ip:{client_ip(scope)}" if rule is not None and rule.ip_rate else ''
+        prefix = self.partition(scope) if self.partition else ''
+        if prefix:
+            key = f"{prefix}|{key}" if key else ''
+            ip_key = f"{prefix}|{ip_key}" if ip_key else ''
+        reason, retry_after = self.controller.admit(rule, key, ip_key)
+        if reason:
+            body = dumps({"detail": SHED_MESSAGES[reason]})
+            await send({
+                'type': 'http.response.start',
+                'status': 429,
+                'headers': [
+                    (b'content-type', b'application/json'),
+                    (b'content-length', str(len(body)).encode()),
+                    (b'retry-after', str(max(1, math.ceil(retry_after))).encode()),
+                ],
+            })
+            await send({'type': 'http.response.body', 'body': body})
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release(rule)
@@ -0,0 +1,352 @@
+"""
+Reportes de asistencia para dirección.
+
+Carga la asistencia de un rango en un DataFrame columnar (una sola pasada
+del cursor por partición), la une con el padrón de usuarios y calcula las
+métricas agrupadas de forma vectorizada. Los resultados se guardan en caché
+por (reporte, rango, filtros).
+
+Uso offline (desde backend/):
+    python analytics.py chronic-absence --start 2026-01-15 --end 2026-06-30 --role student
+    python analytics.py lateness-by-category --start 2026-01-15 --end 2026-06-30 --csv
+"""
+import os
+import sys
+import time
+import json
+import asyncio
+import logging
+from collections import OrderedDict
+from datetime import date, datetime, timedelta, timezone
+from typing import Callable, Dict, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+import numpy as np
+import pandas as pd
+
+from attendance_calendar import SCHOOL_YEAR_START, SCHOOL_YEAR_END, ROSTER_ROLES
+
+logger = logging.getLogger(__name__)
+
+SCHOOL_TIMEZONE = ZoneInfo(os.environ.get('SCHOOL_TIMEZONE', 'America/Guatemala'))
+ANALYTICS_CACHE_TTL = float(os.environ.get('ANALYTICS_CACHE_TTL', '300'))
+# Rangos ya cerrados no cambian: se guardan más tiempo
+ANALYTICS_CLOSED_RANGE_TTL = float(os.environ.get('ANALYTICS_CLOSED_RANGE_TTL', '86400'))
+# Los rangos los elige el cliente: las cachés se acotan (LRU)
+ANALYTICS_FRAME_CACHE_SIZE = int(os.environ.get('ANALYTICS_FRAME_CACHE_SIZE', '8'))
+ANALYTICS_RESULT_CACHE_SIZE = int(os.environ.get('ANALYTICS_RESULT_CACHE_SIZE', '256'))
+CHRONIC_ABSENCE_THRESHOLD = float(os.environ.get('CHRONIC_ABSENCE_THRESHOLD', '90'))
+ARRIVAL_BUCKET_MINUTES = 15
+
+WEEKDAYS = ['Lunes', 'Martes', 'Miércoles', 'Jueves', 'Viernes', 'Sábado', 'Domingo']
+NO_CATEGORY = 'Sin categoría'
+
+
+class UnknownReport(KeyError):
+    """Reporte no definido"""
+
+
+class InvalidReportRange(ValueError):
+    """Fechas del reporte inválidas"""
+
+
+def parse_range(start_date: str, end_date: str) -> Tuple[date, date]:
+    """Fechas YYYY-MM-DD del reporte, o InvalidReportRange"""
+    try:
+        start, end = date.fromisoformat(start_date), date.fromisoformat(end_date)
+    except (TypeError, ValueError):
+        raise InvalidReportRange("Fecha inválida, use YYYY-MM-DD")
+    if end < start:
+        raise InvalidReportRange("La fecha final es anterior a la inicial")
+    return start, end
+
+
+def school_dates(start: date, end: date) -> pd.DatetimeIndex:
+    """Días hábiles (lunes a viernes) dentro del ciclo escolar en [start, end]"""
+    if end < start:
+        return pd.DatetimeIndex([])
+    days = np.arange(np.datetime64(start), np.datetime64(end) + 1)
+    weekdays = pd.DatetimeIndex(days[((days.astype(np.int64) + 3) % 7) < 5])
+    month_day = weekdays.strftime('%m-%d')
+    return weekdays[(month_day >= SCHOOL_YEAR_START) & (month_day <= SCHOOL_YEAR_END)]
+
+
+def school_days_between(start: date, end: date) -> int:
+    return len(school_dates(start, end))
+
+
+def _to_native(value):
+    """Convierte tipos NumPy/pandas (y NaN) a tipos JSON nativos"""
+    if isinstance(value, dict):
+        return {str(k): _to_native(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_to_native(v) for v in value]
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and np.isnan(value):
+        return None
+    return value
+
+
+# === Reportes (DataFrame de asistencia + padrón -> dict serializable) ===
+
+def lateness_by_category(frame: pd.DataFrame, roster: pd.DataFrame, ctx: dict) -> dict:
+    grouped = frame.groupby('category').agg(
+        records=('status', 'size'),
+        late=('is_late', 'sum'),
+        users=('user_id', 'nunique')
+    )
+    grouped['late_rate'] = (grouped['late'] / grouped['records'] * 100).round(2)
+    grouped = grouped.sort_values('late_rate', ascending=False)
+    return {"rows": grouped.reset_index().to_dict('records')}
+
+
+def lateness_trend(frame: pd.DataFrame, roster: pd.DataFrame, ctx: dict) -> dict:
+    if frame.empty:
+        return {"weeks": [], "series": {}}
+    weeks = frame['date'].dt.to_period('W-SUN').dt.start_time
+    pivot = (frame.assign(week=weeks)
+             .pivot_table(index='week', columns='category', values='is_late', aggfunc='mean')
+             .mul(100).round(2))
+    return {
+        "weeks": [w.strftime('%Y-%m-%d') for w in pivot.index],
+        "series": {str(c): pivot[c].replace({np.nan: None}).tolist() for c in pivot.columns}
+    }
+
+
+def chronic_absence(frame: pd.DataFrame, roster: pd.DataFrame, ctx: dict) -> dict:
+    school_days = ctx['school_days']
+    threshold = CHRONIC_ABSENCE_THRESHOLD if ctx.get('threshold') is None else ctx['threshold']
+    # Solo los días que cuentan en school_days (sin hoy, fines de semana ni vacaciones)
+    on_school_days = frame[frame['date'].isin(ctx['school_dates'])]
+    attended = on_school_days.groupby('user_id')['date'].nunique()
+    per_user = roster.set_index('user_id')
+    per_user['present_days'] = attended.reindex(per_user.index, fill_value=0)
+    per_user['absent_days'] = (school_days - per_user['present_days']).clip(lower=0)
+    per_user['attendance_rate'] = (
+        (per_user['present_days'] / school_days * 100).round(2) if school_days else 0.0
+    )
+    flagged = per_user[per_user['attendance_rate'] < threshold].sort_values('attendance_rate')
+    return {
+        "school_days": school_days,
+        "threshold": threshold,
+        "total_users": int(len(per_user)),
+        "rows": flagged.reset_index()[
+            ['user_id', 'full_name', 'category', 'present_days', 'absent_days', 'attendance_rate']
+        ].to_dict('records')
+    }
+
+
+def arrival_distribution(frame: pd.DataFrame, roster: pd.DataFrame, ctx: dict) -> dict:
+    minutes = frame['arrival_minute'].dropna().to_numpy()
+    if len(minutes) == 0:
+        return {"bucket_minutes": ARRIVAL_BUCKET_MINUTES, "buckets": [], "percentiles": {}}
+    buckets, counts = np.unique((minutes // ARRIVAL_BUCKET_MINUTES) * ARRIVAL_BUCKET_MINUTES, return_counts=True)
+    as_time = lambda m: f"{int(m) // 60:02d}:{int(m) % 60:02d}"
+    return {
+        "bucket_minutes": ARRIVAL_BUCKET_MINUTES,
+        "timezone": str(SCHOOL_TIMEZONE),
+        "buckets": [{"time": as_time(b), "count": int(c)} for b, c in zip(buckets, counts)],
+        "percentiles": {f"p{p}": as_time(v) for p, v in zip((10, 50, 90), np.percentile(minutes, [10, 50, 90]))}
+    }
+
+
+def by_weekday(frame: pd.DataFrame, roster: pd.DataFrame, ctx: dict) -> dict:
+    grouped = frame.groupby('weekday').agg(
+        records=('status', 'size'),
+        late=('is_late', 'sum'),
+        days=('date', 'nunique')
+    )
+    grouped['late_rate'] = (grouped['late'] / grouped['records'] * 100).round(2)
+    grouped['avg_per_day'] = (grouped['records'] / grouped['days']).round(2)
+    grouped.index = [WEEKDAYS[i] for i in grouped.index]
+    return {"rows": grouped.reset_index(names='weekday').to_dict('records')}
+
+
+def summary(frame: pd.DataFrame, roster: pd.DataFrame, ctx: dict) -> dict:
+    by_role = frame.groupby('user_role').agg(records=('status', 'size'), late=('is_late', 'sum'))
+    return {
+        "school_days": ctx['school_days'],
+        "records": int(len(frame)),
+        "users_with_records": int(frame['user_id'].nunique()),
+        "late": int(frame['is_late'].sum()),
+        "by_role": by_role.reset_index().to_dict('records')
+    }
+
+
+REPORTS: Dict[str, Callable[[pd.DataFrame, pd.DataFrame, dict], dict]] = {
+    'summary': summary,
+    'lateness-by-category': lateness_by_category,
+    'lateness-trend': lateness_trend,
+    'chronic-absence': chronic_absence,
+    'arrival-distribution': arrival_distribution,
+    'weekday': by_weekday,
+}
+
+
+def build_frames(users: list, records: list, inner: bool = False) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """(asistencia, padrón) como DataFrames; con `inner` solo la asistencia del padrón"""
+    roster = pd.DataFrame.from_records(users, columns=['id', 'full_name', 'role', 'category', 'grade'])
+    roster['category'] = roster['category'].fillna(roster['grade']).fillna(NO_CATEGORY)
+    roster = roster.rename(columns={'id': 'user_id'}).drop(columns=['grade'])
+
+    frame = pd.DataFrame.from_records(records, columns=['user_id', 'user_role', 'date', 'status', 'check_in_time'])
+    frame = frame.merge(roster[['user_id', 'category']], on='user_id', how='inner' if inner else 'left')
+    frame['category'] = frame['category'].fillna(NO_CATEGORY)
+    frame['date'] = pd.to_datetime(frame['date'])
+    frame['weekday'] = frame['date'].dt.weekday
+    frame['is_late'] = frame['status'] == 'late'
+    arrival = pd.to_datetime(frame['check_in_time'], utc=True, errors='coerce', format='ISO8601').dt.tz_convert(SCHOOL_TIMEZONE)
+    frame['arrival_minute'] = arrival.dt.hour * 60 + arrival.dt.minute
+    return frame, roster
+
+
+class AttendanceAnalytics:
+    """
+    Motor de reportes con caché LRU por (reporte, rango, filtros). Sin `role`,
+    el padrón son los roles que registran asistencia (no padres ni administradores).
+    """
+
+    def __init__(
+        self,
+        db,
+        store,
+        frame_cache_size: int = ANALYTICS_FRAME_CACHE_SIZE,
+        result_cache_size: int = ANALYTICS_RESULT_CACHE_SIZE
+    ):
+        self.db = db
+        self.store = store
+        self.frame_cache_size = frame_cache_size
+        self.result_cache_size = result_cache_size
+        self._frames: "OrderedDict[Tuple, Tuple[float, pd.DataFrame, pd.DataFrame]]" = OrderedDict()
+        self._results: "OrderedDict[Tuple, Tuple[float, dict]]" = OrderedDict()
+
+    def _ttl(self, end_date: str) -> float:
+        today = datetime.now(timezone.utc).strftime('%Y-%m-%d')
+        return ANALYTICS_CLOSED_RANGE_TTL if end_date < today else ANALYTICS_CACHE_TTL
+
+    async def load(self, start_date: str, end_date: str, role: Optional[str] = None, category: Optional[str] = None):
+        """(asistencia, padrón) del rango como DataFrames columnares"""
+        key = (start_date, end_date, role, category)
+        cached = _cache_get(self._frames, key)
+        if cached:
+            return cached[1], cached[2]
+
+        roles = {"$in": ROSTER_ROLES} if role is None else role
+        user_query = {'role': roles}
+        if category:
+            user_query['category'] = category
+        users = await self.db.users.find(
+            user_query, {"_id": 0, "id": 1, "full_name": 1, "role": 1, "category": 1, "grade": 1}
+        ).to_list(None)
+        query = {"date": {"$gte": start_date, "$lte": end_date}, "user_role": roles}
+        records = await self.store.find(
+            query, start_date, end_date, limit=None,
+            projection={"_id": 0, "user_id": 1, "user_role": 1, "date": 1, "status": 1, "check_in_time": 1},
+            db=self.db
+        )
+        # pandas bloquea: se arma en el pool de hilos para no detener el event loop
+        frame, roster = await asyncio.get_running_loop().run_in_executor(
+            None, build_frames, users, records, category is not None
+        )
+
+        _cache_put(self._frames, key, (time.monotonic() + self._ttl(end_date), frame, roster), self.frame_cache_size)
+        return frame, roster
+
+    async def report(
+        self,
+        name: str,
+        start_date: str,
+        end_date: str,
+        role: Optional[str] = None,
+        category: Optional[str] = None,
+        threshold: Optional[float] = None
+    ) -> dict:
+        if name not in REPORTS:
+            raise UnknownReport(name)
+        start, end = parse_range(start_date, end_date)
+        # Forma canónica: la misma fecha escrita distinto comparte caché
+        start_date, end_date = start.isoformat(), end.isoformat()
+        key = (name, start_date, end_date, role, category, threshold)
+        cached = _cache_get(self._results, key)
+        if cached:
+            return cached[1]
+
+        frame, roster = await self.load(start_date, end_date, role, category)
+        yesterday = datetime.now(timezone.utc).date() - timedelta(days=1)
+        dates = school_dates(start, min(end, yesterday))
+        ctx = {
+            'school_days': len(dates),
+            'school_dates': dates,
+            'threshold': threshold,
+        }
+        rows = await asyncio.get_running_loop().run_in_executor(
+            None, lambda: _to_native(REPORTS[name](frame, roster, ctx))
+        )
+        result = {
+            "report": name,
+            "start_date": start_date,
+            "end_date": end_date,
+            "filters": {"role": role, "category": category},
+            **rows
+        }
+        _cache_put(self._results, key, (time.monotonic() + self._ttl(end_date), result), self.result_cache_size)
+        return result
+
+    def clear(self):
+        self._frames.clear()
+        self._results.clear()
+
+
+def _cache_get(cache: OrderedDict, key):
+    """Entrada vigente (la marca como usada) o None"""
+    entry = cache.get(key)
+    if entry is None:
+        return None
+    if entry[0] <= time.monotonic():
+        del cache[key]
+        return None
+    cache.move_to_end(key)
+    return entry
+
+
+def _cache_put(cache: OrderedDict, key, entry, max_entries: int):
+    cache[key] = entry
+    cache.move_to_end(key)
+    while len(cache) > max_entries:
+        cache.popitem(last=False)
+
+
+def main(argv=None):
+    import argparse
+    from pathlib import Path
+    from dotenv import load_dotenv
+    from attendance_partitions import AttendancePartitions
+    from database import Database
+
+    parser = argparse.ArgumentParser(description="Reportes de asistencia LISFA")
+    parser.add_argument('report', choices=sorted(REPORTS))
+    parser.add_argument('--start', required=True, help="YYYY-MM-DD")
+    parser.add_argument('--end', required=True, help="YYYY-MM-DD")
+    parser.add_argument('--role')
+    parser.add_argument('--category')
+    parser.add_argument('--threshold', type=float)
+    parser.add_argument('--csv', action='store_true', help="Imprimir las filas como CSV")
+    args = parser.parse_args(argv)
+
+    load_dotenv(Path(__file__).parent / '.env')
+    database = Database(os.environ.get('MONGO_URL', 'mongodb://localhost:27017'), os.environ.get('DB_NAME', 'lisfa_attendance'))
+    analytics = AttendanceAnalytics(database.reports_db, AttendancePartitions(database.db))
+
+    result = asyncio.run(analytics.report(
+        args.report, args.start, args.end, args.role, args.category, args.threshold
+    ))
+    if args.csv and 'rows' in result:
+        pd.DataFrame(result['rows']).to_csv(sys.stdout, index=False)
+    else:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+    database.close()
+
+
+if __name__ == '__main__':
+    main()
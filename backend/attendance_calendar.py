@@ -0,0 +1,245 @@
+import os
+import logging
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+import numpy as np
+from pymongo import ASCENDING, UpdateOne
+
+logger = logging.getLogger(__name__)
+
+CALENDAR_COLLECTION = 'attendance_calendar'
+
+# Días de clases del ciclo (MM-DD, año calendario)
+SCHOOL_YEAR_START = os.environ.get('SCHOOL_YEAR_START', '01-15')
+SCHOOL_YEAR_END = os.environ.get('SCHOOL_YEAR_END', '10-31')
+
+# Roles que registran asistencia (tienen QR): el padrón por defecto de los resúmenes
+ROSTER_ROLES = ['student', 'teacher']
+
+MONTH_KEYS = [f"{m:02d}" for m in range(1, 13)]
+DAY_BITS = np.arange(31, dtype=np.int64)
+
+# Códigos del calendario por día
+CODE_PRESENT = 'p'
+CODE_LATE = 'l'
+CODE_ABSENT = 'a'
+CODE_NONE = '-'
+
+
+def _month_words(doc: Optional[dict], field: str) -> np.ndarray:
+    """Bitset mensual (12 enteros, bit d-1 = día d) de un documento del calendario"""
+    words = (doc or {}).get(field) or {}
+    return np.array([int(words.get(key, 0)) for key in MONTH_KEYS], dtype=np.int64)
+
+
+def _unpack(words: np.ndarray) -> np.ndarray:
+    """(..., 12) bitsets -> (..., 12, 31) booleanos"""
+    return ((words[..., None] >> DAY_BITS) & 1).astype(bool)
+
+
+def valid_days_mask(year: int) -> np.ndarray:
+    """(12, 31) True para las fechas que existen en el año"""
+    mask = np.zeros((12, 31), dtype=bool)
+    for month in range(1, 13):
+        next_month = date(year + (month == 12), month % 12 + 1, 1)
+        mask[month - 1, :(next_month - date(year, month, 1)).days] = True
+    return mask
+
+
+def school_days_mask(year: int, until: Optional[date] = None) -> np.ndarray:
+    """(12, 31) True para días hábiles (lunes a viernes) del ciclo hasta `until`"""
+    start = date.fromisoformat(f"{year}-{SCHOOL_YEAR_START}")
+    end = date.fromisoformat(f"{year}-{SCHOOL_YEAR_END}")
+    if until is not None:
+        end = min(end, until)
+    days = np.arange(np.datetime64(start), np.datetime64(end) + 1) if end >= start else np.array([], dtype='datetime64[D]')
+    # 1970-01-01 fue jueves: (días + 3) % 7 da 0 = lunes
+    weekdays = days[((days.astype(np.int64) + 3) % 7) < 5]
+    mask = np.zeros((12, 31), dtype=bool)
+    if len(weekdays):
+        months = weekdays.astype('datetime64[M]').astype(np.int64) % 12
+        day_index = (weekdays - weekdays.astype('datetime64[M]')).astype(np.int64)
+        mask[months, day_index] = True
+    return mask
+
+
+def longest_runs(attended: np.ndarray) -> np.ndarray:
+    """Racha más larga de True por fila de una matriz (n, días)"""
+    if attended.shape[1] == 0:
+        return np.zeros(attended.shape[0], dtype=np.int64)
+    counts = np.cumsum(attended, axis=1)
+    resets = np.maximum.accumulate(np.where(~attended, counts, 0), axis=1)
+    return (counts - resets).max(axis=1)
+
+
+def trailing_runs(attended: np.ndarray) -> np.ndarray:
+    """Racha actual (True consecutivos al final) por fila"""
+    if attended.shape[1] == 0:
+        return np.zeros(attended.shape[0], dtype=np.int64)
+    misses = ~attended[:, ::-1]
+    first_miss = np.where(misses.any(axis=1), misses.argmax(axis=1), attended.shape[1])
+    return first_miss
+
+
+def compute_metrics(present: np.ndarray, late: np.ndarray, school: np.ndarray) -> dict:
+    """
+    Métricas vectorizadas para n estudiantes.
+    present/late: (n, 12, 31) booleanos; school: (12, 31) días hábiles transcurridos.
+    """
+    attended = present & school
+    late = late & school
+    n = present.shape[0]
+    school_days = int(school.sum())
+
+    present_days = attended.sum(axis=(1, 2))
+    late_days = late.sum(axis=(1, 2))
+    absent_days = school_days - present_days
+    rate = np.divide(present_days * 100.0, school_days, out=np.zeros(n), where=school_days > 0)
+
+    flat = attended.reshape(n, -1)[:, school.reshape(-1)]
+    return {
+        'school_days': school_days,
+        'present_days': present_days,
+        'late_days': late_days,
+        'absent_days': absent_days,
+        'attendance_rate': np.round(rate, 2),
+        'current_streak': trailing_runs(flat),
+        'longest_streak': longest_runs(flat),
+        'monthly_present': attended.sum(axis=2),
+        'monthly_late': late.sum(axis=2),
+        'monthly_school_days': school.sum(axis=1),
+    }
+
+
+class AttendanceCalendar:
+    """
+    Calendario anual compacto por estudiante.
+
+    Un documento por (user_id, año) con dos bitsets por mes: `present`
+    (asistió, a tiempo o tarde) y `late`. Se actualiza en cada entrada con
+    `$bit`, sin leer el documento, y se decodifica con NumPy para calcular
+    rachas, porcentajes y desgloses mensuales de todo el colegio a la vez.
+    """
+
+    def __init__(self, db):
+        self.db = db
+
+    @property
+    def collection(self):
+        return self.db[CALENDAR_COLLECTION]
+
+    async def ensure_indexes(self):
+        await self.collection.create_index([("user_id", ASCENDING), ("year", ASCENDING)], unique=True)
+        await self.collection.create_index([("year", ASCENDING)])
+
+    async def mark(self, user_id: str, date_str: str, status: str):
+        """Marca la entrada de un día (YYYY-MM-DD)"""
+        year, month, day = date_str.split('-')
+        bit = {"or": 1 << (int(day) - 1)}
+        update = {f"present.{month}": bit}
+        if status == 'late':
+            update[f"late.{month}"] = bit
+        await self.collection.update_one(
+            {"user_id": user_id, "year": int(year)},
+            {"$bit": update},
+            upsert=True
+        )
+
+    async def rebuild(self, year: int, records: List[dict]) -> int:
+        """Recalcula los bitsets del año a partir de los registros de asistencia"""
+        words: Dict[str, Dict[str, Dict[str, int]]] = {}
+        for record in records:
+            _, month, day = record['date'].split('-')
+            entry = words.setdefault(record['user_id'], {"present": {}, "late": {}})
+            bit = 1 << (int(day) - 1)
+            entry["present"][month] = entry["present"].get(month, 0) | bit
+            if record.get('status') == 'late':
+                entry["late"][month] = entry["late"].get(month, 0) | bit
+
+        operations = [
+            UpdateOne(
+                {"user_id": user_id, "year": year},
+                {"$set": {"present": entry["present"], "late": entry["late"]}},
+                upsert=True
+            )
+            for user_id, entry in words.items()
+        ]
+        if operations:
+            await self.collection.bulk_write(operations, ordered=False)
+        logger.info(f"Calendario {year} reconstruido para {len(operations)} usuarios")
+        return len(operations)
+
+    def _elapsed_school_days(self, year: int) -> np.ndarray:
+        """Días hábiles ya concluidos (el día en curso no cuenta como ausencia)"""
+        yesterday = datetime.now(timezone.utc).date() - timedelta(days=1)
+        return school_days_mask(year, until=yesterday)
+
+    async def student_calendar(self, user_id: str, year: int) -> dict:
+        """Vista anual de un estudiante: códigos por día, resumen y desglose mensual"""
+        doc = await self.collection.find_one({"user_id": user_id, "year": year}, {"_id": 0})
+        present = _unpack(_month_words(doc, "present"))[None]
+        late = _unpack(_month_words(doc, "late"))[None]
+        school = self._elapsed_school_days(year)
+        metrics = compute_metrics(present, late, school)
+
+        valid = valid_days_mask(year)
+        codes = np.full((12, 31), CODE_NONE)
+        codes[school] = CODE_ABSENT
+        codes[present[0]] = CODE_PRESENT
+        codes[late[0]] = CODE_LATE
+        calendar = {
+            key: ''.join(codes[m][valid[m]]) for m, key in enumerate(MONTH_KEYS)
+        }
+
+        return {
+            "user_id": user_id,
+            "year": year,
+            "calendar": calendar,
+            "summary": {
+                "school_days": metrics['school_days'],
+                "present_days": int(metrics['present_days'][0]),
+                "late_days": int(metrics['late_days'][0]),
+                "absent_days": int(metrics['absent_days'][0]),
+                "attendance_rate": float(metrics['attendance_rate'][0]),
+                "current_streak": int(metrics['current_streak'][0]),
+                "longest_streak": int(metrics['longest_streak'][0]),
+            },
+            "monthly": [
+                {
+                    "month": m + 1,
+                    "school_days": int(metrics['monthly_school_days'][m]),
+                    "present": int(metrics['monthly_present'][0][m]),
+                    "late": int(metrics['monthly_late'][0][m]),
+                    "absent": int(metrics['monthly_school_days'][m] - metrics['monthly_present'][0][m]),
+                }
+                for m in range(12)
+            ]
+        }
+
+    async def school_summary(self, year: int, user_ids: List[str]) -> List[dict]:
+        """
+        Métricas del padrón `user_ids` en una sola pasada vectorizada. Quien no
+        tiene documento del calendario (nunca registró entrada) cuenta con cero
+        asistencias: son justamente los ausentes crónicos.
+        """
+        if not user_ids:
+            return []
+        docs = await self.collection.find({"year": year, "user_id": {"$in": user_ids}}, {"_id": 0}).to_list(None)
+        by_user = {doc['user_id']: doc for doc in docs}
+
+        present = _unpack(np.stack([_month_words(by_user.get(uid), "present") for uid in user_ids]))
+        late = _unpack(np.stack([_month_words(by_user.get(uid), "late") for uid in user_ids]))
+        metrics = compute_metrics(present, late, self._elapsed_school_days(year))
+        return [
+            {
+                "user_id": user_id,
+                "present_days": int(metrics['present_days'][i]),
+                "late_days": int(metrics['late_days'][i]),
+                "absent_days": int(metrics['absent_days'][i]),
+                "attendance_rate": float(metrics['attendance_rate'][i]),
+                "current_streak": int(metrics['current_streak'][i]),
+                "longest_streak": int(metrics['longest_streak'][i]),
+            }
+            for i, user_id in enumerate(user_ids)
+        ]
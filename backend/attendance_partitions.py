@@ -0,0 +1,205 @@
+import os
+import time
+import logging
+from datetime import datetime, timezone
+from typing import List, Optional
+
+from pymongo import ASCENDING
+from pymongo.errors import DuplicateKeyError, OperationFailure
+
+logger = logging.getLogger(__name__)
+
+# Tamaño de lote al mover registros del ciclo cerrado a su partición
+ARCHIVE_BATCH_SIZE = int(os.environ.get('ATTENDANCE_ARCHIVE_BATCH_SIZE', '1000'))
+# Los años archivados se releen tras este tiempo: otro worker pudo haber archivado
+PARTITIONS_CACHE_SECONDS = float(os.environ.get('ATTENDANCE_PARTITIONS_CACHE_SECONDS', '30'))
+
+PARTITIONS_COLLECTION = 'attendance_partitions'
+HOT_COLLECTION = 'attendance'
+DAY_INDEX = 'user_id_1_date_1'
+
+
+def year_of(date_str: str) -> int:
+    """Ciclo escolar (año calendario) de una fecha YYYY-MM-DD"""
+    return int(date_str[:4])
+
+
+class AttendancePartitions:
+    """
+    Almacenamiento de asistencia particionado por ciclo escolar.
+
+    El ciclo en curso vive en la colección `attendance` (conjunto caliente);
+    los ciclos cerrados se mueven a colecciones `attendance_AAAA`. Las consultas
+    se enrutan según el rango de fechas para tocar solo las particiones necesarias.
+    """
+
+    def __init__(self, db, cache_seconds: float = PARTITIONS_CACHE_SECONDS, clock=time.monotonic):
+        self.db = db
+        self.cache_seconds = cache_seconds
+        self.clock = clock
+        self._archived_years: Optional[List[int]] = None
+        self._archived_loaded_at = 0.0
+
+    @property
+    def hot(self):
+        return self.db[HOT_COLLECTION]
+
+    def collection_for_year(self, year: int):
+        return self.db[f"{HOT_COLLECTION}_{year}"]
+
+    async def ensure_indexes(self) -> bool:
+        """
+        Índices del conjunto caliente. (user_id, date) es único: un solo registro
+        por persona y día aunque dos escáneres lean a la vez. Si ya hay registros
+        duplicados de antes del índice, se deja el índice no único y se avisa: la
+        fusión borra registros y se ejecuta a mano (`merge_duplicate_days`).
+        Devuelve si el índice único quedó creado.
+        """
+        await self.hot.create_index([("date", ASCENDING)])
+        if await self._has_duplicate_days():
+            logger.warning(
+                "Hay registros de asistencia duplicados por día: se mantiene el índice no único. "
+                "Fusione con POST /api/attendance/merge-duplicates"
+            )
+            return False
+        try:
+            await self._create_day_index()
+        except (DuplicateKeyError, OperationFailure) as e:
+            if getattr(e, 'code', None) != 11000:
+                raise
+            # Un duplicado llegó entre la revisión y la creación: restaurar el índice anterior
+            await self.hot.create_index([("user_id", ASCENDING), ("date", ASCENDING)], name=DAY_INDEX)
+            logger.warning("No se pudo crear el índice único de asistencia por día: hay duplicados nuevos")
+            return False
+        return True
+
+    async def _has_duplicate_days(self) -> bool:
+        found = await self.hot.aggregate([
+            {"$group": {"_id": {"user_id": "$user_id", "date": "$date"}, "count": {"$sum": 1}}},
+            {"$match": {"count": {"$gt": 1}}},
+            {"$limit": 1},
+        ]).to_list(1)
+        return bool(found)
+
+    async def _create_day_index(self):
+        # Mismo nombre que el índice anterior (no único): se reemplaza
+        existing = (await self.hot.index_information()).get(DAY_INDEX)
+        if existing and existing.get('unique'):
+            return
+        if existing:
+            await self.hot.drop_index(DAY_INDEX)
+        await self.hot.create_index([("user_id", ASCENDING), ("date", ASCENDING)], unique=True, name=DAY_INDEX)
+
+    async def merge_duplicate_days(self) -> int:
+        """
+        Migración manual (borra registros): deja uno solo por (user_id, date) en
+        el conjunto caliente, conserva la primera entrada y le asigna la última
+        salida del día. Devuelve cuántos registros sobrantes se eliminaron.
+        """
+        groups = await self.hot.aggregate([
+            {"$group": {"_id": {"user_id": "$user_id", "date": "$date"}, "count": {"$sum": 1}}},
+            {"$match": {"count": {"$gt": 1}}},
+        ]).to_list(None)
+        removed = 0
+        for group in groups:
+            records = await self.hot.find(group['_id'], {"_id": 0}).sort("check_in_time", ASCENDING).to_list(None)
+            keep, extra = records[0], records[1:]
+            check_outs = [r['check_out_time'] for r in records if r.get('check_out_time')]
+            if check_outs:
+                await self.hot.update_one({"id": keep['id']}, {"$set": {"check_out_time": max(check_outs)}})
+            await self.hot.delete_many({"id": {"$in": [r['id'] for r in extra]}})
+            removed += len(extra)
+        return removed
+
+    async def archived_years(self) -> List[int]:
+        """
+        Años archivados. En caché por `cache_seconds`: el archivado puede correr
+        en otro worker, que solo puede invalidar su propia caché.
+        """
+        now = self.clock()
+        if self._archived_years is None or now - self._archived_loaded_at >= self.cache_seconds:
+            docs = await self.db[PARTITIONS_COLLECTION].find({}, {"_id": 0, "year": 1}).to_list(None)
+            self._archived_years = sorted(d['year'] for d in docs)
+            self._archived_loaded_at = now
+        return self._archived_years
+
+    async def collections_for_range(self, start_date: Optional[str] = None, end_date: Optional[str] = None):
+        """Colecciones que pueden contener registros dentro del rango"""
+        years = await self.archived_years()
+        if start_date:
+            years = [y for y in years if y >= year_of(start_date)]
+        if end_date:
+            years = [y for y in years if y <= year_of(end_date)]
+        # El conjunto caliente va primero: es donde están los registros recientes
+        return [self.hot] + [self.collection_for_year(y) for y in sorted(years, reverse=True)]
+
+    async def find(
+        self,
+        query: dict,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        limit: Optional[int] = 1000,
+        projection: Optional[dict] = None,
+        db=None
+    ) -> List[dict]:
+        """
+        Consulta las particiones del rango hasta completar `limit` registros (None = todos).
+        `db` permite leer a través de otra base del mismo cliente (ej. secundarios para reportes).
+        """
+        projection = projection or {"_id": 0}
+        results = []
+        for collection in await self.collections_for_range(start_date, end_date):
+            remaining = None if limit is None else limit - len(results)
+            if remaining is not None and remaining <= 0:
+                break
+            if db is not None:
+                collection = db[collection.name]
+            results.extend(await collection.find(query, projection).to_list(remaining))
+        return results
+
+    async def archive_year(self, year: int) -> dict:
+        """
+        Mueve los registros de un ciclo cerrado del conjunto caliente a su partición.
+        Es reanudable: si se interrumpe, volver a ejecutarlo completa el movimiento.
+        La partición se registra antes de mover nada, así las consultas de ese año
+        (de este y de los demás workers) leen ambas colecciones durante el movimiento.
+        """
+        current_year = datetime.now(timezone.utc).year
+        if year >= current_year:
+            raise ValueError("Solo se pueden archivar ciclos escolares cerrados")
+
+        target = self.collection_for_year(year)
+        year_query = {"date": {"$gte": f"{year}-01-01", "$lte": f"{year}-12-31"}}
+        moved = 0
+        await self.db[PARTITIONS_COLLECTION].update_one(
+            {"year": year},
+            {"$setOnInsert": {"year": year, "collection": target.name, "records": 0}},
+            upsert=True
+        )
+        self._archived_years = None
+
+        while True:
+            batch = await self.hot.find(year_query, {"_id": 0}).to_list(ARCHIVE_BATCH_SIZE)
+            if not batch:
+                break
+            ids = [doc['id'] for doc in batch]
+            # Evitar duplicados si una ejecución anterior se interrumpió
+            already = set(await target.distinct("id", {"id": {"$in": ids}}))
+            pending = [doc for doc in batch if doc['id'] not in already]
+            if pending:
+                await target.insert_many(pending, ordered=False)
+            await self.hot.delete_many({"id": {"$in": ids}})
+            moved += len(batch)
+
+        await target.create_index([("user_id", ASCENDING), ("date", ASCENDING)])
+        await self.db[PARTITIONS_COLLECTION].update_one(
+            {"year": year},
+            {"$set": {"archived_at": datetime.now(timezone.utc).isoformat()}, "$inc": {"records": moved}}
+        )
+        logger.info(f"Ciclo {year} archivado: {moved} registros movidos a {target.name}")
+        return {"year": year, "collection": target.name, "moved": moved}
+
+    async def list_partitions(self) -> List[dict]:
+        """Particiones archivadas con su tamaño"""
+        docs = await self.db[PARTITIONS_COLLECTION].find({}, {"_id": 0}).to_list(None)
+        return sorted(docs, key=lambda d: d['year'])
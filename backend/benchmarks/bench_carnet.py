@@ -0,0 +1,53 @@
+"""
+Benchmark de generación de carnets: QR vectorial vs QR raster (PNG).
+
+Mide tiempo por carnet y tamaño del PDF, para un carnet suelto y para
+un lote en un solo PDF.
+
+Uso (desde backend/):  python benchmarks/bench_carnet.py [carnets]
+"""
+import sys
+import time
+import uuid
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from carnet_generator import CarnetGenerator
+
+
+def make_users(count: int):
+    return [{
+        'id': str(uuid.uuid4()),
+        'full_name': f'Estudiante de Prueba Número {i}',
+        'student_id': f'LISFA-{i:04d}',
+        'category': '1ro. Primaria',
+        'role': 'student',
+    } for i in range(count)]
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    users = make_users(count)
+    # Calentar caché del logo y fuentes
+    CarnetGenerator.generate_carnet(users[0])
+
+    print(f"{count} carnets\n")
+    print(f"{'modo':<8} {'ms/carnet':>10} {'bytes/carnet':>13} {'lote ms/carnet':>15} {'lote bytes/carnet':>18}")
+    for mode in ('raster', 'vector'):
+        # Sin matrices QR memorizadas de la medición anterior: cada modo parte en frío
+        CarnetGenerator.qr_matrix.cache_clear()
+        start = time.perf_counter()
+        sizes = [CarnetGenerator.generate_carnet(u, qr_mode=mode).getbuffer().nbytes for u in users]
+        single_ms = (time.perf_counter() - start) * 1000 / count
+
+        CarnetGenerator.qr_matrix.cache_clear()
+        start = time.perf_counter()
+        batch = CarnetGenerator.generate_carnets(users, qr_mode=mode).getbuffer().nbytes
+        batch_ms = (time.perf_counter() - start) * 1000 / count
+
+        print(f"{mode:<8} {single_ms:>10.2f} {sum(sizes) / count:>13,.0f} {batch_ms:>15.2f} {batch / count:>18,.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""
+Benchmark de serialización y compresión de listados.
+
+Compara el camino anterior (validar cada fila con pydantic + json estándar)
+con el camino rápido (filas confiables + orjson) y los tamaños de respuesta
+con gzip/brotli y formato columnar.
+
+Uso (desde backend/):  python benchmarks/bench_serialization.py [filas]
+"""
+import sys
+import json
+import time
+import uuid
+from pathlib import Path
+from typing import List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+from server import User, USER_FIELDS, generate_qr_code
+from serialization import dumps, shape_rows, to_columnar
+from compression import compress, brotli
+
+
+def make_rows(count: int) -> List[dict]:
+    # QR distintos para no sobrestimar la compresión
+    qrs = [generate_qr_code(str(uuid.uuid4())) for _ in range(min(count, 100))]
+    return [{
+        'id': str(uuid.uuid4()),
+        'email': f'estudiante{i}@lisfa.edu',
+        'full_name': f'Estudiante Número {i}',
+        'role': 'student',
+        'photo_url': None,
+        'student_id': f'LISFA-{i:04d}',
+        'category': '1ro. Primaria',
+        'grade': None,
+        'section': None,
+        'qr_code': qrs[i % len(qrs)],
+        'created_at': '2026-01-15T14:00:00+00:00',
+    } for i in range(count)]
+
+
+def timed(label: str, fn, repeat: int = 5):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    print(f"{label:<45} {best * 1000:9.2f} ms")
+    return result
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    rows = make_rows(count)
+    adapter = TypeAdapter(List[User])
+    print(f"{count} usuarios\n")
+
+    def validated():
+        users = adapter.validate_python(rows)
+        return json.dumps(jsonable_encoder(users)).encode()
+
+    def fast():
+        return dumps(shape_rows([dict(r) for r in rows], USER_FIELDS))
+
+    timed("pydantic + json (response_model)", validated)
+    body = timed("filas confiables + dumps", fast)
+    slim_fields = [f for f in USER_FIELDS if f != 'qr_code']
+    slim = dumps(shape_rows([{k: v for k, v in r.items() if k != 'qr_code'} for r in rows], slim_fields))
+    columnar = dumps(to_columnar(rows, slim_fields))
+
+    print()
+    print(f"{'JSON completo':<45} {len(body):>10,} bytes")
+    print(f"{'JSON completo gzip':<45} {len(compress(body, 'gzip')):>10,} bytes")
+    if brotli is not None:
+        print(f"{'JSON completo brotli':<45} {len(compress(body, 'br')):>10,} bytes")
+    print(f"{'?fields sin qr_code':<45} {len(slim):>10,} bytes")
+    print(f"{'?fields sin qr_code + format=columnar':<45} {len(columnar):>10,} bytes")
+    print(f"{'columnar gzip':<45} {len(compress(columnar, 'gzip')):>10,} bytes")
+
+
+if __name__ == '__main__':
+    main()
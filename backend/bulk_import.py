@@ -0,0 +1,200 @@
+import os
+import uuid
+import asyncio
+import logging
+from io import BytesIO
+from datetime import datetime, timezone
+from typing import Callable, List
+
+import numpy as np
+import pandas as pd
+from email_validator import EmailNotValidError, validate_email
+from pymongo.errors import BulkWriteError
+
+from carnet_generator import CATEGORIAS_ESTUDIANTES, CATEGORIAS_PERSONAL
+from sequence_allocator import STUDENT_SEQUENCE, format_student_id
+
+logger = logging.getLogger(__name__)
+
+IMPORT_BATCH_SIZE = int(os.environ.get('IMPORT_BATCH_SIZE', '200'))
+IMPORT_MAX_ROWS = int(os.environ.get('IMPORT_MAX_ROWS', '5000'))
+
+VALID_ROLES = ['admin', 'teacher', 'student', 'parent', 'staff']
+QR_ROLES = ['student', 'teacher']
+
+# Encabezados aceptados en español -> nombre interno
+COLUMN_ALIASES = {
+    'correo': 'email',
+    'nombre': 'full_name',
+    'nombre_completo': 'full_name',
+    'rol': 'role',
+    'categoria': 'category',
+    'categoría': 'category',
+    'grado': 'category',
+    'contraseña': 'password',
+    'contrasena': 'password',
+}
+REQUIRED_COLUMNS = ['email', 'full_name', 'role', 'password']
+
+
+class SpreadsheetError(ValueError):
+    """Archivo de importación ilegible o sin las columnas requeridas"""
+
+
+def read_spreadsheet(content: bytes, filename: str) -> pd.DataFrame:
+    """Lee un CSV o XLSX como texto, normalizando encabezados"""
+    name = (filename or '').lower()
+    if name.endswith('.xls'):
+        # El formato binario antiguo requiere xlrd, que no es dependencia del proyecto
+        raise SpreadsheetError("Formato .xls no soportado: guarde el archivo como XLSX o CSV")
+    try:
+        if name.endswith('.xlsx'):
+            df = pd.read_excel(BytesIO(content), dtype=str, keep_default_na=False)
+        else:
+            df = pd.read_csv(BytesIO(content), dtype=str, keep_default_na=False, encoding='utf-8-sig')
+    except ImportError:
+        raise SpreadsheetError("Para importar XLSX instale openpyxl o use CSV")
+    except Exception as e:
+        raise SpreadsheetError(f"No se pudo leer el archivo: {e}")
+
+    df.columns = [str(c).strip().lower().replace(' ', '_') for c in df.columns]
+    df = df.rename(columns=COLUMN_ALIASES)
+    missing = [c for c in REQUIRED_COLUMNS if c not in df.columns]
+    if missing:
+        raise SpreadsheetError(f"Faltan columnas: {', '.join(missing)}")
+    if len(df) > IMPORT_MAX_ROWS:
+        raise SpreadsheetError(f"Máximo {IMPORT_MAX_ROWS} filas por archivo")
+    if 'category' not in df.columns:
+        df['category'] = ''
+
+    for column in ['email', 'full_name', 'role', 'category', 'password']:
+        df[column] = df[column].astype(str).str.strip()
+    df['email'] = df['email'].str.lower()
+    df['role'] = df['role'].str.lower()
+    # Fila del archivo (el encabezado es la fila 1)
+    df['row'] = np.arange(len(df)) + 2
+    return df
+
+
+def is_valid_email(email: str) -> bool:
+    """La misma validación que EmailStr del modelo User (sin consultar DNS)"""
+    try:
+        validate_email(email, check_deliverability=False)
+    except EmailNotValidError:
+        return False
+    return True
+
+
+def validate_rows(df: pd.DataFrame, existing_emails: List[str]) -> pd.Series:
+    """
+    Valida todas las filas de forma vectorizada.
+    Retorna una serie con el primer error de cada fila ('' si es válida).
+    """
+    staff_roles = df['role'].isin(['teacher', 'admin', 'staff'])
+    has_category = df['category'] != ''
+    conditions = [
+        df['full_name'] == '',
+        ~df['email'].map(is_valid_email),
+        ~df['role'].isin(VALID_ROLES),
+        df['password'] == '',
+        has_category & (df['role'] == 'student') & ~df['category'].isin(CATEGORIAS_ESTUDIANTES),
+        has_category & staff_roles & ~df['category'].isin(CATEGORIAS_PERSONAL),
+        df['email'].duplicated(keep='first'),
+        df['email'].isin(existing_emails),
+    ]
+    messages = [
+        "Nombre requerido",
+        "Email inválido",
+        "Rol inválido",
+        "Contraseña requerida",
+        "Categoría de estudiante inválida",
+        "Categoría de personal inválida",
+        "Email duplicado en el archivo",
+        "Email ya registrado",
+    ]
+    return pd.Series(np.select(conditions, messages, default=''), index=df.index)
+
+
+def _build_documents(rows: List[dict], hash_fn: Callable, qr_fn: Callable) -> List[dict]:
+    """Hash de contraseñas y QR de una tanda (se ejecuta en el pool de hilos)"""
+    timestamp = datetime.now(timezone.utc).isoformat()
+    docs = []
+    for row in rows:
+        user_id = str(uuid.uuid4())
+        docs.append({
+            'id': user_id,
+            'email': row['email'],
+            'full_name': row['full_name'],
+            'role': row['role'],
+            'photo_url': None,
+            'student_id': row.get('student_id'),
+            'category': row['category'] or None,
+            'grade': None,
+            'section': None,
+            'qr_code': qr_fn(user_id) if row['role'] in QR_ROLES else None,
+            'timestamp': timestamp,
+            'password': hash_fn(row['password']),
+        })
+    return docs
+
+
+async def import_users(
+    db,
+    df: pd.DataFrame,
+    hash_fn: Callable,
+    qr_fn: Callable,
+    allocator,
+    dry_run: bool = False
+) -> dict:
+    """Valida e inserta usuarios por lotes; retorna un reporte por fila"""
+    existing = await db.users.find({"email": {"$in": df['email'].tolist()}}, {"_id": 0, "email": 1}).to_list(None)
+    df = df.assign(error=validate_rows(df, [u['email'] for u in existing]))
+
+    report = {
+        row['row']: {"row": int(row['row']), "email": row['email'], "status": "error", "error": row['error']}
+        for row in df.loc[df['error'] != '', ['row', 'email', 'error']].to_dict('records')
+    }
+    valid = df.loc[df['error'] == ''].copy()
+
+    if dry_run:
+        for row in valid.to_dict('records'):
+            report[row['row']] = {"row": int(row['row']), "email": row['email'], "status": "valid"}
+    else:
+        is_student = valid['role'] == 'student'
+        numbers = await allocator.reserve(STUDENT_SEQUENCE, int(is_student.sum()))
+        valid['student_id'] = None
+        valid.loc[is_student, 'student_id'] = [format_student_id(n) for n in numbers]
+
+        loop = asyncio.get_running_loop()
+        records = valid.to_dict('records')
+        for start in range(0, len(records), IMPORT_BATCH_SIZE):
+            batch = records[start:start + IMPORT_BATCH_SIZE]
+            docs = await loop.run_in_executor(None, _build_documents, batch, hash_fn, qr_fn)
+            failed = {}
+            try:
+                await db.users.insert_many(docs, ordered=False)
+            except BulkWriteError as e:
+                failed = {err['index']: err.get('errmsg', 'Error al insertar') for err in e.details.get('writeErrors', [])}
+            for index, (row, doc) in enumerate(zip(batch, docs)):
+                if index in failed:
+                    report[row['row']] = {"row": int(row['row']), "email": row['email'], "status": "error", "error": failed[index]}
+                else:
+                    report[row['row']] = {
+                        "row": int(row['row']),
+                        "email": row['email'],
+                        "status": "created",
+                        "id": doc['id'],
+                        "student_id": doc['student_id']
+                    }
+
+    rows = [report[key] for key in sorted(report)]
+    created = sum(1 for r in rows if r['status'] == 'created')
+    failed_count = sum(1 for r in rows if r['status'] == 'error')
+    logger.info(f"Importación de usuarios: {created} creados, {failed_count} con error")
+    return {
+        "total": len(rows),
+        "created": created,
+        "failed": failed_count,
+        "dry_run": dry_run,
+        "rows": rows
+    }
@@ -3,14 +3,21 @@ from reportlab.lib.units import cm, mm
 from reportlab.pdfgen import canvas
 from reportlab.lib.utils import ImageReader
 from reportlab.lib import colors
+from reportlab import rl_config
+from reportlab.lib.rl_accel import fp_str
 from PIL import Image, ImageDraw
 from io import BytesIO
 import qrcode
 import os
+from datetime import datetime
+from functools import lru_cache
 from pathlib import Path
 
 ROOT_DIR = Path(__file__).parent
 
+# Los PDF se envían por HTTP: streams binarios sin la expansión de ASCII85 (~25%)
+rl_config.useA85 = 0
+
 # Dimensiones del carnet: 8.5 cm alto x 5.5 cm ancho (VERTICAL)
 CARD_WIDTH = 55 * mm
 CARD_HEIGHT = 85 * mm
@@ -38,6 +45,78 @@ CATEGORIAS_PERSONAL = [
     "Personal de Servicio", "Personal de Librería", "Coordinación", "Docente"
 ]
 
+# Geometría fija del diseño
+HEADER_HEIGHT = 12 * mm
+BADGE_WIDTH = 22 * mm
+BADGE_HEIGHT = 4 * mm
+BADGE_X = (CARD_WIDTH - BADGE_WIDTH) / 2
+# El badge queda 8mm sobre el título "ESCANEAR PARA ASISTENCIA"
+BADGE_OFFSET = 8 * mm
+# QR más grande - 28mm (antes era 14mm)
+QR_SIZE = 28 * mm
+QR_X = (CARD_WIDTH - QR_SIZE) / 2
+QR_OFFSET = -QR_SIZE - 3 * mm
+
+# Modo de dibujo del QR: 'vector' (módulos como rectángulos) o 'raster' (PNG)
+QR_RENDER_MODE = os.environ.get('QR_RENDER_MODE', 'vector')
+
+FORM_BASE = "carnet_base"
+FORM_BLOCK = "carnet_block"
+
+# Textos configurables del diseño
+CARNET_YEAR = os.environ.get('CARNET_YEAR', '')
+CARNET_VALID_UNTIL = os.environ.get('CARNET_VALID_UNTIL', '')
+INSTITUTION_LINES = ("LICEO SAN FRANCISCO", "DE ASÍS - LISFA")
+CONTACT_PHONE = os.environ.get('CARNET_CONTACT', '+502 30624815')
+FOOTER_TEXT = "Liceo San Francisco de Asís - LISFA"
+DEFAULT_LOGO_PATH = ROOT_DIR / "static" / "logos" / "logo.jpeg"
+
+
+@lru_cache(maxsize=16)
+def _optimized_logo(logo_path: str, max_size: int, mtime: float):
+    """Logo optimizado en caché (se invalida si cambia la fecha del archivo)"""
+    logo_buffer = CarnetGenerator.optimize_logo(logo_path, max_size)
+    return logo_buffer.getvalue() if logo_buffer else None
+
+
+class CarnetTemplate:
+    """
+    Diseño del carnet: textos e imagen de la parte estática.
+    Año y validez salen de CARNET_YEAR / CARNET_VALID_UNTIL o del año en curso
+    al momento de dibujar (un worker que sigue corriendo tras Año Nuevo no
+    imprime el año anterior).
+    """
+
+    def __init__(
+        self,
+        year: str = None,
+        valid_until: str = None,
+        institution_lines: tuple = INSTITUTION_LINES,
+        contact: str = CONTACT_PHONE,
+        footer: str = FOOTER_TEXT,
+        logo_path=DEFAULT_LOGO_PATH
+    ):
+        self._year = year or CARNET_YEAR
+        self._valid_until = valid_until or CARNET_VALID_UNTIL
+        self.institution_lines = tuple(institution_lines)
+        self.contact = contact
+        self.footer = footer
+        self.logo_path = Path(logo_path)
+
+    @property
+    def year(self) -> str:
+        return str(self._year or datetime.now().year)
+
+    @property
+    def valid_until(self) -> str:
+        return self._valid_until or f"Dic {self.year}"
+
+    def logo_bytes(self):
+        if not self.logo_path.exists():
+            return None
+        return _optimized_logo(str(self.logo_path), 80, self.logo_path.stat().st_mtime)
+
+
 class CarnetGenerator:
     
     @staticmethod
@@ -60,6 +139,46 @@ class CarnetGenerator:
         buffer.seek(0)
         return buffer
     
+    @staticmethod
+    @lru_cache(maxsize=2048)
+    def qr_matrix(data: str) -> tuple:
+        """Matriz de módulos del QR (incluye el margen), mismos parámetros que la imagen"""
+        qr = qrcode.QRCode(
+            version=2,
+            error_correction=qrcode.constants.ERROR_CORRECT_H,
+            box_size=1,
+            border=2,
+        )
+        qr.add_data(data)
+        qr.make(fit=True)
+        return tuple(tuple(row) for row in qr.get_matrix())
+
+    @staticmethod
+    def draw_qr_vector(c, data: str, x: float, y: float, size: float):
+        """
+        Dibuja el QR directamente como rectángulos vectoriales: sin rasterizar,
+        sin reescalar (bordes nítidos) y sin codificar/decodificar PNG.
+        Los módulos negros contiguos de cada fila se unen en un solo rectángulo,
+        en coordenadas enteras de módulo (una transformación escala al tamaño final).
+        """
+        matrix = CarnetGenerator.qr_matrix(data)
+        count = len(matrix)
+        module = size / count
+        ops = [f"q 0 g {fp_str(module, 0, 0, module, x, y)} cm"]
+        for row_index, row in enumerate(matrix):
+            row_y = count - 1 - row_index
+            col = 0
+            while col < count:
+                if not row[col]:
+                    col += 1
+                    continue
+                start = col
+                while col < count and row[col]:
+                    col += 1
+                ops.append(f"{start} {row_y} {col - start} 1 re")
+        ops.append("f Q")
+        c.addLiteral("\n".join(ops))
+
     @staticmethod
     def optimize_logo(logo_path: str, max_size: int = 80) -> BytesIO:
         """Optimiza el logo para reducir tamaño"""
@@ -76,62 +195,123 @@ class CarnetGenerator:
             return None
     
     @staticmethod
-    def generate_carnet(user_data: dict) -> BytesIO:
+    def generate_carnet(user_data: dict, template: "CarnetTemplate" = None, qr_mode: str = None) -> BytesIO:
         """
         Genera carnet con QR GRANDE para mejor lectura del escáner Steren COM-5970
         Sin código de barras - solo QR
         """
+        return CarnetGenerator.generate_carnets([user_data], template, qr_mode)
+
+    @staticmethod
+    def generate_carnets(users: list, template: "CarnetTemplate" = None, qr_mode: str = None) -> BytesIO:
+        """
+        Genera un PDF con un carnet por página.
+        La parte estática del diseño se dibuja una sola vez como form XObject
+        y cada página solo agrega los datos del usuario.
+        """
+        template = template or DEFAULT_TEMPLATE
+        qr_mode = qr_mode or QR_RENDER_MODE
         buffer = BytesIO()
         c = canvas.Canvas(buffer, pagesize=(CARD_WIDTH, CARD_HEIGHT))
-        
-        # === FONDO BLANCO ===
+        CarnetGenerator._define_template_forms(c, template)
+
+        for user_data in users:
+            CarnetGenerator._draw_user_layer(c, user_data, qr_mode)
+            c.showPage()
+
+        c.save()
+        buffer.seek(0)
+        return buffer
+
+    @staticmethod
+    def _define_template_forms(c, template: "CarnetTemplate"):
+        """Forms reutilizables: base (fondo, header, footer) y bloque QR/contacto"""
+        # === BASE: FONDO BLANCO, HEADER AZUL, LOGO, TEXTOS, FOOTER ===
+        c.beginForm(FORM_BASE)
+        c.saveState()
         c.setFillColorRGB(1, 1, 1)
         c.rect(0, 0, CARD_WIDTH, CARD_HEIGHT, fill=True, stroke=False)
-        
-        # === HEADER AZUL ===
-        header_height = 12 * mm
+
         c.setFillColorRGB(*COLOR_AZUL_HEADER)
-        c.rect(0, CARD_HEIGHT - header_height, CARD_WIDTH, header_height, fill=True, stroke=False)
-        
-        # === LOGO EN HEADER ===
-        logo_path = ROOT_DIR / "static" / "logos" / "logo.jpeg"
+        c.rect(0, CARD_HEIGHT - HEADER_HEIGHT, CARD_WIDTH, HEADER_HEIGHT, fill=True, stroke=False)
+
         logo_size = 9 * mm
         logo_x = 2 * mm
-        logo_y = CARD_HEIGHT - header_height + 1.5 * mm
-        
-        if logo_path.exists():
+        logo_y = CARD_HEIGHT - HEADER_HEIGHT + 1.5 * mm
+        logo_bytes = template.logo_bytes()
+        if logo_bytes:
             try:
-                logo_buffer = CarnetGenerator.optimize_logo(str(logo_path), 80)
-                if logo_buffer:
-                    c.drawImage(
-                        ImageReader(logo_buffer),
-                        logo_x, logo_y,
-                        width=logo_size, height=logo_size,
-                        preserveAspectRatio=True, mask='auto'
-                    )
+                c.drawImage(
+                    ImageReader(BytesIO(logo_bytes)),
+                    logo_x, logo_y,
+                    width=logo_size, height=logo_size,
+                    preserveAspectRatio=True, mask='auto'
+                )
             except Exception:
                 pass
-        
-        # === TEXTO DEL HEADER ===
+
         c.setFillColorRGB(1, 1, 1)
         c.setFont("Helvetica-Bold", 5)
         inst_x = logo_x + logo_size + 1*mm
-        c.drawString(inst_x, CARD_HEIGHT - 4.5*mm, "LICEO SAN FRANCISCO")
-        c.drawString(inst_x, CARD_HEIGHT - 7.5*mm, "DE ASÍS - LISFA")
-        
+        line1, line2 = template.institution_lines
+        c.drawString(inst_x, CARD_HEIGHT - 4.5*mm, line1)
+        c.drawString(inst_x, CARD_HEIGHT - 7.5*mm, line2)
+
         c.setFont("Helvetica-Bold", 7)
-        c.drawRightString(CARD_WIDTH - 2*mm, CARD_HEIGHT - 5*mm, "2026")
+        c.drawRightString(CARD_WIDTH - 2*mm, CARD_HEIGHT - 5*mm, template.year)
         c.setFont("Helvetica", 5)
         c.drawRightString(CARD_WIDTH - 2*mm, CARD_HEIGHT - 8.5*mm, "ID")
-        
+
+        c.setFillColorRGB(*COLOR_TEXTO_GRIS)
+        c.setFont("Helvetica", 3.5)
+        c.drawCentredString(CARD_WIDTH/2, 3*mm, template.footer)
+        c.restoreState()
+        c.endForm()
+
+        # === BLOQUE: BADGE, QR Y CONTACTO (relativo a la línea del título del QR) ===
+        c.beginForm(FORM_BLOCK, lowerx=0, lowery=-CARD_HEIGHT, upperx=CARD_WIDTH, uppery=CARD_HEIGHT)
+        c.saveState()
+        c.setFillColorRGB(0.15, 0.2, 0.3)
+        c.roundRect(BADGE_X, BADGE_OFFSET, BADGE_WIDTH, BADGE_HEIGHT, 1.5*mm, fill=True, stroke=False)
+
+        c.setFillColorRGB(*COLOR_TEXTO_OSCURO)
+        c.setFont("Helvetica-Bold", 6)
+        c.drawCentredString(CARD_WIDTH/2, 0, "ESCANEAR PARA ASISTENCIA")
+
+        # Borde alrededor del QR para mejor contraste
+        c.setStrokeColorRGB(0.8, 0.8, 0.8)
+        c.setLineWidth(0.5)
+        c.rect(QR_X - 1*mm, QR_OFFSET - 1*mm, QR_SIZE + 2*mm, QR_SIZE + 2*mm, fill=False, stroke=True)
+
+        info_y = QR_OFFSET - 7*mm
+        c.setFont("Helvetica", 5)
+        c.setFillColorRGB(*COLOR_TEXTO_GRIS)
+        c.drawString(3*mm, info_y, "Contacto:")
+        c.setFillColorRGB(*COLOR_TEXTO_OSCURO)
+        c.drawRightString(CARD_WIDTH - 3*mm, info_y, template.contact)
+
+        info_y -= 3*mm
+        c.setFillColorRGB(*COLOR_TEXTO_GRIS)
+        c.drawString(3*mm, info_y, "Válido:")
+        c.setFillColorRGB(*COLOR_VERDE)
+        c.setFont("Helvetica-Bold", 5)
+        c.drawRightString(CARD_WIDTH - 3*mm, info_y, template.valid_until)
+        c.restoreState()
+        c.endForm()
+
+    @staticmethod
+    def _draw_user_layer(c, user_data: dict, qr_mode: str = 'vector'):
+        """Datos propios del usuario sobre los forms de la plantilla"""
+        c.doForm(FORM_BASE)
+
         # === INFORMACIÓN DEL USUARIO (parte superior) ===
-        content_top = CARD_HEIGHT - header_height - 3*mm
-        
+        content_top = CARD_HEIGHT - HEADER_HEIGHT - 3*mm
+
         # Nombre completo centrado
         c.setFillColorRGB(*COLOR_TEXTO_OSCURO)
         c.setFont("Helvetica-Bold", 8)
         full_name = user_data.get('full_name', 'NOMBRE').upper()
-        
+
         # Dividir nombre si es muy largo
         if len(full_name) > 20:
             words = full_name.split()
@@ -144,7 +324,15 @@ class CarnetGenerator:
         else:
             c.drawCentredString(CARD_WIDTH/2, content_top - 3*mm, full_name)
             name_bottom = content_top - 6*mm
-        
+
+        badge_y = name_bottom - 5*mm
+        qr_section_y = badge_y - BADGE_OFFSET
+
+        c.saveState()
+        c.translate(0, qr_section_y)
+        c.doForm(FORM_BLOCK)
+        c.restoreState()
+
         # Badge de rol
         role = user_data.get('role', 'student')
         role_text = {
@@ -153,82 +341,36 @@ class CarnetGenerator:
             'admin': 'ADMINISTRADOR',
             'staff': 'PERSONAL'
         }.get(role, 'USUARIO')
-        
-        badge_width = 22*mm
-        badge_height = 4*mm
-        badge_x = (CARD_WIDTH - badge_width) / 2
-        badge_y = name_bottom - 5*mm
-        
-        c.setFillColorRGB(0.15, 0.2, 0.3)
-        c.roundRect(badge_x, badge_y, badge_width, badge_height, 1.5*mm, fill=True, stroke=False)
         c.setFillColorRGB(1, 1, 1)
         c.setFont("Helvetica-Bold", 6)
         c.drawCentredString(CARD_WIDTH/2, badge_y + 1*mm, role_text)
-        
+
         # Categoría/Grado
         category = user_data.get('category', user_data.get('grade', ''))
         if category:
             c.setFillColorRGB(*COLOR_TEXTO_GRIS)
             c.setFont("Helvetica", 6)
             c.drawCentredString(CARD_WIDTH/2, badge_y - 4*mm, category)
-        
+
         # === CÓDIGO QR GRANDE ===
-        qr_section_y = badge_y - 8*mm
-        
-        c.setFillColorRGB(*COLOR_TEXTO_OSCURO)
-        c.setFont("Helvetica-Bold", 6)
-        c.drawCentredString(CARD_WIDTH/2, qr_section_y, "ESCANEAR PARA ASISTENCIA")
-        
         # QR con el USER ID (lo que el sistema necesita)
         user_id = user_data.get('id', user_data.get('qr_data', ''))
-        qr_buffer = CarnetGenerator.generate_qr_image(user_id, size=200)
-        
-        # QR más grande - 28mm (antes era 14mm)
-        qr_size = 28 * mm
-        qr_x = (CARD_WIDTH - qr_size) / 2
-        qr_y = qr_section_y - qr_size - 3*mm
-        
-        # Borde alrededor del QR para mejor contraste
-        c.setStrokeColorRGB(0.8, 0.8, 0.8)
-        c.setLineWidth(0.5)
-        c.rect(qr_x - 1*mm, qr_y - 1*mm, qr_size + 2*mm, qr_size + 2*mm, fill=False, stroke=True)
-        
-        c.drawImage(
-            ImageReader(qr_buffer),
-            qr_x, qr_y,
-            width=qr_size, height=qr_size
-        )
-        
+        qr_y = qr_section_y + QR_OFFSET
+        if qr_mode == 'raster':
+            qr_buffer = CarnetGenerator.generate_qr_image(user_id, size=200)
+            c.drawImage(
+                ImageReader(qr_buffer),
+                QR_X, qr_y,
+                width=QR_SIZE, height=QR_SIZE
+            )
+        else:
+            CarnetGenerator.draw_qr_vector(c, user_id, QR_X, qr_y, QR_SIZE)
+
         # Código corto debajo del QR
         student_code = user_data.get('student_id', user_id[:8] if user_id else 'N/A')
         c.setFillColorRGB(*COLOR_TEXTO_GRIS)
         c.setFont("Helvetica", 5)
         c.drawCentredString(CARD_WIDTH/2, qr_y - 3*mm, f"ID: {student_code}")
-        
-        # === INFORMACIÓN INFERIOR ===
-        info_y = qr_y - 7*mm
-        
-        c.setFont("Helvetica", 5)
-        c.setFillColorRGB(*COLOR_TEXTO_GRIS)
-        c.drawString(3*mm, info_y, "Contacto:")
-        c.setFillColorRGB(*COLOR_TEXTO_OSCURO)
-        c.drawRightString(CARD_WIDTH - 3*mm, info_y, "+502 30624815")
-        
-        info_y -= 3*mm
-        c.setFillColorRGB(*COLOR_TEXTO_GRIS)
-        c.drawString(3*mm, info_y, "Válido:")
-        c.setFillColorRGB(*COLOR_VERDE)
-        c.setFont("Helvetica-Bold", 5)
-        c.drawRightString(CARD_WIDTH - 3*mm, info_y, "Dic 2026")
-        
-        # === FOOTER ===
-        c.setFillColorRGB(*COLOR_TEXTO_GRIS)
-        c.setFont("Helvetica", 3.5)
-        c.drawCentredString(CARD_WIDTH/2, 3*mm, "Liceo San Francisco de Asís - LISFA")
-        
-        c.save()
-        buffer.seek(0)
-        return buffer
     
     @staticmethod
     def get_categorias_by_role(role: str) -> list:
@@ -238,6 +380,9 @@ class CarnetGenerator:
             return CATEGORIAS_PERSONAL
         return []
 
+DEFAULT_TEMPLATE = CarnetTemplate()
+
+
 def get_all_categories():
     return {
         'student': CATEGORIAS_ESTUDIANTES,
@@ -0,0 +1,137 @@
+import gzip
+import os
+
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli
+except ImportError:  # brotli es opcional: sin él solo se negocia gzip
+    brotli = None
+
+COMPRESSION_MINIMUM_SIZE = int(os.environ.get('COMPRESSION_MINIMUM_SIZE', '1024'))
+GZIP_LEVEL = int(os.environ.get('GZIP_LEVEL', '6'))
+BROTLI_QUALITY = int(os.environ.get('BROTLI_QUALITY', '4'))
+
+COMPRESSIBLE_TYPES = ('application/json', 'text/', 'application/javascript', 'image/svg+xml')
+
+
+def choose_encoding(accept_encoding: str) -> str:
+    """Negocia 'br' o 'gzip' según Accept-Encoding (ignora q=0)"""
+    accepted = set()
+    for part in accept_encoding.lower().split(','):
+        token, _, params = part.strip().partition(';')
+        if params.strip().replace(' ', '') in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            continue
+        accepted.add(token.strip())
+    if brotli is not None and 'br' in accepted:
+        return 'br'
+    if 'gzip' in accepted or '*' in accepted:
+        return 'gzip'
+    return ''
+
+
+def encoded_etag(etag: str, encoding: str) -> str:
+    """
+    ETag de la representación comprimida: la identidad y la comprimida no
+    pueden compartir un ETag fuerte (RFC 9110), se agrega "-gzip"/"-br".
+    """
+    if not etag.startswith('"') or not etag.endswith('"'):
+        return etag
+    return f'{etag[:-1]}-{encoding}"'
+
+
+def strip_etag_suffixes(if_none_match: str) -> str:
+    """If-None-Match con los ETag de vuelta en su forma original, para comparar aguas abajo"""
+    tags = []
+    for tag in if_none_match.split(','):
+        tag = tag.strip()
+        for encoding in ('gzip', 'br'):
+            if tag.endswith(f'-{encoding}"'):
+                tag = tag[:-len(encoding) - 2] + '"'
+                break
+        tags.append(tag)
+    return ', '.join(tags)
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+
+class CompressionMiddleware:
+    """
+    Compresión gzip/brotli negociada para respuestas de texto/JSON.
+    PDFs, imágenes y ZIPs se envían sin tocar (ya están comprimidos).
+    """
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MINIMUM_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        request_headers = Headers(scope=scope)
+        encoding = choose_encoding(request_headers.get('accept-encoding', ''))
+        if not encoding:
+            await self.app(scope, receive, send)
+            return
+
+        # La caché y StaticFiles comparan contra el ETag sin sufijo
+        if_none_match = request_headers.get('if-none-match')
+        if if_none_match:
+            scope = dict(scope)
+            scope['headers'] = [
+                (name, value) for name, value in scope['headers'] if name != b'if-none-match'
+            ] + [(b'if-none-match', strip_etag_suffixes(if_none_match).encode('latin-1'))]
+
+        start_message = None
+        passthrough = False
+        chunks = []
+
+        async def send_wrapper(message):
+            nonlocal start_message, passthrough
+            if message['type'] == 'http.response.start':
+                headers = Headers(raw=message.get('headers', []))
+                content_type = headers.get('content-type', '')
+                passthrough = (
+                    'content-encoding' in headers
+                    or not content_type.startswith(COMPRESSIBLE_TYPES)
+                )
+                if passthrough:
+                    etag = headers.get('etag')
+                    if message['status'] == 304 and etag and if_none_match:
+                        # Revalidación de la copia comprimida: se confirma con el mismo ETag
+                        suffixed = encoded_etag(etag, encoding)
+                        if suffixed in if_none_match:
+                            mutable = MutableHeaders(raw=list(message.get('headers', [])))
+                            mutable['ETag'] = suffixed
+                            message = {**message, 'headers': mutable.raw}
+                    await send(message)
+                else:
+                    start_message = message
+                return
+            if passthrough or message['type'] != 'http.response.body':
+                await send(message)
+                return
+
+            chunks.append(message.get('body', b''))
+            if message.get('more_body', False):
+                return
+
+            body = b''.join(chunks)
+            headers = MutableHeaders(raw=list(start_message.get('headers', [])))
+            if len(body) >= self.minimum_size:
+                body = compress(body, encoding)
+                headers['Content-Encoding'] = encoding
+                headers['Content-Length'] = str(len(body))
+                if 'etag' in headers:
+                    headers['ETag'] = encoded_etag(headers['etag'], encoding)
+                headers.add_vary_header('Accept-Encoding')
+            start_message['headers'] = headers.raw
+            await send(start_message)
+            await send({'type': 'http.response.body', 'body': body})
+
+        await self.app(scope, receive, send_wrapper)
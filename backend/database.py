@@ -0,0 +1,194 @@
+import os
+import copy
+import time
+import asyncio
+import logging
+import threading
+from typing import Dict, Optional
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReadPreference, WriteConcern
+from pymongo.monitoring import ConnectionPoolListener
+
+logger = logging.getLogger(__name__)
+
+# Pool y tiempos de espera del cliente (ver opciones de conexión de PyMongo)
+MONGO_MAX_POOL_SIZE = int(os.environ.get('MONGO_MAX_POOL_SIZE', '100'))
+MONGO_MIN_POOL_SIZE = int(os.environ.get('MONGO_MIN_POOL_SIZE', '5'))
+MONGO_MAX_IDLE_TIME_MS = int(os.environ.get('MONGO_MAX_IDLE_TIME_MS', '300000'))
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.environ.get('MONGO_WAIT_QUEUE_TIMEOUT_MS', '2000'))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.environ.get('MONGO_SERVER_SELECTION_TIMEOUT_MS', '5000'))
+MONGO_CONNECT_TIMEOUT_MS = int(os.environ.get('MONGO_CONNECT_TIMEOUT_MS', '5000'))
+MONGO_SOCKET_TIMEOUT_MS = int(os.environ.get('MONGO_SOCKET_TIMEOUT_MS', '20000'))
+
+# Escrituras de asistencia: confirmadas por la mayoría (sobreviven a un cambio de primario)
+MONGO_WRITE_CONCERN = os.environ.get('MONGO_WRITE_CONCERN', 'majority')
+# Reportes pesados: secundarios si existen (con un solo nodo se lee del primario)
+MONGO_REPORTS_READ_PREFERENCE = os.environ.get('MONGO_REPORTS_READ_PREFERENCE', 'secondaryPreferred')
+
+HEALTH_PING_TIMEOUT = float(os.environ.get('HEALTH_PING_TIMEOUT', '2'))
+# Proporción de conexiones en uso a partir de la cual /health reporta "degraded"
+POOL_SATURATION_WARNING = float(os.environ.get('POOL_SATURATION_WARNING', '0.8'))
+
+READ_PREFERENCES = {
+    'primary': ReadPreference.PRIMARY,
+    'primaryPreferred': ReadPreference.PRIMARY_PREFERRED,
+    'secondary': ReadPreference.SECONDARY,
+    'secondaryPreferred': ReadPreference.SECONDARY_PREFERRED,
+    'nearest': ReadPreference.NEAREST,
+}
+
+
+def _write_concern(value: str) -> WriteConcern:
+    return WriteConcern(w=int(value) if value.isdigit() else value)
+
+
+class PoolMonitor(ConnectionPoolListener):
+    """
+    Contadores del pool de conexiones por servidor, a partir de los eventos
+    de monitoreo de PyMongo (se invocan desde hilos del driver).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checked_out: Dict[str, int] = {}
+        self.peak_checked_out = 0
+        self.open_connections = 0
+        self.checkout_failures = 0
+        self.checkouts = 0
+        self.pool_clears = 0
+
+    @staticmethod
+    def _key(event) -> str:
+        return '%s:%s' % event.address
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self.pool_clears += 1
+
+    def pool_closed(self, event):
+        with self._lock:
+            self.checked_out.pop(self._key(event), None)
+
+    def connection_created(self, event):
+        with self._lock:
+            self.open_connections += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.open_connections -= 1
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self.checkout_failures += 1
+
+    def connection_checked_out(self, event):
+        key = self._key(event)
+        with self._lock:
+            self.checkouts += 1
+            self.checked_out[key] = self.checked_out.get(key, 0) + 1
+            self.peak_checked_out = max(self.peak_checked_out, self.checked_out[key])
+
+    def connection_checked_in(self, event):
+        key = self._key(event)
+        with self._lock:
+            self.checked_out[key] = max(0, self.checked_out.get(key, 0) - 1)
+
+    def snapshot(self, max_pool_size: int) -> dict:
+        with self._lock:
+            in_use = max(self.checked_out.values(), default=0)
+            return {
+                'max_pool_size': max_pool_size,
+                'in_use': in_use,
+                'in_use_by_server': dict(self.checked_out),
+                'peak_in_use': self.peak_checked_out,
+                'open_connections': self.open_connections,
+                'saturation': round(in_use / max_pool_size, 3) if max_pool_size else 0.0,
+                'checkouts': self.checkouts,
+                'checkout_failures': self.checkout_failures,
+                'pool_clears': self.pool_clears,
+            }
+
+
+class Database:
+    """
+    Cliente Motor administrado: opciones de pool y tiempos de espera desde
+    el entorno, una base por clase de operación y chequeo de salud.
+
+    - `db`: lecturas del primario y escrituras con MONGO_WRITE_CONCERN.
+    - `reports_db`: lecturas pesadas de reportes, con MONGO_REPORTS_READ_PREFERENCE.
+    - `log_db`: bitácoras de alto volumen con w=1 (no esperan a la réplica).
+    """
+
+    def __init__(self, url: str, name: str, **options):
+        self.url = url
+        self.max_pool_size = options.get('maxPoolSize', MONGO_MAX_POOL_SIZE)
+        self.monitor = PoolMonitor()
+        self.client = AsyncIOMotorClient(
+            url,
+            maxPoolSize=self.max_pool_size,
+            minPoolSize=options.get('minPoolSize', MONGO_MIN_POOL_SIZE),
+            maxIdleTimeMS=options.get('maxIdleTimeMS', MONGO_MAX_IDLE_TIME_MS),
+            waitQueueTimeoutMS=options.get('waitQueueTimeoutMS', MONGO_WAIT_QUEUE_TIMEOUT_MS),
+            serverSelectionTimeoutMS=options.get('serverSelectionTimeoutMS', MONGO_SERVER_SELECTION_TIMEOUT_MS),
+            connectTimeoutMS=options.get('connectTimeoutMS', MONGO_CONNECT_TIMEOUT_MS),
+            socketTimeoutMS=options.get('socketTimeoutMS', MONGO_SOCKET_TIMEOUT_MS),
+            event_listeners=[self.monitor, *options.get('event_listeners', ())],
+        )
+        self._bind(name)
+
+    def _bind(self, name: str):
+        self.name = name
+        self.db = self.client.get_database(name, write_concern=_write_concern(MONGO_WRITE_CONCERN))
+        self.reports_db = self.client.get_database(
+            name, read_preference=READ_PREFERENCES.get(MONGO_REPORTS_READ_PREFERENCE, ReadPreference.SECONDARY_PREFERRED)
+        )
+        self.log_db = self.client.get_database(name, write_concern=WriteConcern(w=1))
+
+    def sibling(self, name: str) -> "Database":
+        """Otra base del mismo clúster que comparte cliente, pool y monitor"""
+        other = copy.copy(self)
+        other._bind(name)
+        return other
+
+    async def ping(self) -> float:
+        """Latencia de un ping al servidor, en milisegundos"""
+        start = time.perf_counter()
+        await asyncio.wait_for(self.client.admin.command('ping'), timeout=HEALTH_PING_TIMEOUT)
+        return round((time.perf_counter() - start) * 1000, 2)
+
+    async def health(self) -> dict:
+        """Estado de la base: healthy, degraded (pool casi lleno) o unhealthy (sin respuesta)"""
+        pool = self.monitor.snapshot(self.max_pool_size)
+        try:
+            ping_ms: Optional[float] = await self.ping()
+            error = None
+        except Exception as e:
+            # Solo el tipo: /health es público y el detalle expone la topología
+            logger.warning(f"Ping a MongoDB falló: {e}")
+            ping_ms, error = None, type(e).__name__
+        if error:
+            status = 'unhealthy'
+        elif pool['saturation'] >= POOL_SATURATION_WARNING:
+            status = 'degraded'
+        else:
+            status = 'healthy'
+        result = {'status': status, 'ping_ms': ping_ms, 'pool': pool}
+        if error:
+            result['error'] = error
+        return result
+
+    def close(self):
+        self.client.close()
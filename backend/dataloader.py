@@ -0,0 +1,58 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional
+
+
+class DataLoader:
+    """
+    Agrupa las búsquedas por clave hechas dentro de una misma vuelta del
+    event loop en una sola consulta por lote, y memoriza los resultados.
+    Debe crearse una instancia por request (ver `Loaders`).
+    """
+
+    def __init__(self, batch_fn: Callable[[List[str]], Awaitable[Dict[str, dict]]]):
+        self._batch_fn = batch_fn
+        self._cache: Dict[str, asyncio.Future] = {}
+        self._queue: List[str] = []
+
+    def load(self, key: str) -> Awaitable[Optional[dict]]:
+        """Futuro con el documento de la clave (None si no existe)"""
+        if key in self._cache:
+            return self._cache[key]
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._cache[key] = future
+        if not self._queue:
+            loop.call_soon(lambda: asyncio.ensure_future(self._dispatch()))
+        self._queue.append(key)
+        return future
+
+    async def load_many(self, keys: Iterable[str]) -> List[Optional[dict]]:
+        return list(await asyncio.gather(*[self.load(k) for k in keys]))
+
+    async def _dispatch(self):
+        keys, self._queue = self._queue, []
+        try:
+            found = await self._batch_fn(keys)
+        except Exception as e:
+            for key in keys:
+                self._cache.pop(key).set_exception(e)
+            return
+        for key in keys:
+            self._cache[key].set_result(found.get(key))
+
+
+def _by_field(collection, field: str, projection: dict):
+    async def batch(keys: List[str]) -> Dict[str, dict]:
+        docs = await collection.find({field: {"$in": keys}}, projection).to_list(None)
+        return {doc[field]: doc for doc in docs}
+    return batch
+
+
+class Loaders:
+    """Loaders por request para el grafo usuarios/padres"""
+
+    def __init__(self, db):
+        # Usuarios por id (sin contraseña)
+        self.users = DataLoader(_by_field(db.users, "id", {"_id": 0, "password": 0}))
+        # Vinculaciones de padres por user_id del padre
+        self.parents = DataLoader(_by_field(db.parents, "user_id", {"_id": 0}))
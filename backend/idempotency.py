@@ -0,0 +1,96 @@
+import os
+import hashlib
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from pymongo import ASCENDING
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_COLLECTION = 'idempotency_keys'
+# Tiempo que se recuerda la respuesta de una clave
+IDEMPOTENCY_TTL_SECONDS = int(os.environ.get('IDEMPOTENCY_TTL_SECONDS', '86400'))
+# Una clave "en proceso" más antigua que esto se considera abandonada (proceso caído)
+IDEMPOTENCY_PENDING_TIMEOUT_SECONDS = int(os.environ.get('IDEMPOTENCY_PENDING_TIMEOUT_SECONDS', '30'))
+
+STATE_PENDING = 'pending'
+STATE_DONE = 'done'
+
+
+class IdempotencyInProgress(Exception):
+    """Otra solicitud con la misma clave se está procesando"""
+
+
+class IdempotencyMismatch(ValueError):
+    """La clave ya se usó con una solicitud distinta"""
+
+
+def fingerprint(*parts: str) -> str:
+    return hashlib.sha256('\x1f'.join(parts).encode()).hexdigest()
+
+
+class IdempotencyStore:
+    """
+    Claves de idempotencia (cabecera Idempotency-Key) respaldadas por MongoDB.
+
+    `begin` reserva la clave con un insert (el índice único de _id resuelve la
+    carrera entre procesos) o devuelve la respuesta ya guardada; `complete`
+    guarda la respuesta y `abandon` libera la clave si la solicitud falló,
+    para que el reintento se ejecute de nuevo. Un índice TTL las expira.
+    """
+
+    def __init__(self, db, ttl: int = IDEMPOTENCY_TTL_SECONDS, pending_timeout: int = IDEMPOTENCY_PENDING_TIMEOUT_SECONDS):
+        self.db = db
+        self.ttl = ttl
+        self.pending_timeout = pending_timeout
+
+    @property
+    def collection(self):
+        return self.db[IDEMPOTENCY_COLLECTION]
+
+    async def ensure_indexes(self):
+        await self.collection.create_index([("created_at", ASCENDING)], expireAfterSeconds=self.ttl)
+
+    async def begin(self, key: str, request_fingerprint: str) -> Optional[dict]:
+        """
+        Reserva la clave. Devuelve None si esta solicitud debe ejecutarse,
+        o la respuesta guardada si la clave ya se completó.
+        """
+        now = datetime.now(timezone.utc)
+        try:
+            await self.collection.insert_one({
+                "_id": key, "state": STATE_PENDING, "fingerprint": request_fingerprint, "created_at": now
+            })
+            return None
+        except DuplicateKeyError:
+            pass
+
+        stored = await self.collection.find_one({"_id": key})
+        if stored is None:
+            # Expiró entre el insert y la lectura: reintentar la reserva
+            return await self.begin(key, request_fingerprint)
+        if stored['fingerprint'] != request_fingerprint:
+            raise IdempotencyMismatch("La clave de idempotencia ya se usó con otra solicitud")
+        if stored['state'] == STATE_DONE:
+            return stored['response']
+
+        # Reservada por una solicitud que no terminó: tomarla si ya venció
+        taken = await self.collection.find_one_and_update(
+            {"_id": key, "state": STATE_PENDING, "created_at": {"$lt": now - timedelta(seconds=self.pending_timeout)}},
+            {"$set": {"created_at": now}}
+        )
+        if taken is None:
+            raise IdempotencyInProgress(key)
+        logger.warning(f"Clave de idempotencia {key} abandonada, se vuelve a ejecutar")
+        return None
+
+    async def complete(self, key: str, response: dict):
+        await self.collection.update_one(
+            {"_id": key},
+            {"$set": {"state": STATE_DONE, "response": response, "created_at": datetime.now(timezone.utc)}}
+        )
+
+    async def abandon(self, key: str):
+        await self.collection.delete_one({"_id": key, "state": STATE_PENDING})
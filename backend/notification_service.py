@@ -1,4 +1,5 @@
 import os
+import html
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
@@ -13,6 +14,21 @@ SMTP_PORT = int(os.environ.get('SMTP_PORT', '587'))
 SMTP_USER = os.environ.get('SMTP_USER', '')
 SMTP_PASSWORD = os.environ.get('SMTP_PASSWORD', '')
 FROM_EMAIL = os.environ.get('FROM_EMAIL', 'noreply@lisfa.edu')
+INSTITUTION_NAME = "Liceo San Francisco de Asís"
+EMAIL_COLOR = "#c41e3a"
+
+
+class EmailBranding:
+    """Marca de los correos de un campus: nombre, color y remitente"""
+
+    def __init__(self, institution_name: str = INSTITUTION_NAME, color: str = EMAIL_COLOR, from_email: str = FROM_EMAIL):
+        self.institution_name = institution_name
+        self.color = color
+        self.from_email = from_email
+
+
+DEFAULT_BRANDING = EmailBranding()
+
 
 class NotificationService:
     
@@ -22,7 +38,7 @@ class NotificationService:
         return dt.strftime('%H:%M:%S')
     
     @staticmethod
-    def send_entry_notification(student_name: str, entry_time: datetime, parent_email: str) -> bool:
+    def send_entry_notification(student_name: str, entry_time: datetime, parent_email: str, branding: EmailBranding = None) -> bool:
         """
         Envía notificación de INGRESO al padre de familia
         Formato: "[NOMBRE DEL ESTUDIANTE] ingresó a las [HH:MM:SS]"
@@ -37,14 +53,15 @@ class NotificationService:
                 to_email=parent_email,
                 subject=subject,
                 body=body,
-                student_name=student_name
+                student_name=student_name,
+                branding=branding
             )
         except Exception as e:
             logger.error(f"Error al enviar notificación de ingreso: {str(e)}")
             return False
     
     @staticmethod
-    def send_exit_notification(student_name: str, exit_time: datetime, parent_email: str) -> bool:
+    def send_exit_notification(student_name: str, exit_time: datetime, parent_email: str, branding: EmailBranding = None) -> bool:
         """
         Envía notificación de SALIDA al padre de familia
         Formato: "[NOMBRE DEL ESTUDIANTE] se retiró a las [HH:MM:SS]"
@@ -59,17 +76,19 @@ class NotificationService:
                 to_email=parent_email,
                 subject=subject,
                 body=body,
-                student_name=student_name
+                student_name=student_name,
+                branding=branding
             )
         except Exception as e:
             logger.error(f"Error al enviar notificación de salida: {str(e)}")
             return False
     
     @staticmethod
-    def _send_email(to_email: str, subject: str, body: str, student_name: str) -> bool:
+    def _send_email(to_email: str, subject: str, body: str, student_name: str, branding: EmailBranding = None) -> bool:
         """
-        Envía email usando SMTP
+        Envía email usando SMTP, con la marca del campus
         """
+        branding = branding or DEFAULT_BRANDING
         # Si no hay configuración SMTP, solo loguear
         if not SMTP_USER or not SMTP_PASSWORD:
             logger.info(f"[SIMULADO] Email a {to_email}: {subject} - {body}")
@@ -79,19 +98,20 @@ class NotificationService:
             # Crear mensaje
             msg = MIMEMultipart('alternative')
             msg['Subject'] = subject
-            msg['From'] = FROM_EMAIL
+            msg['From'] = branding.from_email
             msg['To'] = to_email
             
             # Texto plano
             text_part = MIMEText(body, 'plain')
             
             # HTML con logo institucional
+            institution = html.escape(branding.institution_name)
             html_body = f"""
             <html>
               <body style="font-family: Arial, sans-serif; padding: 20px;">
-                <div style="max-width: 600px; margin: 0 auto; border: 2px solid #c41e3a; border-radius: 10px; padding: 20px;">
+                <div style="max-width: 600px; margin: 0 auto; border: 2px solid {branding.color}; border-radius: 10px; padding: 20px;">
                   <div style="text-align: center; margin-bottom: 20px;">
-                    <h2 style="color: #c41e3a; margin: 0;">Liceo San Francisco de Asís</h2>
+                    <h2 style="color: {branding.color}; margin: 0;">{institution}</h2>
                     <p style="color: #1e3a5f; font-size: 14px;">Sistema de Control de Asistencia</p>
                   </div>
                   
@@ -103,7 +123,7 @@ class NotificationService:
                   
                   <div style="text-align: center; color: #666; font-size: 12px; margin-top: 20px;">
                     <p>Este es un mensaje automático del sistema de control de asistencia.</p>
-                    <p>© 2025 Liceo San Francisco de Asís - Todos los derechos reservados</p>
+                    <p>© {datetime.now().year} {institution} - Todos los derechos reservados</p>
                   </div>
                 </div>
               </body>
@@ -130,7 +150,13 @@ class NotificationService:
             return False
     
     @staticmethod
-    async def send_realtime_notification(user_name: str, event_type: str, event_time: datetime, parent_emails: list) -> dict:
+    async def send_realtime_notification(
+        user_name: str,
+        event_type: str,
+        event_time: datetime,
+        parent_emails: list,
+        branding: EmailBranding = None
+    ) -> dict:
         """
         Envía notificaciones en tiempo real a múltiples emails
         
@@ -139,6 +165,7 @@ class NotificationService:
             event_type: 'entry' o 'exit'
             event_time: Datetime del evento
             parent_emails: Lista de emails de padres
+            branding: Marca del campus (por defecto la institución principal)
         
         Returns:
             dict con resultados del envío
@@ -155,13 +182,15 @@ class NotificationService:
                     success = NotificationService.send_entry_notification(
                         student_name=user_name,
                         entry_time=event_time,
-                        parent_email=email
+                        parent_email=email,
+                        branding=branding
                     )
                 elif event_type == 'exit':
                     success = NotificationService.send_exit_notification(
                         student_name=user_name,
                         exit_time=event_time,
-                        parent_email=email
+                        parent_email=email,
+                        branding=branding
                     )
                 else:
                     success = False
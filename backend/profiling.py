@@ -0,0 +1,382 @@
+import os
+import re
+import sys
+import time
+import logging
+import threading
+import contextvars
+from collections import deque
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Set, Tuple
+
+from pymongo import monitoring
+
+logger = logging.getLogger(__name__)
+
+# Perfil bajo demanda: intervalo de muestreo y duración máxima de una sesión
+PROFILING_INTERVAL_MS = float(os.environ.get('PROFILING_INTERVAL_MS', '5'))
+PROFILING_MAX_SECONDS = int(os.environ.get('PROFILING_MAX_SECONDS', '300'))
+# Solicitudes lentas: umbral, intervalo de muestreo y cuántas se conservan
+SLOW_REQUEST_THRESHOLD_MS = float(os.environ.get('SLOW_REQUEST_THRESHOLD_MS', '500'))
+SLOW_REQUEST_SAMPLE_INTERVAL_MS = float(os.environ.get('SLOW_REQUEST_SAMPLE_INTERVAL_MS', '10'))
+SLOW_REQUEST_MAX_RECORDS = int(os.environ.get('SLOW_REQUEST_MAX_RECORDS', '50'))
+SLOW_REQUEST_MAX_QUERIES = 200
+
+MAX_STACK_DEPTH = 128
+TOP_STACKS = 20
+
+# Solicitud observada en curso (Motor copia el contexto a sus hilos, así las
+# consultas ejecutadas en el executor se atribuyen a la solicitud)
+current_trace: contextvars.ContextVar[Optional["RequestTrace"]] = contextvars.ContextVar('current_trace', default=None)
+
+
+def fold_stack(frame, root: Optional[str] = None) -> str:
+    """Pila en formato "folded" (raíz;...;hoja), el de flamegraph.pl y speedscope"""
+    names = []
+    while frame is not None and len(names) < MAX_STACK_DEPTH:
+        code = frame.f_code
+        names.append(f"{getattr(code, 'co_qualname', code.co_name)} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    if root:
+        names.append(root)
+    return ';'.join(reversed(names)).replace('\n', ' ')
+
+
+def render_folded(samples: Dict[str, int]) -> str:
+    return ''.join(f"{stack} {count}\n" for stack, count in sorted(samples.items()))
+
+
+def top_stacks(samples: Dict[str, int], limit: int = TOP_STACKS) -> List[dict]:
+    ranked = sorted(samples.items(), key=lambda item: item[1], reverse=True)[:limit]
+    return [{'stack': stack, 'count': count} for stack, count in ranked]
+
+
+class SlowRoute:
+    """Ruta observada: nombre, patrón y métodos"""
+
+    def __init__(self, name: str, pattern: str, methods: Tuple[str, ...] = ('GET',)):
+        self.name = name
+        self.pattern = re.compile(pattern)
+        self.methods = methods
+
+    def matches(self, method: str, path: str) -> bool:
+        return method in self.methods and self.pattern.match(path) is not None
+
+
+class RequestTrace:
+    """Muestras de pila y consultas de una solicitud observada"""
+
+    def __init__(self, route: str, method: str, path: str, tenant: Optional[str] = None):
+        self.route = route
+        self.method = method
+        self.path = path
+        self.tenant = tenant
+        self.started_at = datetime.now(timezone.utc)
+        self.start = time.perf_counter()
+        # Hilo del event loop que atiende la solicitud
+        self.thread_id = threading.get_ident()
+        self.samples: Dict[str, int] = {}
+        self.queries: List[dict] = []
+        self._pending: Dict[int, tuple] = {}
+
+    def query_started(self, request_id: int, command: str, collection: Optional[str], database: str):
+        self._pending[request_id] = (command, collection, database)
+
+    def query_finished(self, request_id: int, duration_micros: int, ok: bool):
+        pending = self._pending.pop(request_id, None)
+        if pending is None or len(self.queries) >= SLOW_REQUEST_MAX_QUERIES:
+            return
+        command, collection, database = pending
+        self.queries.append({
+            'command': command, 'collection': collection, 'database': database,
+            'duration_ms': round(duration_micros / 1000, 3), 'ok': ok,
+        })
+
+
+class QueryTimingListener(monitoring.CommandListener):
+    """Tiempos de cada comando de MongoDB de la solicitud observada en curso"""
+
+    def started(self, event):
+        trace = current_trace.get()
+        if trace is None:
+            return
+        target = event.command.get(event.command_name)
+        collection = target if isinstance(target, str) else event.command.get('collection')
+        trace.query_started(event.request_id, event.command_name, collection, event.database_name)
+
+    def succeeded(self, event):
+        trace = current_trace.get()
+        if trace is not None:
+            trace.query_finished(event.request_id, event.duration_micros, True)
+
+    def failed(self, event):
+        trace = current_trace.get()
+        if trace is not None:
+            trace.query_finished(event.request_id, event.duration_micros, False)
+
+
+class ProfileSession:
+    def __init__(self, seconds: float, interval: float):
+        self.interval = interval
+        self.started_at = datetime.now(timezone.utc)
+        self.deadline = time.monotonic() + seconds
+        self.seconds = seconds
+        self.stopped_at: Optional[datetime] = None
+        self.samples: Dict[str, int] = {}
+        self.sample_count = 0
+
+    @property
+    def active(self) -> bool:
+        return self.stopped_at is None
+
+    def status(self) -> dict:
+        return {
+            'active': self.active,
+            'started_at': self.started_at.isoformat(),
+            'stopped_at': self.stopped_at.isoformat() if self.stopped_at else None,
+            'seconds': self.seconds,
+            'interval_ms': round(self.interval * 1000, 3),
+            'samples': self.sample_count,
+            'stacks': len(self.samples),
+        }
+
+
+class Profiler:
+    """
+    Perfilador por muestreo dentro del proceso (sin herramientas externas).
+
+    Un hilo toma las pilas de los demás hilos con sys._current_frames():
+    - Sesión bajo demanda: todos los hilos durante N segundos.
+    - Solicitudes lentas: en las rutas observadas, cuando una solicitud pasa
+      la mitad del umbral se muestrea el hilo del event loop; si termina por
+      encima del umbral se guardan sus pilas y sus consultas a MongoDB.
+
+    Mientras no hay nada que muestrear, el hilo espera sin consumir CPU.
+    Los datos son del proceso: con varios workers cada uno tiene los suyos.
+    """
+
+    def __init__(
+        self,
+        routes: List[SlowRoute],
+        threshold_ms: float = SLOW_REQUEST_THRESHOLD_MS,
+        sample_interval_ms: float = SLOW_REQUEST_SAMPLE_INTERVAL_MS,
+        max_records: int = SLOW_REQUEST_MAX_RECORDS,
+        max_seconds: int = PROFILING_MAX_SECONDS
+    ):
+        self.routes = routes
+        self.threshold = threshold_ms / 1000
+        self.sample_interval = sample_interval_ms / 1000
+        self.max_seconds = max_seconds
+        self.slow_requests: deque = deque(maxlen=max_records)
+        self.counters = {'watched': 0, 'slow': 0}
+        self._inflight: Set[RequestTrace] = set()
+        self._session: Optional[ProfileSession] = None
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = False
+        self._thread: Optional[threading.Thread] = None
+
+    # --- ciclo de vida
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name='profiler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopping = True
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+            self._thread = None
+
+    # --- solicitudes observadas
+
+    def match(self, method: str, path: str) -> Optional[str]:
+        for route in self.routes:
+            if route.matches(method, path):
+                return route.name
+        return None
+
+    def begin(self, route: str, method: str, path: str, tenant: Optional[str] = None) -> RequestTrace:
+        trace = RequestTrace(route, method, path, tenant)
+        with self._lock:
+            self._inflight.add(trace)
+            self.counters['watched'] += 1
+        self._wake.set()
+        return trace
+
+    def end(self, trace: RequestTrace, status: int):
+        with self._lock:
+            self._inflight.discard(trace)
+        duration = time.perf_counter() - trace.start
+        if duration < self.threshold:
+            return
+        self.counters['slow'] += 1
+        self.slow_requests.append({
+            'route': trace.route,
+            'method': trace.method,
+            'path': trace.path,
+            'tenant': trace.tenant,
+            'status': status,
+            'started_at': trace.started_at.isoformat(),
+            'duration_ms': round(duration * 1000, 2),
+            'query_count': len(trace.queries),
+            'query_ms': round(sum(q['duration_ms'] for q in trace.queries), 3),
+            'queries': trace.queries,
+            'sample_count': sum(trace.samples.values()),
+            'samples': trace.samples,
+        })
+        logger.warning(
+            f"Solicitud lenta {trace.method} {trace.path}: {duration * 1000:.0f} ms, "
+            f"{len(trace.queries)} consultas"
+        )
+
+    def slow_summary(self) -> List[dict]:
+        """Solicitudes lentas recientes (las pilas más frecuentes de cada una)"""
+        return [
+            {**{k: v for k, v in record.items() if k != 'samples'}, 'top_stacks': top_stacks(record['samples'])}
+            for record in reversed(self.slow_requests)
+        ]
+
+    def slow_profile(self, route: Optional[str] = None) -> str:
+        """Pilas de todas las solicitudes lentas guardadas, en formato folded"""
+        merged: Dict[str, int] = {}
+        for record in self.slow_requests:
+            if route and record['route'] != route:
+                continue
+            for stack, count in record['samples'].items():
+                merged[stack] = merged.get(stack, 0) + count
+        return render_folded(merged)
+
+    def clear_slow(self):
+        self.slow_requests.clear()
+
+    # --- sesión bajo demanda
+
+    def start_session(self, seconds: float, interval_ms: float = PROFILING_INTERVAL_MS) -> dict:
+        if not 1 <= seconds <= self.max_seconds:
+            raise ValueError(f"La duración debe estar entre 1 y {self.max_seconds} segundos")
+        if not 1 <= interval_ms <= 1000:
+            raise ValueError("El intervalo debe estar entre 1 y 1000 ms")
+        with self._lock:
+            if self._session is not None and self._session.active:
+                raise RuntimeError("Ya hay un perfil en curso")
+            self._session = ProfileSession(seconds, interval_ms / 1000)
+            status = self._session.status()
+        self._wake.set()
+        return status
+
+    def stop_session(self) -> Optional[dict]:
+        with self._lock:
+            session = self._session
+            if session is not None and session.active:
+                session.stopped_at = datetime.now(timezone.utc)
+        return session.status() if session else None
+
+    def session_status(self) -> Optional[dict]:
+        with self._lock:
+            return self._session.status() if self._session else None
+
+    def session_profile(self) -> Optional[str]:
+        with self._lock:
+            return render_folded(self._session.samples) if self._session else None
+
+    def stats(self) -> dict:
+        session = self.session_status()
+        with self._lock:
+            in_flight = len(self._inflight)
+        return {
+            'session': session,
+            'threshold_ms': self.threshold * 1000,
+            'in_flight': in_flight,
+            'slow_requests': len(self.slow_requests),
+            **self.counters,
+        }
+
+    # --- hilo de muestreo
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stopping:
+            session = self._session
+            profiling = session is not None and session.active
+            if profiling and time.monotonic() >= session.deadline:
+                self.stop_session()
+                profiling = False
+            with self._lock:
+                watching = bool(self._inflight)
+            if not profiling and not watching:
+                self._wake.clear()
+                # Volver a revisar: pudo llegar una solicitud entre la lectura y el clear
+                with self._lock:
+                    idle = not self._inflight and not (self._session and self._session.active)
+                if idle:
+                    self._wake.wait()
+                continue
+
+            time.sleep(session.interval if profiling else self.sample_interval)
+            frames = sys._current_frames()
+            session_stacks = []
+            if profiling:
+                names = {t.ident: t.name for t in threading.enumerate()}
+                session_stacks = [
+                    fold_stack(frame, root=names.get(thread_id, str(thread_id)))
+                    for thread_id, frame in frames.items() if thread_id != own_id
+                ]
+            trace_stacks = []
+            if watching:
+                now = time.perf_counter()
+                with self._lock:
+                    traces = [t for t in self._inflight if now - t.start >= self.threshold / 2]
+                for trace in traces:
+                    frame = frames.get(trace.thread_id)
+                    if frame is not None:
+                        trace_stacks.append((trace, fold_stack(frame)))
+            del frames
+
+            with self._lock:
+                if profiling and session.active:
+                    for stack in session_stacks:
+                        session.samples[stack] = session.samples.get(stack, 0) + 1
+                    session.sample_count += 1
+                for trace, stack in trace_stacks:
+                    # La solicitud pudo terminar mientras se tomaba la muestra
+                    if trace in self._inflight:
+                        trace.samples[stack] = trace.samples.get(stack, 0) + 1
+
+
+class SlowRequestMiddleware:
+    """Middleware ASGI que mide las rutas observadas por `Profiler`"""
+
+    def __init__(self, app, profiler: Profiler):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        route = self.profiler.match(scope['method'], scope['path'])
+        if route is None:
+            await self.app(scope, receive, send)
+            return
+
+        tenant = scope.get('state', {}).get('tenant')
+        trace = self.profiler.begin(route, scope['method'], scope['path'], getattr(tenant, 'id', None))
+        token = current_trace.set(trace)
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            current_trace.reset(token)
+            self.profiler.end(trace, status)
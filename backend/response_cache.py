@@ -0,0 +1,185 @@
+import os
+import re
+import time
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+from starlette.datastructures import Headers
+
+logger = logging.getLogger(__name__)
+
+RESPONSE_CACHE_MAX_ENTRIES = int(os.environ.get('RESPONSE_CACHE_MAX_ENTRIES', '2000'))
+
+# Datos de usuarios: el navegador siempre revalida, y recibe 304 si no cambió
+REVALIDATE = "private, no-cache"
+
+
+class CacheRule:
+    """Ruta cacheable: patrón, TTL en segundos, etiquetas de invalidación y Cache-Control"""
+
+    def __init__(self, pattern: str, ttl: float, tags: List[str], cache_control: str = REVALIDATE):
+        self.pattern = re.compile(pattern)
+        self.ttl = ttl
+        self.tags = tags
+        self.cache_control = cache_control
+
+
+class CacheEntry:
+    def __init__(self, body: bytes, headers: List[Tuple[bytes, bytes]], etag: str, expires: float, tags: List[str]):
+        self.body = body
+        self.headers = headers
+        self.etag = etag
+        self.expires = expires
+        self.tags = tags
+
+
+def make_etag(body: bytes) -> str:
+    """ETag fuerte a partir del contenido"""
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Comparación débil de If-None-Match (RFC 9110)"""
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(',')]
+    return '*' in candidates or etag in [c[2:] if c.startswith('W/') else c for c in candidates]
+
+
+class ResponseCache:
+    """
+    Caché en memoria de respuestas GET con TTL por ruta, ETag fuerte
+    y GET condicional. Las mutaciones invalidan por etiqueta, ej:
+    `invalidate("users", "user:<id>")`.
+
+    La caché es por proceso: con varios workers, el TTL acota el tiempo
+    que otro worker puede servir una respuesta ya invalidada.
+    """
+
+    def __init__(self, rules: List[CacheRule], max_entries: int = RESPONSE_CACHE_MAX_ENTRIES):
+        self.rules = rules
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._generation = 0
+        self.counters = {'hits': 0, 'misses': 0, 'not_modified': 0, 'invalidations': 0}
+
+    def match(self, path: str) -> Tuple[Optional[CacheRule], List[str]]:
+        """Regla aplicable a la ruta y sus etiquetas con los parámetros resueltos"""
+        for rule in self.rules:
+            m = rule.pattern.match(path)
+            if m:
+                return rule, [tag.format(**m.groupdict()) for tag in rule.tags]
+        return None, []
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key: str, entry: CacheEntry, generation: int):
+        # No guardar si hubo una invalidación mientras se generaba la respuesta
+        if generation != self._generation:
+            return
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    def invalidate(self, *tags: str):
+        """Descarta las respuestas con alguna de las etiquetas"""
+        tags = set(tags)
+        self._generation += 1
+        self.counters['invalidations'] += 1
+        for key in [k for k, e in self._entries.items() if tags.intersection(e.tags)]:
+            del self._entries[key]
+
+    def clear(self):
+        self._generation += 1
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {'entries': len(self._entries), **self.counters}
+
+
+class ResponseCacheMiddleware:
+    """
+    Middleware ASGI que sirve desde `ResponseCache` las rutas configuradas.
+    Con `cache_for`, la caché se elige por solicitud (ej: una por campus).
+    """
+
+    def __init__(self, app, cache: Optional[ResponseCache] = None, cache_for: Optional[Callable[[dict], Optional[ResponseCache]]] = None):
+        self.app = app
+        self.cache = cache
+        self.cache_for = cache_for
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or scope['method'] != 'GET':
+            await self.app(scope, receive, send)
+            return
+
+        cache = self.cache_for(scope) if self.cache_for else self.cache
+        rule, tags = cache.match(scope['path']) if cache is not None else (None, [])
+        if rule is None:
+            await self.app(scope, receive, send)
+            return
+
+        key = scope['path'] + '?' + scope.get('query_string', b'').decode('latin-1')
+        if_none_match = Headers(scope=scope).get('if-none-match')
+
+        entry = cache.get(key)
+        if entry is not None:
+            cache.counters['hits'] += 1
+            await self._send_entry(cache, entry, if_none_match, send)
+            return
+
+        cache.counters['misses'] += 1
+        generation = cache.generation
+        start_message = None
+        chunks = []
+
+        async def capture(message):
+            nonlocal start_message
+            if message['type'] == 'http.response.start':
+                start_message = message
+            elif message['type'] == 'http.response.body':
+                chunks.append(message.get('body', b''))
+
+        await self.app(scope, receive, capture)
+        body = b''.join(chunks)
+
+        if start_message is None or start_message['status'] != 200:
+            if start_message is not None:
+                await send(start_message)
+                await send({'type': 'http.response.body', 'body': body})
+            return
+
+        headers = [
+            (name, value) for name, value in start_message.get('headers', [])
+            if name.lower() not in (b'etag', b'cache-control')
+        ]
+        headers.append((b'cache-control', rule.cache_control.encode()))
+        entry = CacheEntry(body, headers, make_etag(body), time.monotonic() + rule.ttl, tags)
+        cache.put(key, entry, generation)
+        await self._send_entry(cache, entry, if_none_match, send)
+
+    async def _send_entry(self, cache: ResponseCache, entry: CacheEntry, if_none_match: Optional[str], send):
+        etag_header = (b'etag', entry.etag.encode())
+        if etag_matches(if_none_match, entry.etag):
+            cache.counters['not_modified'] += 1
+            headers = [(n, v) for n, v in entry.headers if n.lower() == b'cache-control']
+            await send({'type': 'http.response.start', 'status': 304, 'headers': headers + [etag_header]})
+            await send({'type': 'http.response.body', 'body': b''})
+            return
+        await send({'type': 'http.response.start', 'status': 200, 'headers': entry.headers + [etag_header]})
+        await send({'type': 'http.response.body', 'body': entry.body})
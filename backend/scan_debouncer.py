@@ -0,0 +1,103 @@
+import os
+import time
+import logging
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Ventanas de antirrebote (segundos). Los escáneres USB como el Steren COM-5970
+# pueden enviar el mismo QR dos o tres veces en menos de un segundo.
+SCAN_DUPLICATE_WINDOW_SECONDS = float(os.environ.get('SCAN_DUPLICATE_WINDOW_SECONDS', '3'))
+SCAN_MIN_CHECKOUT_GAP_SECONDS = float(os.environ.get('SCAN_MIN_CHECKOUT_GAP_SECONDS', '60'))
+SCAN_DEBOUNCE_MAX_ENTRIES = int(os.environ.get('SCAN_DEBOUNCE_MAX_ENTRIES', '10000'))
+
+REASON_DUPLICATE = 'duplicate'
+REASON_CHECKOUT_TOO_SOON = 'checkout_too_soon'
+
+
+class ScanDebouncer:
+    """
+    Antirrebote en memoria por usuario para el registro de asistencia.
+
+    Rechaza lecturas repetidas antes de cualquier acceso a la base de datos:
+    - lecturas del mismo QR dentro de la ventana de duplicados
+    - una salida demasiado cercana a la entrada registrada
+    """
+
+    def __init__(
+        self,
+        duplicate_window: float = SCAN_DUPLICATE_WINDOW_SECONDS,
+        min_checkout_gap: float = SCAN_MIN_CHECKOUT_GAP_SECONDS,
+        max_entries: int = SCAN_DEBOUNCE_MAX_ENTRIES,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.duplicate_window = duplicate_window
+        self.min_checkout_gap = min_checkout_gap
+        self.max_entries = max_entries
+        self._clock = clock
+        # user_id -> instante de la última lectura admitida
+        self._last_seen: Dict[str, float] = {}
+        # user_id -> (acción registrada, instante)
+        self._last_action: Dict[str, tuple] = {}
+        self.counters = {
+            'admitted': 0,
+            REASON_DUPLICATE: 0,
+            REASON_CHECKOUT_TOO_SOON: 0
+        }
+
+    def admit(self, user_id: str) -> Optional[str]:
+        """
+        Decide si una lectura debe procesarse.
+        Retorna None si se admite, o el motivo de rechazo.
+        La llamada es síncrona, por lo que dos lecturas concurrentes
+        del mismo QR no pueden ser admitidas a la vez.
+        """
+        now = self._clock()
+
+        last_seen = self._last_seen.get(user_id)
+        if last_seen is not None and now - last_seen < self.duplicate_window:
+            self.counters[REASON_DUPLICATE] += 1
+            return REASON_DUPLICATE
+
+        last_action = self._last_action.get(user_id)
+        if last_action and last_action[0] == 'check_in' and now - last_action[1] < self.min_checkout_gap:
+            self.counters[REASON_CHECKOUT_TOO_SOON] += 1
+            return REASON_CHECKOUT_TOO_SOON
+
+        self._prune(now)
+        self._last_seen[user_id] = now
+        self.counters['admitted'] += 1
+        return None
+
+    def record(self, user_id: str, action: str):
+        """Registra la acción resultante ('check_in' o 'check_out') de una lectura admitida"""
+        self._last_action[user_id] = (action, self._clock())
+
+    def forget(self, user_id: str):
+        """Olvida el estado de un usuario (ej: si la lectura admitida falló)"""
+        self._last_seen.pop(user_id, None)
+
+    def stats(self) -> dict:
+        """Contadores para monitoreo"""
+        return {
+            'duplicate_window_seconds': self.duplicate_window,
+            'min_checkout_gap_seconds': self.min_checkout_gap,
+            'tracked_users': len(self._last_seen),
+            'admitted': self.counters['admitted'],
+            'suppressed_duplicate': self.counters[REASON_DUPLICATE],
+            'suppressed_checkout_too_soon': self.counters[REASON_CHECKOUT_TOO_SOON],
+            'suppressed_total': self.counters[REASON_DUPLICATE] + self.counters[REASON_CHECKOUT_TOO_SOON]
+        }
+
+    def _prune(self, now: float):
+        """Elimina entradas vencidas cuando se supera el máximo de usuarios rastreados"""
+        if len(self._last_seen) < self.max_entries:
+            return
+        horizon = max(self.duplicate_window, self.min_checkout_gap)
+        self._last_seen = {
+            uid: ts for uid, ts in self._last_seen.items() if now - ts < horizon
+        }
+        self._last_action = {
+            uid: entry for uid, entry in self._last_action.items() if now - entry[1] < horizon
+        }
+        logger.info(f"ScanDebouncer: {len(self._last_seen)} usuarios rastreados tras limpieza")
@@ -0,0 +1,314 @@
+import os
+import sys
+import json
+import asyncio
+import logging
+from collections import deque
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional
+
+from pymongo import ASCENDING, UpdateOne
+from pymongo.errors import BulkWriteError
+
+logger = logging.getLogger(__name__)
+
+SCAN_EVENTS_COLLECTION = 'scan_events'
+
+# Escritura en segundo plano: se vacía el búfer cada intervalo o al llenar un lote
+SCAN_EVENTS_FLUSH_INTERVAL = float(os.environ.get('SCAN_EVENTS_FLUSH_INTERVAL', '0.5'))
+SCAN_EVENTS_BATCH_SIZE = int(os.environ.get('SCAN_EVENTS_BATCH_SIZE', '500'))
+SCAN_EVENTS_MAX_BUFFER = int(os.environ.get('SCAN_EVENTS_MAX_BUFFER', '50000'))
+
+# Resultado de cada lectura
+RESULT_CHECK_IN = 'check_in'
+RESULT_CHECK_OUT = 'check_out'
+RESULT_DUPLICATE = 'duplicate'
+RESULT_TOO_SOON = 'too_soon'
+RESULT_UNKNOWN_USER = 'unknown_user'
+RESULT_ALREADY_OUT = 'already_out'
+ACCEPTED_RESULTS = (RESULT_CHECK_IN, RESULT_CHECK_OUT)
+
+
+def utc_now() -> datetime:
+    """Hora UTC con precisión de milisegundos (la de las fechas BSON): así el registro
+    de asistencia y su evento guardan exactamente la misma hora"""
+    now = datetime.now(timezone.utc)
+    return now.replace(microsecond=now.microsecond // 1000 * 1000)
+
+
+def make_event(
+    user_id: str,
+    device: str,
+    result: str,
+    ts: Optional[datetime] = None,
+    attendance_id: Optional[str] = None,
+    status: Optional[str] = None,
+    user_name: Optional[str] = None,
+    user_role: Optional[str] = None,
+    recorded_by: Optional[str] = None
+) -> dict:
+    """
+    Documento compacto de una lectura:
+    ts = fecha/hora, u = user_id, d = dispositivo, r = resultado,
+    a = id del registro de asistencia; las entradas llevan además
+    s = estado, n = nombre, ro = rol y by = quién registró, para poder
+    reconstruir el registro completo.
+    """
+    event = {"ts": ts or utc_now(), "u": user_id, "d": device, "r": result}
+    if attendance_id:
+        event["a"] = attendance_id
+    if result == RESULT_CHECK_IN:
+        event.update({"s": status, "n": user_name, "ro": user_role, "by": recorded_by or device})
+    return event
+
+
+def _iso(ts: datetime) -> str:
+    # MongoDB devuelve fechas sin zona: son UTC
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return ts.isoformat()
+
+
+def derive_attendance(events: Iterable[dict]) -> List[dict]:
+    """
+    Registros de asistencia que resultan de aplicar las lecturas en orden.
+    Solo cuentan las lecturas aceptadas; las rechazadas quedan para auditoría.
+    """
+    records: Dict[str, dict] = {}
+    for event in sorted(events, key=lambda e: e['ts']):
+        attendance_id = event.get('a')
+        if not attendance_id or event['r'] not in ACCEPTED_RESULTS:
+            continue
+        if event['r'] == RESULT_CHECK_IN:
+            records[attendance_id] = {
+                "id": attendance_id,
+                "user_id": event['u'],
+                "user_name": event.get('n'),
+                "user_role": event.get('ro'),
+                "check_in_time": _iso(event['ts']),
+                "check_out_time": None,
+                "date": _iso(event['ts'])[:10],
+                "status": event.get('s') or 'present',
+                "recorded_by": event.get('by', event['d']),
+            }
+        elif attendance_id in records:
+            records[attendance_id]["check_out_time"] = _iso(event['ts'])
+    return list(records.values())
+
+
+def fill_missing(row: dict) -> UpdateOne:
+    """
+    Escritura de un registro reproducido que no pisa lo que ya está guardado:
+    un registro que falta se inserta completo; en uno existente solo se
+    escriben los campos con valor. La bitácora puede haber perdido eventos
+    (búfer lleno, caída del proceso): una salida perdida no borra la guardada.
+    """
+    present = {k: v for k, v in row.items() if v is not None and k != 'id'}
+    missing = {k: v for k, v in row.items() if v is None}
+    update = {"$setOnInsert": {"id": row['id'], **missing}}
+    if present:
+        update["$set"] = present
+    return UpdateOne({"id": row['id']}, update, upsert=True)
+
+
+class ScanEventLog:
+    """
+    Bitácora de solo-anexado de todas las lecturas del escáner.
+
+    `append` no espera a la base: deja el evento en un búfer en memoria y una
+    tarea en segundo plano lo inserta en lotes con insert_many(ordered=False).
+    Al detenerse se vacía lo pendiente. Si la base no responde, los eventos se
+    reintentan en el siguiente ciclo; el búfer está acotado y, si se llena,
+    se descartan los más antiguos (contados en `dropped`).
+    """
+
+    def __init__(
+        self,
+        db,
+        flush_interval: float = SCAN_EVENTS_FLUSH_INTERVAL,
+        batch_size: int = SCAN_EVENTS_BATCH_SIZE,
+        max_buffer: int = SCAN_EVENTS_MAX_BUFFER
+    ):
+        self.db = db
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._buffer: deque = deque(maxlen=max_buffer)
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self.counters = {'appended': 0, 'written': 0, 'failed': 0, 'dropped': 0, 'flushes': 0}
+
+    @property
+    def collection(self):
+        return self.db[SCAN_EVENTS_COLLECTION]
+
+    async def ensure_indexes(self):
+        await self.collection.create_index([("ts", ASCENDING)])
+        await self.collection.create_index([("u", ASCENDING), ("ts", ASCENDING)])
+
+    def append(self, event: dict):
+        """Encola un evento (no bloquea)"""
+        if len(self._buffer) == self._buffer.maxlen:
+            self.counters['dropped'] += 1
+        self._buffer.append(event)
+        self.counters['appended'] += 1
+        if self._wakeup is not None and len(self._buffer) >= self.batch_size:
+            self._wakeup.set()
+
+    def start(self):
+        """Inicia la tarea de escritura en segundo plano"""
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._flush_lock = asyncio.Lock()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """Detiene la tarea y escribe lo pendiente"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.warning(f"No se pudo escribir la bitácora de lecturas: {e}")
+
+    async def flush(self) -> int:
+        """Inserta todo lo que hay en el búfer; devuelve cuántos eventos se escribieron"""
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        written = 0
+        async with self._flush_lock:
+            while self._buffer:
+                batch = [self._buffer.popleft() for _ in range(min(self.batch_size, len(self._buffer)))]
+                inserted = len(batch)
+                try:
+                    await self.collection.insert_many(batch, ordered=False)
+                except BulkWriteError as e:
+                    # Con ordered=False el resto del lote sí se insertó. Un reintento
+                    # de eventos ya escritos falla por _id duplicado, sin duplicarlos.
+                    failed = len(e.details.get('writeErrors', []))
+                    inserted -= failed
+                    self.counters['failed'] += failed
+                except Exception:
+                    # Base no disponible: devolver el lote al frente del búfer, en orden
+                    self._buffer.extendleft(reversed(batch))
+                    raise
+                finally:
+                    self.counters['flushes'] += 1
+                written += inserted
+                self.counters['written'] += inserted
+        return written
+
+    def stats(self) -> Dict[str, int]:
+        return {'buffered': len(self._buffer), **self.counters}
+
+    async def find(
+        self,
+        user_id: Optional[str] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        limit: Optional[int] = 1000
+    ) -> List[dict]:
+        """Eventos en orden cronológico (rango [start, end))"""
+        query = {}
+        if user_id:
+            query['u'] = user_id
+        if start or end:
+            query['ts'] = {}
+            if start:
+                query['ts']['$gte'] = start
+            if end:
+                query['ts']['$lt'] = end
+        cursor = self.collection.find(query, {"_id": 0}).sort("ts", ASCENDING)
+        return await cursor.to_list(limit)
+
+
+async def replay(log: ScanEventLog, store, calendar, start_date: str, end_date: str, target: str = 'attendance', dry_run: bool = False) -> dict:
+    """
+    Reconstruye estado desde la bitácora para un rango de fechas (YYYY-MM-DD, inclusivo).
+    target='attendance' completa los registros de asistencia (en su partición)
+    sin borrar campos guardados que falten en la bitácora;
+    target='calendar' reconstruye los bitsets del calendario de cada año
+    (la bitácora debe cubrir el año completo: se reescriben los bitsets).
+    """
+    start = datetime.fromisoformat(start_date).replace(tzinfo=timezone.utc)
+    end = datetime.fromisoformat(end_date).replace(tzinfo=timezone.utc)
+    end = end.replace(hour=23, minute=59, second=59, microsecond=999999)
+    events = await log.find(start=start, end=end, limit=None)
+    records = derive_attendance(events)
+    summary = {"events": len(events), "records": len(records), "target": target, "dry_run": dry_run}
+    if dry_run:
+        return summary
+
+    if target == 'attendance':
+        archived = set(await store.archived_years())
+        by_collection: Dict[str, list] = {}
+        for record in records:
+            year = int(record['date'][:4])
+            collection = store.collection_for_year(year) if year in archived else store.hot
+            by_collection.setdefault(collection.name, []).append(record)
+        for name, rows in by_collection.items():
+            await store.db[name].bulk_write(
+                [fill_missing(row) for row in rows],
+                ordered=False
+            )
+    elif target == 'calendar':
+        years = sorted({int(record['date'][:4]) for record in records})
+        for year in years:
+            # El calendario es anual: se reconstruye con todo el año, no solo el rango
+            year_events = await log.find(
+                start=datetime(year, 1, 1, tzinfo=timezone.utc),
+                end=datetime(year + 1, 1, 1, tzinfo=timezone.utc),
+                limit=None
+            )
+            await calendar.rebuild(year, derive_attendance(year_events))
+        summary["years"] = years
+    else:
+        raise ValueError(f"Destino desconocido: {target}")
+
+    logger.info(f"Bitácora reproducida {start_date}..{end_date} -> {target}: {len(records)} registros")
+    return summary
+
+
+def main(argv=None):
+    import argparse
+    from pathlib import Path
+    from dotenv import load_dotenv
+    from attendance_partitions import AttendancePartitions
+    from attendance_calendar import AttendanceCalendar
+    from database import Database
+
+    parser = argparse.ArgumentParser(description="Reproducir la bitácora de lecturas LISFA")
+    parser.add_argument('target', choices=['attendance', 'calendar'])
+    parser.add_argument('--start', required=True, help="YYYY-MM-DD")
+    parser.add_argument('--end', required=True, help="YYYY-MM-DD")
+    parser.add_argument('--dry-run', action='store_true', help="Solo contar, sin escribir")
+    args = parser.parse_args(argv)
+
+    load_dotenv(Path(__file__).parent / '.env')
+    database = Database(os.environ.get('MONGO_URL', 'mongodb://localhost:27017'), os.environ.get('DB_NAME', 'lisfa_attendance'))
+
+    result = asyncio.run(replay(
+        ScanEventLog(database.log_db), AttendancePartitions(database.db), AttendanceCalendar(database.db),
+        args.start, args.end, args.target, args.dry_run
+    ))
+    json.dump(result, sys.stdout, ensure_ascii=False, indent=2)
+    print()
+    database.close()
+
+
+if __name__ == '__main__':
+    main()
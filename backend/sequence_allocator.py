@@ -0,0 +1,78 @@
+import logging
+from typing import Awaitable, Callable, Dict, List
+
+from pymongo import ASCENDING, ReturnDocument
+
+logger = logging.getLogger(__name__)
+
+STUDENT_SEQUENCE = 'student_id'
+STUDENT_ID_PREFIX = 'LISFA-'
+
+
+def format_student_id(number: int) -> str:
+    """Código de estudiante LISFA-NNNN"""
+    return f"{STUDENT_ID_PREFIX}{str(number).zfill(4)}"
+
+
+async def max_existing_student_number(db) -> int:
+    """Mayor número LISFA-NNNN ya asignado (para inicializar el contador)"""
+    last = 0
+    cursor = db.users.find({"student_id": {"$regex": rf"^{STUDENT_ID_PREFIX}\d+$"}}, {"_id": 0, "student_id": 1})
+    async for user in cursor:
+        last = max(last, int(user['student_id'][len(STUDENT_ID_PREFIX):]))
+    return last
+
+
+class SequenceAllocator:
+    """
+    Secuencias atómicas respaldadas por la colección `counters`.
+
+    Cada asignación es un solo find_one_and_update con $inc: costo constante,
+    sin duplicados bajo concurrencia y sin reutilizar números de usuarios eliminados.
+    """
+
+    def __init__(self, db, collection: str = 'counters'):
+        self.db = db
+        self.collection = collection
+        self._seeds: Dict[str, Callable[[], Awaitable[int]]] = {}
+        self._initialized = set()
+
+    def register_seed(self, name: str, seed_fn: Callable[[], Awaitable[int]]):
+        """Función que da el valor inicial de una secuencia que aún no existe"""
+        self._seeds[name] = seed_fn
+
+    async def next(self, name: str) -> int:
+        return (await self.reserve(name, 1))[0]
+
+    async def reserve(self, name: str, count: int) -> List[int]:
+        """Reserva un bloque de `count` números consecutivos"""
+        if count <= 0:
+            return []
+        await self._ensure_initialized(name)
+        counter = await self.db[self.collection].find_one_and_update(
+            {"_id": name},
+            {"$inc": {"seq": count}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        end = counter['seq']
+        return list(range(end - count + 1, end + 1))
+
+    async def _ensure_initialized(self, name: str):
+        if name in self._initialized:
+            return
+        seed_fn = self._seeds.get(name)
+        if seed_fn and not await self.db[self.collection].find_one({"_id": name}):
+            # $max es idempotente si dos procesos inicializan a la vez
+            start = await seed_fn()
+            await self.db[self.collection].update_one({"_id": name}, {"$max": {"seq": start}}, upsert=True)
+            logger.info(f"Secuencia '{name}' inicializada en {start}")
+        self._initialized.add(name)
+
+    async def ensure_student_id_index(self):
+        """Índice único sobre student_id (solo usuarios con código asignado)"""
+        await self.db.users.create_index(
+            [("student_id", ASCENDING)],
+            unique=True,
+            partialFilterExpression={"student_id": {"$type": "string"}}
+        )
@@ -0,0 +1,84 @@
+import json
+from typing import Iterable, List, Optional
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # orjson es opcional: se usa json estándar si no está instalado
+    orjson = None
+
+
+def dumps(content) -> bytes:
+    """Serializa a JSON compacto (orjson si está disponible)"""
+    if orjson is not None:
+        # UTC como "Z", igual que pydantic
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_UTC_Z)
+    return json.dumps(content, ensure_ascii=False, separators=(',', ':'), default=str).encode('utf-8')
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse que serializa con `dumps`"""
+
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+def parse_fields(fields: Optional[str], allowed: Iterable[str]) -> List[str]:
+    """
+    Campos solicitados restringidos a los del modelo:
+    `?fields=a,b` incluye solo esos, `?fields=-qr_code` los excluye.
+    """
+    allowed = list(allowed)
+    if not fields:
+        return allowed
+    requested = [f.strip() for f in fields.split(',') if f.strip()]
+    if all(f.startswith('-') for f in requested):
+        excluded = [f[1:] for f in requested]
+        return [f for f in allowed if f not in excluded]
+    return [f for f in allowed if f in requested]
+
+
+def utc_z(rows: List[dict], fields: Iterable[str]) -> List[dict]:
+    """
+    Fechas ISO guardadas con "+00:00" se envían con "Z", como las
+    serializaba el response_model.
+    """
+    for row in rows:
+        for field in fields:
+            value = row.get(field)
+            if isinstance(value, str) and value.endswith('+00:00'):
+                row[field] = value[:-6] + 'Z'
+    return rows
+
+
+def shape_rows(rows: List[dict], fields: List[str]) -> List[dict]:
+    """Completa con None los campos ausentes (como lo hacía el response_model)"""
+    for row in rows:
+        for field in fields:
+            row.setdefault(field, None)
+    return rows
+
+
+def to_columnar(rows: List[dict], fields: List[str]) -> dict:
+    """Formato columnar compacto: nombres de campo una sola vez"""
+    return {
+        "count": len(rows),
+        "columns": {field: [row.get(field) for row in rows] for field in fields}
+    }
+
+
+def list_response(
+    rows: List[dict],
+    fields: List[str],
+    layout: Optional[str] = None,
+    datetime_fields: Iterable[str] = ()
+) -> FastJSONResponse:
+    """
+    Respuesta para listados con filas confiables de la base de datos:
+    evita revalidar cada fila con pydantic.
+    """
+    utc_z(rows, [f for f in datetime_fields if f in fields])
+    if layout == 'columnar':
+        return FastJSONResponse(content=to_columnar(rows, fields))
+    return FastJSONResponse(content=shape_rows(rows, fields))
@@ -1,14 +1,13 @@
-from fastapi import FastAPI, APIRouter, HTTPException, UploadFile, File, Form, Depends
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse, StreamingResponse, JSONResponse
+from fastapi import FastAPI, APIRouter, HTTPException, UploadFile, File, Form, Depends, Request, Query
+from fastapi.responses import StreamingResponse, JSONResponse, PlainTextResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
 import os
+import asyncio
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field, ConfigDict, EmailStr
-from typing import List, Optional
+from typing import Dict, List, Optional, Union
 import uuid
 from datetime import datetime, timezone, timedelta
 import hashlib
@@ -26,16 +25,35 @@ from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 import base64
 from notification_service import NotificationService
-from carnet_generator import CarnetGenerator
+from carnet_generator import CarnetGenerator, CATEGORIAS_ESTUDIANTES, CATEGORIAS_PERSONAL
+from scan_debouncer import REASON_DUPLICATE
+from attendance_calendar import ROSTER_ROLES
+import scan_events
+from scan_events import make_event
+from analytics import UnknownReport, InvalidReportRange, REPORTS
+from dataloader import Loaders
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from idempotency import IdempotencyInProgress, IdempotencyMismatch, fingerprint
+from bulk_import import SpreadsheetError, read_spreadsheet, import_users
+from sequence_allocator import STUDENT_SEQUENCE, format_student_id
+from response_cache import ResponseCacheMiddleware, CacheRule
+from tenants import Tenant, TenantRegistry, TenantMiddleware, load_tenant_configs, TENANTS_FILE, ISSUE_ATTENDANCE_DAY_NOT_UNIQUE
+from profiling import Profiler, SlowRoute, SlowRequestMiddleware, QueryTimingListener, PROFILING_INTERVAL_MS
+from compression import CompressionMiddleware
+from static_assets import (
+    ImmutableStaticFiles, UploadError, image_extension, save_upload, remove_upload, collect_uploads,
+    ranged_file_response
+)
+from admission import (
+    AdmissionController, AdmissionMiddleware, AdmissionRule,
+    PRIORITY_HIGH, PRIORITY_LOW, KEY_DEVICE, KEY_ACCOUNT
+)
+from serialization import FastJSONResponse, list_response, parse_fields
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection
-mongo_url = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ.get('DB_NAME', 'lisfa_attendance')]
-
 # JWT Configuration
 SECRET_KEY = os.environ.get('JWT_SECRET', 'your-secret-key-change-in-production')
 ALGORITHM = "HS256"
@@ -71,25 +89,93 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
         logging.error(f"Password verification error: {e}")
         return False
 
+# Caché HTTP de endpoints de lectura frecuente (ETag + GET condicional), una por campus.
+# Las rutas por usuario llevan además ATTENDANCE_ALL: una lectura invalida solo lo
+# de su usuario, y una reconstrucción masiva invalida todas las respuestas por usuario.
+ATTENDANCE_ALL = "attendance:*"
+CACHE_RULES = [
+    CacheRule(r"^/api/categories$", 86400, ["categories"], cache_control="public, max-age=86400"),
+    # /users/search no se cachea: cada búsqueda de autocompletado es distinta
+    CacheRule(r"^/api/users/(?!search$)(?P<user_id>[^/]+)$", 60, ["users"]),
+    CacheRule(r"^/api/parents/(?P<user_id>[^/]+)/students$", 60, ["users", "parent:{user_id}"]),
+    CacheRule(r"^/api/parents/(?P<user_id>[^/]+)$", 60, ["parent:{user_id}"]),
+    CacheRule(r"^/api/attendance/stats/(?P<user_id>[^/]+)$", 30, ["attendance:{user_id}", ATTENDANCE_ALL]),
+    CacheRule(r"^/api/attendance/calendar/summary$", 60, ["attendance"]),
+    CacheRule(r"^/api/attendance/calendar/(?P<user_id>[^/]+)$", 60, ["attendance:{user_id}", ATTENDANCE_ALL]),
+    CacheRule(r"^/api/dashboard/stats$", 10, ["attendance", "users"]),
+]
+
+# Campus: cada uno con su base de datos (pool por clúster), cachés y marca.
+# Sin TENANTS_FILE hay un solo campus sobre MONGO_URL / DB_NAME.
+mongo_url = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
+tenant_configs, default_tenant_id = load_tenant_configs(TENANTS_FILE, os.environ.get('DB_NAME', 'lisfa_attendance'))
+tenants = TenantRegistry(
+    tenant_configs, default_tenant_id, mongo_url, CACHE_RULES,
+    database_options={'event_listeners': [QueryTimingListener()]}
+)
+
+# Perfilador por muestreo: sesiones bajo demanda y captura de solicitudes lentas
+profiler = Profiler([
+    SlowRoute("record_attendance", r"^/api/attendance$", methods=('POST',)),
+    SlowRoute("get_attendance", r"^/api/attendance$"),
+    SlowRoute("generate_id_card", r"^/api/cards/generate/[^/]+$"),
+])
+
+# Control de admisión: tasa por dispositivo/IP, cupo por ruta y prioridad del escáner
+SCAN_RATE_PER_SECOND = float(os.environ.get('SCAN_RATE_PER_SECOND', '5'))
+SCAN_BURST = float(os.environ.get('SCAN_BURST', '20'))
+SCAN_MAX_CONCURRENCY = int(os.environ.get('SCAN_MAX_CONCURRENCY', '64'))
+# Tope por IP para todos los escáneres detrás de ella (la red del colegio sale por una sola IP)
+SCAN_IP_RATE_PER_SECOND = float(os.environ.get('SCAN_IP_RATE_PER_SECOND', '50'))
+SCAN_IP_BURST = float(os.environ.get('SCAN_IP_BURST', '200'))
+# Login por cuenta + IP (todo el personal entra a la misma hora desde la IP del colegio)
+# y un tope amplio por IP contra probar muchas cuentas
+LOGIN_RATE_PER_MINUTE = float(os.environ.get('LOGIN_RATE_PER_MINUTE', '20'))
+LOGIN_BURST = float(os.environ.get('LOGIN_BURST', '10'))
+LOGIN_IP_RATE_PER_MINUTE = float(os.environ.get('LOGIN_IP_RATE_PER_MINUTE', '600'))
+LOGIN_IP_BURST = float(os.environ.get('LOGIN_IP_BURST', '200'))
+REPORT_MAX_CONCURRENCY = int(os.environ.get('REPORT_MAX_CONCURRENCY', '4'))
+CARD_MAX_CONCURRENCY = int(os.environ.get('CARD_MAX_CONCURRENCY', '2'))
+
+admission = AdmissionController([
+    AdmissionRule("health", r"^/health$", priority=PRIORITY_HIGH),
+    AdmissionRule("scan", r"^/api/attendance$", methods=('POST',), priority=PRIORITY_HIGH,
+                  rate=SCAN_RATE_PER_SECOND, burst=SCAN_BURST, concurrency=SCAN_MAX_CONCURRENCY, key=KEY_DEVICE,
+                  ip_rate=SCAN_IP_RATE_PER_SECOND, ip_burst=SCAN_IP_BURST),
+    AdmissionRule("login", r"^/api/auth/login$", methods=('POST',),
+                  rate=LOGIN_RATE_PER_MINUTE / 60, burst=LOGIN_BURST, key=KEY_ACCOUNT,
+                  ip_rate=LOGIN_IP_RATE_PER_MINUTE / 60, ip_burst=LOGIN_IP_BURST),
+    AdmissionRule("reports", r"^/api/(reports|attendance/calendar/summary|attendance/events)", methods=('GET',),
+                  priority=PRIORITY_LOW, concurrency=REPORT_MAX_CONCURRENCY),
+    AdmissionRule("cards", r"^/api/cards/", methods=('GET',), priority=PRIORITY_LOW, concurrency=CARD_MAX_CONCURRENCY),
+    AdmissionRule("import", r"^/api/users/import$", methods=('POST',), priority=PRIORITY_LOW, concurrency=1),
+])
+
 # Create the main app
-app = FastAPI()
+app = FastAPI(default_response_class=FastJSONResponse)
 api_router = APIRouter(prefix="/api")
 
 # Health check endpoint for Kubernetes
 @app.get("/health")
 async def health_check():
-    """Health check endpoint for Kubernetes"""
-    return JSONResponse(content={"status": "healthy", "service": "lisfa-backend"})
+    """Health check endpoint for Kubernetes: ping a la base y saturación del pool"""
+    health = await tenants.health()
+    status_code = 503 if health['status'] == 'unhealthy' else 200
+    return JSONResponse(status_code=status_code, content={**health, "service": "lisfa-backend"})
 
 @app.get("/api/health")
 async def api_health_check():
     """API Health check endpoint"""
     return JSONResponse(content={"status": "healthy", "service": "lisfa-backend"})
 
-# Mount static files
-app.mount("/static", StaticFiles(directory=str(ROOT_DIR / "static")), name="static")
+# Mount static files (las fotos subidas llevan hash en el nombre: caché de un año)
+app.mount("/static", ImmutableStaticFiles(directory=str(ROOT_DIR / "static")), name="static")
 
 # Models
+def datetime_fields(model) -> List[str]:
+    """Campos datetime de un modelo (se envían en UTC con "Z" en los listados)"""
+    return [name for name, field in model.model_fields.items() if field.annotation in (datetime, Optional[datetime])]
+
 class User(BaseModel):
     model_config = ConfigDict(extra="ignore")
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -104,6 +190,9 @@ class User(BaseModel):
     qr_code: Optional[str] = None  # QR code data for students/teachers
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
+USER_FIELDS = list(User.model_fields)
+USER_DATETIME_FIELDS = datetime_fields(User)
+
 class UserCreate(BaseModel):
     email: EmailStr
     password: str
@@ -147,6 +236,14 @@ class Attendance(BaseModel):
     status: str = "present"  # present, late, absent
     recorded_by: str  # user_id of person who recorded it
 
+ATTENDANCE_FIELDS = list(Attendance.model_fields)
+ATTENDANCE_DATETIME_FIELDS = datetime_fields(Attendance)
+
+class ColumnarList(BaseModel):
+    """Listado con `format=columnar`: nombres de campo una sola vez"""
+    count: int
+    columns: Dict[str, list]
+
 class AttendanceCreate(BaseModel):
     qr_data: str
     recorded_by: str
@@ -159,6 +256,30 @@ class AttendanceStats(BaseModel):
     attendance_rate: float
 
 # Helper functions - Using the functions defined at the top of the file
+def get_tenant(request: Request) -> Tenant:
+    """Campus de la solicitud (resuelto por TenantMiddleware)"""
+    return request.state.tenant
+
+def get_loaders(tenant: Tenant = Depends(get_tenant)) -> Loaders:
+    """Loaders por request: agrupan búsquedas de usuarios/padres en consultas $in"""
+    return Loaders(tenant.db)
+
+async def require_admin(request: Request, tenant: Tenant = Depends(get_tenant)) -> dict:
+    """Solo administradores: token Bearer de /auth/login de un admin del mismo campus"""
+    scheme, _, token = request.headers.get('authorization', '').partition(' ')
+    if scheme.lower() != 'bearer' or not token:
+        raise HTTPException(status_code=401, detail="Se requiere iniciar sesión", headers={"WWW-Authenticate": "Bearer"})
+    try:
+        claims = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        raise HTTPException(status_code=401, detail="Sesión inválida o vencida", headers={"WWW-Authenticate": "Bearer"})
+    if claims.get('tenant') != tenant.id:
+        raise HTTPException(status_code=403, detail="La sesión es de otro campus")
+    user = await tenant.db.users.find_one({"id": claims.get('user_id')}, {"_id": 0, "id": 1, "role": 1})
+    if not user or user.get('role') != 'admin':
+        raise HTTPException(status_code=403, detail="Solo administradores")
+    return user
+
 def get_password_hash(password):
     return hash_password(password)
 
@@ -188,9 +309,9 @@ async def send_email_notification(to_email: str, subject: str, body: str):
 
 # Authentication Routes
 @api_router.post("/auth/register", response_model=User)
-async def register(user_data: UserCreate):
+async def register(user_data: UserCreate, tenant: Tenant = Depends(get_tenant)):
     # Check if user exists
-    existing_user = await db.users.find_one({"email": user_data.email}, {"_id": 0})
+    existing_user = await tenant.db.users.find_one({"email": user_data.email}, {"_id": 0})
     if existing_user:
         raise HTTPException(status_code=400, detail="Email already registered")
     
@@ -205,9 +326,8 @@ async def register(user_data: UserCreate):
     
     # Generate student ID for students
     if user_data.role == "student":
-        # Count existing students to generate ID
-        count = await db.users.count_documents({"role": "student"})
-        user.student_id = f"LISFA-{str(count + 1).zfill(4)}"
+        # Atomic sequence: constant cost, never reused after deletions
+        user.student_id = format_student_id(await tenant.sequences.next(STUDENT_SEQUENCE))
         # Generate QR code
         user.qr_code = generate_qr_code(user.id)
     elif user_data.role == "teacher":
@@ -219,18 +339,20 @@ async def register(user_data: UserCreate):
     del user_dict['created_at']
     user_dict['password'] = get_password_hash(user_data.password)
     
-    await db.users.insert_one(user_dict)
+    await tenant.db.users.insert_one(user_dict)
+    tenant.response_cache.invalidate("users")
+    tenant.user_search.upsert(user_dict)
     return user
 
 @api_router.post("/auth/login", response_model=Token)
-async def login(credentials: UserLogin):
+async def login(credentials: UserLogin, tenant: Tenant = Depends(get_tenant)):
     # Find user
-    user_doc = await db.users.find_one({"email": credentials.email}, {"_id": 0})
+    user_doc = await tenant.db.users.find_one({"email": credentials.email}, {"_id": 0})
     if not user_doc or not verify_password(credentials.password, user_doc['password']):
         raise HTTPException(status_code=401, detail="Invalid email or password")
     
     # Create access token
-    access_token = create_access_token(data={"sub": user_doc['email'], "user_id": user_doc['id']})
+    access_token = create_access_token(data={"sub": user_doc['email'], "user_id": user_doc['id'], "tenant": tenant.id})
     
     # Remove password from response
     del user_doc['password']
@@ -245,19 +367,44 @@ async def login(credentials: UserLogin):
     }
 
 # User Management Routes
-@api_router.get("/users", response_model=List[User])
-async def get_users(role: Optional[str] = None):
+@api_router.get("/users", response_model=None, responses={200: {"model": Union[List[User], ColumnarList]}})
+async def get_users(
+    role: Optional[str] = None,
+    fields: Optional[str] = None,
+    layout: Optional[str] = Query(None, alias="format"),
+    ids: Optional[str] = None,
+    tenant: Tenant = Depends(get_tenant)
+):
+    """
+    Listado de usuarios. `fields` limita los campos (ej: sin qr_code),
+    `ids` (separados por coma) trae solo esos usuarios y
+    `format=columnar` devuelve el formato compacto por columnas.
+    """
     query = {"role": role} if role else {}
-    users = await db.users.find(query, {"_id": 0, "password": 0}).to_list(1000)
+    if ids:
+        query['id'] = {"$in": [uid for uid in ids.split(',') if uid]}
+    selected = parse_fields(fields, USER_FIELDS)
+    projection = {"_id": 0, "timestamp": 1, **{field: 1 for field in selected}}
+    users = await tenant.db.users.find(query, projection).to_list(1000)
     for user in users:
-        if 'timestamp' in user:
-            user['created_at'] = user['timestamp']
-            del user['timestamp']
-    return users
+        timestamp = user.pop('timestamp', None)
+        if timestamp and 'created_at' in selected:
+            user['created_at'] = timestamp
+    return list_response(users, selected, layout, USER_DATETIME_FIELDS)
+
+@api_router.get("/users/search")
+async def search_users(q: str, role: Optional[str] = None, category: Optional[str] = None, limit: int = 10, tenant: Tenant = Depends(get_tenant)):
+    """
+    Búsqueda mientras se escribe por nombre, email, código o categoría (sin acentos).
+    `role` acepta varios roles separados por coma (ej: staff,admin).
+    """
+    await tenant.user_search.ensure_fresh(tenant.db)
+    roles = [r for r in role.split(',') if r] if role else None
+    return tenant.user_search.search(q, roles=roles, category=category, limit=max(1, min(limit, 50)))
 
 @api_router.get("/users/{user_id}", response_model=User)
-async def get_user(user_id: str):
-    user = await db.users.find_one({"id": user_id}, {"_id": 0, "password": 0})
+async def get_user(user_id: str, tenant: Tenant = Depends(get_tenant)):
+    user = await tenant.db.users.find_one({"id": user_id}, {"_id": 0, "password": 0})
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     if 'timestamp' in user:
@@ -266,68 +413,107 @@ async def get_user(user_id: str):
     return user
 
 @api_router.put("/users/{user_id}", response_model=User)
-async def update_user(user_id: str, updates: dict):
+async def update_user(user_id: str, updates: dict, tenant: Tenant = Depends(get_tenant)):
     # Remove fields that shouldn't be updated
     updates.pop('id', None)
     updates.pop('password', None)
     updates.pop('created_at', None)
     
-    result = await db.users.update_one({"id": user_id}, {"$set": updates})
+    result = await tenant.db.users.update_one({"id": user_id}, {"$set": updates})
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="User not found")
+    tenant.response_cache.invalidate("users")
     
-    return await get_user(user_id)
+    user = await get_user(user_id, tenant)
+    tenant.user_search.upsert(user)
+    return user
 
 @api_router.delete("/users/{user_id}")
-async def delete_user(user_id: str):
-    result = await db.users.delete_one({"id": user_id})
-    if result.deleted_count == 0:
+async def delete_user(user_id: str, tenant: Tenant = Depends(get_tenant)):
+    deleted = await tenant.db.users.find_one_and_delete({"id": user_id}, {"_id": 0, "photo_url": 1})
+    if deleted is None:
         raise HTTPException(status_code=404, detail="User not found")
+    remove_upload(deleted.get("photo_url"))
+    tenant.response_cache.invalidate("users")
+    tenant.user_search.remove(user_id)
     return {"message": "User deleted successfully"}
 
+@api_router.post("/users/import")
+async def import_users_file(file: UploadFile = File(...), dry_run: bool = Form(False), tenant: Tenant = Depends(get_tenant)):
+    """Importación masiva de usuarios desde CSV/XLSX con reporte por fila"""
+    content = await file.read()
+    try:
+        # pandas analiza el archivo fuera del event loop, igual que el hash de contraseñas
+        df = await asyncio.get_running_loop().run_in_executor(None, read_spreadsheet, content, file.filename)
+    except SpreadsheetError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    report = await import_users(tenant.db, df, get_password_hash, generate_qr_code, tenant.sequences, dry_run=dry_run)
+    if report['created']:
+        tenant.response_cache.invalidate("users")
+        await tenant.user_search.load(tenant.db)
+    return report
+
 @api_router.post("/users/{user_id}/upload-photo")
-async def upload_photo(user_id: str, file: UploadFile = File(...)):
-    # Save file
-    file_ext = file.filename.split('.')[-1]
-    filename = f"{user_id}.{file_ext}"
-    file_path = ROOT_DIR / "static" / "uploads" / filename
-    
-    with open(file_path, "wb") as f:
-        content = await file.read()
-        f.write(content)
-    
-    photo_url = f"/static/uploads/{filename}"
-    await db.users.update_one({"id": user_id}, {"$set": {"photo_url": photo_url}})
+async def upload_photo(user_id: str, file: UploadFile = File(...), tenant: Tenant = Depends(get_tenant)):
+    """Foto con nombre por contenido: una foto nueva es una URL nueva"""
+    try:
+        ext = image_extension(file.filename)
+        photo_url = save_upload(await file.read(), user_id, ext)
+    except UploadError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    previous = await tenant.db.users.find_one_and_update(
+        {"id": user_id}, {"$set": {"photo_url": photo_url}}, {"_id": 0, "password": 0}
+    )
+    if previous is None:
+        remove_upload(photo_url)
+        raise HTTPException(status_code=404, detail="User not found")
+    if previous.get("photo_url") != photo_url:
+        remove_upload(previous.get("photo_url"))
+    tenant.response_cache.invalidate("users")
+    # La búsqueda devuelve photo_url: sin esto seguiría apuntando a la foto borrada
+    tenant.user_search.upsert({**previous, "photo_url": photo_url})
     
     return {"photo_url": photo_url}
 
+@api_router.post("/uploads/gc", dependencies=[Depends(require_admin)])
+async def collect_orphan_uploads(dry_run: bool = True):
+    """Migrar fotos con nombre fijo y borrar las que ningún usuario usa (de todos los campus)"""
+    report = await collect_uploads([t.db for t in tenants], dry_run=dry_run)
+    if report['migrated'] and not dry_run:
+        for t in tenants:
+            t.response_cache.invalidate("users")
+    return report
+
 # Parent Routes
 @api_router.post("/parents", response_model=Parent)
-async def create_parent(parent_data: ParentCreate):
+async def create_parent(parent_data: ParentCreate, tenant: Tenant = Depends(get_tenant)):
     parent = Parent(**parent_data.model_dump())
     parent_dict = parent.model_dump()
-    await db.parents.insert_one(parent_dict)
+    await tenant.db.parents.insert_one(parent_dict)
+    tenant.response_cache.invalidate(f"parent:{parent.user_id}")
     return parent
 
 @api_router.post("/parents/link")
 async def link_parent_to_student(
     parent_user_id: str,
     student_id: str,
-    notification_email: str
+    notification_email: str,
+    tenant: Tenant = Depends(get_tenant)
 ):
     """Vincular un padre con un estudiante"""
     # Verificar que el padre exista
-    parent_user = await db.users.find_one({"id": parent_user_id, "role": "parent"}, {"_id": 0})
+    parent_user = await tenant.db.users.find_one({"id": parent_user_id, "role": "parent"}, {"_id": 0})
     if not parent_user:
         raise HTTPException(status_code=404, detail="Padre no encontrado")
     
     # Verificar que el estudiante exista
-    student = await db.users.find_one({"id": student_id, "role": "student"}, {"_id": 0})
+    student = await tenant.db.users.find_one({"id": student_id, "role": "student"}, {"_id": 0})
     if not student:
         raise HTTPException(status_code=404, detail="Estudiante no encontrado")
     
     # Crear o actualizar vinculación
-    result = await db.parents.update_one(
+    result = await tenant.db.parents.update_one(
         {"user_id": parent_user_id},
         {
             "$addToSet": {"student_ids": student_id},
@@ -337,6 +523,7 @@ async def link_parent_to_student(
         },
         upsert=True
     )
+    tenant.response_cache.invalidate(f"parent:{parent_user_id}")
     
     if result.upserted_id or result.modified_count > 0:
         return {
@@ -348,20 +535,27 @@ async def link_parent_to_student(
     else:
         raise HTTPException(status_code=500, detail="Error al vincular")
 
+@api_router.get("/parents", response_model=List[Parent])
+async def get_parents(user_ids: str, loaders: Loaders = Depends(get_loaders)):
+    """Vinculaciones de varios padres en una sola consulta (ids separados por coma)"""
+    ids = [uid for uid in user_ids.split(',') if uid]
+    parents = await loaders.parents.load_many(ids)
+    return [parent for parent in parents if parent]
+
 @api_router.get("/parents/{user_id}", response_model=Parent)
-async def get_parent(user_id: str):
-    parent = await db.parents.find_one({"user_id": user_id}, {"_id": 0})
+async def get_parent(user_id: str, tenant: Tenant = Depends(get_tenant)):
+    parent = await tenant.db.parents.find_one({"user_id": user_id}, {"_id": 0})
     if not parent:
         raise HTTPException(status_code=404, detail="Parent not found")
     return parent
 
 @api_router.get("/parents/{user_id}/students", response_model=List[User])
-async def get_parent_students(user_id: str):
-    parent = await db.parents.find_one({"user_id": user_id}, {"_id": 0})
+async def get_parent_students(user_id: str, tenant: Tenant = Depends(get_tenant)):
+    parent = await tenant.db.parents.find_one({"user_id": user_id}, {"_id": 0})
     if not parent:
         raise HTTPException(status_code=404, detail="Parent not found")
     
-    students = await db.users.find(
+    students = await tenant.db.users.find(
         {"id": {"$in": parent['student_ids']}},
         {"_id": 0, "password": 0}
     ).to_list(100)
@@ -374,14 +568,14 @@ async def get_parent_students(user_id: str):
     return students
 
 @api_router.get("/parents/by-student/{student_id}")
-async def get_parents_by_student(student_id: str):
+async def get_parents_by_student(student_id: str, loaders: Loaders = Depends(get_loaders), tenant: Tenant = Depends(get_tenant)):
     """Obtener todos los padres vinculados a un estudiante"""
-    parents = await db.parents.find({"student_ids": student_id}, {"_id": 0}).to_list(100)
+    parents = await tenant.db.parents.find({"student_ids": student_id}, {"_id": 0}).to_list(100)
     
-    # Obtener información completa de cada padre
+    # Obtener información completa de los padres en una sola consulta
+    parent_users = await loaders.users.load_many([parent['user_id'] for parent in parents])
     parent_info = []
-    for parent in parents:
-        parent_user = await db.users.find_one({"id": parent['user_id']}, {"_id": 0, "password": 0})
+    for parent, parent_user in zip(parents, parent_users):
         if parent_user:
             parent_info.append({
                 "parent_id": parent['user_id'],
@@ -395,35 +589,107 @@ async def get_parents_by_student(student_id: str):
 
 # Attendance Routes
 @api_router.post("/attendance", response_model=Attendance)
-async def record_attendance(attendance_data: AttendanceCreate):
+async def record_attendance(attendance_data: AttendanceCreate, request: Request, loaders: Loaders = Depends(get_loaders), tenant: Tenant = Depends(get_tenant)):
+    """
+    Registrar una lectura del escáner (entrada o salida).
+    Con la cabecera Idempotency-Key, un reintento de la misma lectura
+    devuelve la respuesta original en lugar de registrar otra transición.
+    """
+    idempotency_key = request.headers.get('idempotency-key')
+    if not idempotency_key:
+        return await _record_scan(tenant, attendance_data, request, loaders)
+
+    try:
+        stored = await tenant.idempotency.begin(idempotency_key, fingerprint(attendance_data.qr_data, attendance_data.recorded_by))
+    except IdempotencyInProgress:
+        raise HTTPException(status_code=409, detail="La lectura se está procesando, reintente en unos segundos")
+    except IdempotencyMismatch as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    if stored is not None:
+        return stored
+
+    try:
+        result = await _record_scan(tenant, attendance_data, request, loaders)
+    except BaseException:
+        await tenant.idempotency.abandon(idempotency_key)
+        raise
+    await tenant.idempotency.complete(idempotency_key, Attendance.model_validate(result).model_dump(mode='json'))
+    return result
+
+async def _check_out(tenant: Tenant, existing: dict, user_id: str, device: str) -> dict:
+    """
+    Registrar la salida con una actualización condicional: solo gana una
+    lectura aunque varios escáneres lean a la vez, y se respeta el tiempo
+    mínimo desde la entrada también entre procesos.
+    """
+    check_out_time = scan_events.utc_now()
+    earliest_check_in = (check_out_time - timedelta(seconds=tenant.scan_debouncer.min_checkout_gap)).isoformat()
+    updated = await tenant.db.attendance.find_one_and_update(
+        {"id": existing['id'], "check_out_time": None, "check_in_time": {"$lte": earliest_check_in}},
+        {"$set": {"check_out_time": check_out_time.isoformat()}},
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER
+    )
+    if updated:
+        tenant.scan_debouncer.record(user_id, 'check_out')
+        tenant.scan_log.append(make_event(
+            user_id, device, scan_events.RESULT_CHECK_OUT, ts=check_out_time, attendance_id=existing['id']
+        ))
+        tenant.response_cache.invalidate("attendance", f"attendance:{user_id}")
+        return updated
+
+    current = await tenant.db.attendance.find_one({"id": existing['id']}, {"_id": 0}) or existing
+    if not current.get('check_out_time'):
+        tenant.scan_log.append(make_event(user_id, device, scan_events.RESULT_TOO_SOON, attendance_id=existing['id']))
+        raise HTTPException(status_code=409, detail="Salida demasiado pronto después de la entrada")
+    checked_out_at = datetime.fromisoformat(current['check_out_time'])
+    if check_out_time - checked_out_at < timedelta(seconds=tenant.scan_debouncer.duplicate_window):
+        # Otro escáner registró la misma salida hace un instante
+        tenant.scan_log.append(make_event(user_id, device, scan_events.RESULT_DUPLICATE, attendance_id=existing['id']))
+        raise HTTPException(status_code=409, detail="Lectura duplicada ignorada")
+    tenant.scan_log.append(make_event(user_id, device, scan_events.RESULT_ALREADY_OUT, attendance_id=existing['id']))
+    raise HTTPException(status_code=400, detail="Already checked out today")
+
+async def _record_scan(tenant: Tenant, attendance_data: AttendanceCreate, request: Request, loaders: Loaders):
     # Decode QR data to get user_id
     user_id = attendance_data.qr_data
+    # Dispositivo que leyó el código (los escáneres envían X-Device-Id)
+    device = request.headers.get('x-device-id') or attendance_data.recorded_by
+    
+    # Rechazar lecturas duplicadas antes de tocar la base de datos
+    rejection = tenant.scan_debouncer.admit(user_id)
+    if rejection == REASON_DUPLICATE:
+        tenant.scan_log.append(make_event(user_id, device, scan_events.RESULT_DUPLICATE))
+        raise HTTPException(status_code=409, detail="Lectura duplicada ignorada")
+    elif rejection:
+        tenant.scan_log.append(make_event(user_id, device, scan_events.RESULT_TOO_SOON))
+        raise HTTPException(status_code=409, detail="Salida demasiado pronto después de la entrada")
     
-    # Get user
-    user = await db.users.find_one({"id": user_id}, {"_id": 0})
+    # Una lectura admitida que no llega a registrarse se olvida: el reintento
+    # (QR corregido, base disponible de nuevo) no debe contar como duplicado
+    try:
+        # Get user
+        user = await tenant.db.users.find_one({"id": user_id}, {"_id": 0})
+        
+        # Check if already checked in today
+        today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+        existing = await tenant.db.attendance.find_one({
+            "user_id": user_id,
+            "date": today
+        }, {"_id": 0}) if user else None
+    except Exception:
+        tenant.scan_debouncer.forget(user_id)
+        raise
     if not user:
+        tenant.scan_debouncer.forget(user_id)
+        tenant.scan_log.append(make_event(user_id, device, scan_events.RESULT_UNKNOWN_USER))
         raise HTTPException(status_code=404, detail="User not found")
     
-    # Check if already checked in today
-    today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
-    existing = await db.attendance.find_one({
-        "user_id": user_id,
-        "date": today
-    }, {"_id": 0})
-    
     if existing:
-        # Check out
-        if not existing.get('check_out_time'):
-            await db.attendance.update_one(
-                {"id": existing['id']},
-                {"$set": {"check_out_time": datetime.now(timezone.utc).isoformat()}}
-            )
-            return await db.attendance.find_one({"id": existing['id']}, {"_id": 0})
-        else:
-            raise HTTPException(status_code=400, detail="Already checked out today")
+        return await _check_out(tenant, existing, user_id, device)
     
     # Create new attendance record
-    current_time = datetime.now(timezone.utc)
+    current_time = scan_events.utc_now()
     status = "present"
     # Mark as late if after 8 AM
     if current_time.hour >= 8:
@@ -442,23 +708,41 @@ async def record_attendance(attendance_data: AttendanceCreate):
     attendance_dict = attendance.model_dump()
     attendance_dict['check_in_time'] = attendance_dict['check_in_time'].isoformat()
     
-    await db.attendance.insert_one(attendance_dict)
+    try:
+        await tenant.db.attendance.insert_one(attendance_dict)
+    except DuplicateKeyError:
+        # Otro escáner registró la entrada entre la lectura y el insert (índice único
+        # user_id + date): esta lectura es la misma entrada, se devuelve ese registro
+        winner = await tenant.db.attendance.find_one({"user_id": user_id, "date": today}, {"_id": 0})
+        tenant.scan_log.append(make_event(user_id, device, scan_events.RESULT_DUPLICATE, attendance_id=winner['id']))
+        return winner
+    except Exception:
+        tenant.scan_debouncer.forget(user_id)
+        raise
+    tenant.scan_debouncer.record(user_id, 'check_in')
+    tenant.scan_log.append(make_event(
+        user_id, device, scan_events.RESULT_CHECK_IN, ts=current_time, attendance_id=attendance.id,
+        status=status, user_name=user['full_name'], user_role=user['role'], recorded_by=attendance_data.recorded_by
+    ))
+    try:
+        await tenant.attendance_calendar.mark(user_id, today, status)
+    except Exception as e:
+        # El calendario es derivado: se puede reconstruir con /attendance/calendar/rebuild
+        logger.warning(f"No se pudo actualizar el calendario de {user_id}: {e}")
+    tenant.response_cache.invalidate("attendance", f"attendance:{user_id}")
     
     # Send notification to parents if student
     if user['role'] == 'student':
         # Get all parents linked to this student
-        parents = await db.parents.find({"student_ids": user_id}, {"_id": 0}).to_list(100)
+        parents = await tenant.db.parents.find({"student_ids": user_id}, {"_id": 0}).to_list(100)
         
         if parents:
-            parent_emails = []
-            for parent in parents:
-                if parent.get('notification_email'):
-                    parent_emails.append(parent['notification_email'])
-                else:
-                    # Try to get email from parent's user record
-                    parent_user = await db.users.find_one({"id": parent['user_id']}, {"_id": 0})
-                    if parent_user and parent_user.get('email'):
-                        parent_emails.append(parent_user['email'])
+            parent_emails = [parent['notification_email'] for parent in parents if parent.get('notification_email')]
+            # Try to get email from parent's user record (one batched query)
+            fallback_ids = [parent['user_id'] for parent in parents if not parent.get('notification_email')]
+            for parent_user in await loaders.users.load_many(fallback_ids):
+                if parent_user and parent_user.get('email'):
+                    parent_emails.append(parent_user['email'])
             
             if parent_emails:
                 # Send real-time notification
@@ -467,43 +751,103 @@ async def record_attendance(attendance_data: AttendanceCreate):
                     user_name=user['full_name'],
                     event_type=event_type,
                     event_time=current_time,
-                    parent_emails=parent_emails
+                    parent_emails=parent_emails,
+                    branding=tenant.email_branding
                 )
                 logger.info(f"Notifications sent: {notification_results}")
     
     return attendance
 
-@api_router.get("/attendance", response_model=List[Attendance])
+@api_router.get("/attendance", response_model=None, responses={200: {"model": Union[List[Attendance], ColumnarList]}})
 async def get_attendance(
     user_id: Optional[str] = None,
     date: Optional[str] = None,
-    role: Optional[str] = None
+    role: Optional[str] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    fields: Optional[str] = None,
+    layout: Optional[str] = Query(None, alias="format"),
+    tenant: Tenant = Depends(get_tenant)
 ):
     query = {}
     if user_id:
         query['user_id'] = user_id
     if date:
         query['date'] = date
+        start_date = end_date = date
+    elif start_date or end_date:
+        query['date'] = {}
+        if start_date:
+            query['date']['$gte'] = start_date
+        if end_date:
+            query['date']['$lte'] = end_date
     if role:
         query['user_role'] = role
     
-    records = await db.attendance.find(query, {"_id": 0}).to_list(1000)
-    for record in records:
-        if 'check_in_time' in record and isinstance(record['check_in_time'], str):
-            record['check_in_time'] = datetime.fromisoformat(record['check_in_time'])
-        if 'check_out_time' in record and isinstance(record['check_out_time'], str) and record['check_out_time']:
-            record['check_out_time'] = datetime.fromisoformat(record['check_out_time'])
-    
-    return records
+    selected = parse_fields(fields, ATTENDANCE_FIELDS)
+    projection = {"_id": 0, **{field: 1 for field in selected}}
+    # Los registros vienen de la base con fechas ISO: se envían sin revalidar
+    records = await tenant.attendance_store.find(query, start_date, end_date, limit=1000, projection=projection)
+    return list_response(records, selected, layout, ATTENDANCE_DATETIME_FIELDS)
+
+@api_router.get("/attendance/debounce-stats")
+async def get_debounce_stats(tenant: Tenant = Depends(get_tenant)):
+    """Contadores de lecturas suprimidas por el antirrebote"""
+    return tenant.scan_debouncer.stats()
+
+@api_router.get("/attendance/events")
+async def get_scan_events(
+    user_id: Optional[str] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    limit: int = 1000,
+    tenant: Tenant = Depends(get_tenant)
+):
+    """Bitácora de lecturas (auditoría), en orden cronológico"""
+    try:
+        start = datetime.fromisoformat(start_date).replace(tzinfo=timezone.utc) if start_date else None
+        end = datetime.fromisoformat(end_date).replace(tzinfo=timezone.utc) + timedelta(days=1) if end_date else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Fecha inválida, use YYYY-MM-DD")
+    await tenant.scan_log.flush()
+    events = await tenant.scan_log.find(user_id, start, end, limit=min(limit, 10000))
+    for event in events:
+        event['ts'] = event['ts'].replace(tzinfo=timezone.utc).isoformat()
+    return events
+
+@api_router.get("/attendance/events/stats")
+async def get_scan_events_stats(tenant: Tenant = Depends(get_tenant)):
+    """Estado del búfer de la bitácora de lecturas"""
+    return tenant.scan_log.stats()
+
+@api_router.post("/attendance/events/replay", dependencies=[Depends(require_admin)])
+async def replay_scan_events(start_date: str, end_date: str, target: str = 'attendance', dry_run: bool = False, tenant: Tenant = Depends(get_tenant)):
+    """Reconstruir asistencia o calendario desde la bitácora de lecturas"""
+    if target not in ('attendance', 'calendar'):
+        raise HTTPException(status_code=400, detail="Destino inválido: use attendance o calendar")
+    try:
+        await tenant.scan_log.flush()
+        result = await scan_events.replay(
+            tenant.scan_log, tenant.attendance_store, tenant.attendance_calendar, start_date, end_date, target, dry_run
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not dry_run:
+        tenant.response_cache.invalidate("attendance", ATTENDANCE_ALL)
+    return result
 
 @api_router.get("/attendance/stats/{user_id}", response_model=AttendanceStats)
-async def get_attendance_stats(user_id: str, start_date: Optional[str] = None, end_date: Optional[str] = None):
+async def get_attendance_stats(user_id: str, start_date: Optional[str] = None, end_date: Optional[str] = None, tenant: Tenant = Depends(get_tenant)):
     query = {"user_id": user_id}
     
-    if start_date and end_date:
-        query['date'] = {"$gte": start_date, "$lte": end_date}
+    if start_date or end_date:
+        query['date'] = {}
+        if start_date:
+            query['date']['$gte'] = start_date
+        if end_date:
+            query['date']['$lte'] = end_date
     
-    records = await db.attendance.find(query, {"_id": 0}).to_list(1000)
+    records = await tenant.attendance_store.find(query, start_date, end_date, limit=1000)
     
     total_days = len(records)
     present_days = len([r for r in records if r['status'] in ['present', 'late']])
@@ -520,11 +864,129 @@ async def get_attendance_stats(user_id: str, start_date: Optional[str] = None, e
         attendance_rate=round(attendance_rate, 2)
     )
 
+@api_router.get("/attendance/calendar/summary")
+async def get_attendance_calendar_summary(year: Optional[int] = None, role: Optional[str] = None, tenant: Tenant = Depends(get_tenant)):
+    """
+    Porcentajes y rachas del ciclo para todo el padrón (por defecto estudiantes
+    y docentes), incluidos quienes nunca registraron asistencia
+    """
+    year = year or datetime.now(timezone.utc).year
+    roles = [role] if role else ROSTER_ROLES
+    users = await tenant.db.users.find({"role": {"$in": roles}}, {"_id": 0, "id": 1}).to_list(None)
+    return await tenant.attendance_calendar.school_summary(year, [u['id'] for u in users])
+
+@api_router.get("/attendance/calendar/{user_id}")
+async def get_attendance_calendar(user_id: str, year: Optional[int] = None, tenant: Tenant = Depends(get_tenant)):
+    """Vista anual de asistencia de un estudiante"""
+    year = year or datetime.now(timezone.utc).year
+    return await tenant.attendance_calendar.student_calendar(user_id, year)
+
+@api_router.post("/attendance/calendar/rebuild/{year}", dependencies=[Depends(require_admin)])
+async def rebuild_attendance_calendar(year: int, tenant: Tenant = Depends(get_tenant)):
+    """Reconstruir el calendario del ciclo desde los registros de asistencia"""
+    start_date, end_date = f"{year}-01-01", f"{year}-12-31"
+    records = await tenant.attendance_store.find(
+        {"date": {"$gte": start_date, "$lte": end_date}},
+        start_date, end_date, limit=None,
+        projection={"_id": 0, "user_id": 1, "date": 1, "status": 1}
+    )
+    users = await tenant.attendance_calendar.rebuild(year, records)
+    tenant.response_cache.invalidate("attendance", ATTENDANCE_ALL)
+    return {"year": year, "records": len(records), "users": users}
+
+@api_router.get("/attendance/partitions")
+async def get_attendance_partitions(tenant: Tenant = Depends(get_tenant)):
+    """Ciclos escolares archivados"""
+    return await tenant.attendance_store.list_partitions()
+
+@api_router.post("/attendance/archive/{year}", dependencies=[Depends(require_admin)])
+async def archive_attendance_year(year: int, tenant: Tenant = Depends(get_tenant)):
+    """Mover un ciclo escolar cerrado a su propia colección"""
+    try:
+        return await tenant.attendance_store.archive_year(year)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@api_router.post("/attendance/merge-duplicates", dependencies=[Depends(require_admin)])
+async def merge_duplicate_attendance(tenant: Tenant = Depends(get_tenant)):
+    """
+    Migración: fusionar registros duplicados por persona y día (de antes del
+    índice único) y crear el índice. Borra los registros sobrantes.
+    """
+    merged = await tenant.attendance_store.merge_duplicate_days()
+    unique = await tenant.attendance_store.ensure_indexes()
+    if unique and ISSUE_ATTENDANCE_DAY_NOT_UNIQUE in tenant.issues:
+        tenant.issues.remove(ISSUE_ATTENDANCE_DAY_NOT_UNIQUE)
+    if merged:
+        tenant.response_cache.invalidate("attendance", ATTENDANCE_ALL)
+    logger.warning(f"[{tenant.id}] Se fusionaron {merged} registros de asistencia duplicados por día")
+    return {"merged": merged, "unique_index": unique}
+
 # ID Card Generation
+def build_card_data(user: dict) -> dict:
+    """Datos del usuario para el carnet"""
+    # Generar código de identificación según el rol
+    role = user.get('role', 'student')
+    if role == 'student':
+        user_code = user.get('student_id', f"EST{user['id'][:6].upper()}")
+    elif role == 'teacher':
+        user_code = user.get('teacher_id', f"DOC{user['id'][:6].upper()}")
+    elif role == 'admin':
+        user_code = user.get('admin_id', f"ADM{user['id'][:6].upper()}")
+    else:
+        user_code = f"PER{user['id'][:6].upper()}"
+    
+    return {
+        'id': user['id'],
+        'full_name': user.get('full_name', 'Sin Nombre'),
+        'student_id': user_code,
+        'category': user.get('category') or user.get('grade', 'N/A'),
+        'role': role,
+        'photo_url': user.get('photo_url'),
+        'qr_data': user['id']
+    }
+
+@api_router.get("/cards/batch")
+async def generate_id_cards_batch(
+    role: Optional[str] = None,
+    category: Optional[str] = None,
+    user_ids: Optional[str] = None,
+    tenant: Tenant = Depends(get_tenant)
+):
+    """Carnets de varios usuarios en un solo PDF (una página por carnet)"""
+    query = {"role": {"$ne": "parent"}}
+    if role:
+        if role == 'parent':
+            raise HTTPException(status_code=400, detail="Los padres no requieren carnet de identificación")
+        query['role'] = role
+    if category:
+        query['category'] = category
+    if user_ids:
+        query['id'] = {"$in": [uid for uid in user_ids.split(',') if uid]}
+    
+    users = await tenant.db.users.find(query, {"_id": 0, "password": 0, "qr_code": 0}).sort("full_name", 1).to_list(1000)
+    if not users:
+        raise HTTPException(status_code=404, detail="No hay usuarios para generar carnets")
+    
+    # El dibujo es CPU puro: fuera del event loop para no detener las lecturas de los escáneres
+    pdf_buffer = await asyncio.get_running_loop().run_in_executor(
+        None, CarnetGenerator.generate_carnets, [build_card_data(user) for user in users], tenant.carnet_template
+    )
+    filename = f"carnets_{(category or role or 'lote').replace(' ', '_')}.pdf"
+    return StreamingResponse(
+        pdf_buffer,
+        media_type="application/pdf",
+        headers={
+            "Content-Disposition": f"attachment; filename={filename}",
+            "Cache-Control": "no-cache",
+            "X-Content-Type-Options": "nosniff"
+        }
+    )
+
 @api_router.get("/cards/generate/{user_id}")
-async def generate_id_card(user_id: str):
+async def generate_id_card(user_id: str, tenant: Tenant = Depends(get_tenant)):
     try:
-        user = await db.users.find_one({"id": user_id}, {"_id": 0})
+        user = await tenant.db.users.find_one({"id": user_id}, {"_id": 0})
         if not user:
             logger.error(f"User not found: {user_id}")
             raise HTTPException(status_code=404, detail="Usuario no encontrado")
@@ -535,32 +997,14 @@ async def generate_id_card(user_id: str):
         
         logger.info(f"Generating card for user: {user.get('full_name', 'Unknown')}")
         
-        # Generar código de identificación según el rol
-        role = user.get('role', 'student')
-        if role == 'student':
-            user_code = user.get('student_id', f"EST{user['id'][:6].upper()}")
-        elif role == 'teacher':
-            user_code = user.get('teacher_id', f"DOC{user['id'][:6].upper()}")
-        elif role == 'admin':
-            user_code = user.get('admin_id', f"ADM{user['id'][:6].upper()}")
-        else:
-            user_code = f"PER{user['id'][:6].upper()}"
-        
-        # Preparar datos del usuario para el carnet
-        user_data = {
-            'id': user['id'],
-            'full_name': user.get('full_name', 'Sin Nombre'),
-            'student_id': user_code,
-            'category': user.get('category') or user.get('grade', 'N/A'),
-            'role': role,
-            'photo_url': user.get('photo_url'),
-            'qr_data': user['id']
-        }
+        user_data = build_card_data(user)
         
         logger.info(f"User data prepared: {user_data}")
         
         # Generar carnet usando el nuevo generador
-        pdf_buffer = CarnetGenerator.generate_carnet(user_data)
+        pdf_buffer = await asyncio.get_running_loop().run_in_executor(
+            None, CarnetGenerator.generate_carnet, user_data, tenant.carnet_template
+        )
         
         if not pdf_buffer or pdf_buffer.getbuffer().nbytes == 0:
             logger.error("Generated PDF is empty")
@@ -585,16 +1029,16 @@ async def generate_id_card(user_id: str):
 
 # Dashboard Stats
 @api_router.get("/dashboard/stats")
-async def get_dashboard_stats():
+async def get_dashboard_stats(tenant: Tenant = Depends(get_tenant)):
     today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
     
     # Count users by role
-    students_count = await db.users.count_documents({"role": "student"})
-    teachers_count = await db.users.count_documents({"role": "teacher"})
+    students_count = await tenant.db.users.count_documents({"role": "student"})
+    teachers_count = await tenant.db.users.count_documents({"role": "teacher"})
     
     # Today's attendance
-    today_attendance = await db.attendance.count_documents({"date": today})
-    today_present = await db.attendance.count_documents({"date": today, "status": {"$in": ["present", "late"]}})
+    today_attendance = await tenant.db.attendance.count_documents({"date": today})
+    today_present = await tenant.db.attendance.count_documents({"date": today, "status": {"$in": ["present", "late"]}})
     
     return {
         "total_students": students_count,
@@ -604,37 +1048,150 @@ async def get_dashboard_stats():
         "attendance_rate": round((today_present / students_count * 100) if students_count > 0 else 0, 2)
     }
 
+# Reports
+@api_router.get("/reports")
+async def list_reports():
+    """Reportes disponibles"""
+    return {"reports": sorted(REPORTS)}
+
+@api_router.get("/reports/{name}")
+async def get_report(
+    name: str,
+    start_date: str,
+    end_date: str,
+    role: Optional[str] = None,
+    category: Optional[str] = None,
+    threshold: Optional[float] = None,
+    tenant: Tenant = Depends(get_tenant)
+):
+    """Reporte de asistencia por rango de fechas (ver tenant.analytics.REPORTS)"""
+    try:
+        return await tenant.analytics.report(name, start_date, end_date, role, category, threshold)
+    except UnknownReport:
+        raise HTTPException(status_code=404, detail="Reporte no encontrado")
+    except InvalidReportRange as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 # Categories
+CATEGORIES_BY_ROLE = {
+    "student": CATEGORIAS_ESTUDIANTES,
+    "staff": CATEGORIAS_PERSONAL,
+    "teacher": CATEGORIAS_PERSONAL,
+    "admin": CATEGORIAS_PERSONAL
+}
+
 @api_router.get("/categories")
 async def get_categories():
     """Obtener categorías disponibles por rol"""
-    from carnet_generator import CATEGORIAS_ESTUDIANTES, CATEGORIAS_PERSONAL
-    return {
-        "student": CATEGORIAS_ESTUDIANTES,
-        "staff": CATEGORIAS_PERSONAL,
-        "teacher": CATEGORIAS_PERSONAL,
-        "admin": CATEGORIAS_PERSONAL
-    }
+    return CATEGORIES_BY_ROLE
+
+@api_router.get("/cache/stats")
+async def get_cache_stats(tenant: Tenant = Depends(get_tenant)):
+    """Aciertos, fallos y 304 de la caché HTTP"""
+    return tenant.response_cache.stats()
+
+@api_router.get("/admission/stats")
+async def get_admission_stats():
+    """
+    Solicitudes admitidas/rechazadas y picos por clase de ruta (para dimensionar
+    límites). Son del proceso, sumando todos los campus: las tasas se limitan por
+    campus, pero la capacidad que se dimensiona es la del proceso compartido.
+    """
+    return admission.stats()
+
+@api_router.post("/admission/reset-peaks")
+async def reset_admission_peaks():
+    """Reiniciar los picos medidos"""
+    admission.reset_peaks()
+    return admission.stats()
+
+# Perfilado (solo administradores; los datos son del proceso que atiende la solicitud)
+@api_router.post("/profiling/start", dependencies=[Depends(require_admin)])
+async def start_profiling(seconds: int = 30, interval_ms: float = PROFILING_INTERVAL_MS):
+    """Muestrear todos los hilos durante `seconds` segundos"""
+    try:
+        return profiler.start_session(seconds, interval_ms)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+@api_router.post("/profiling/stop", dependencies=[Depends(require_admin)])
+async def stop_profiling():
+    """Detener el perfil en curso antes de tiempo"""
+    status = profiler.stop_session()
+    if status is None:
+        raise HTTPException(status_code=404, detail="No hay ningún perfil")
+    return status
+
+@api_router.get("/profiling/status", dependencies=[Depends(require_admin)])
+async def get_profiling_status():
+    """Estado del perfil bajo demanda y contadores de solicitudes lentas"""
+    return profiler.stats()
+
+@api_router.get("/profiling/profile", dependencies=[Depends(require_admin)])
+async def download_profile():
+    """Último perfil en formato folded (flamegraph.pl, speedscope)"""
+    profile = profiler.session_profile()
+    if profile is None:
+        raise HTTPException(status_code=404, detail="No hay ningún perfil")
+    return PlainTextResponse(profile, headers={"Content-Disposition": "attachment; filename=profile.folded"})
+
+@api_router.get("/profiling/slow-requests", dependencies=[Depends(require_admin)])
+async def get_slow_requests():
+    """Solicitudes lentas recientes con sus consultas a MongoDB y pilas más frecuentes"""
+    return profiler.slow_summary()
+
+@api_router.get("/profiling/slow-requests/profile", dependencies=[Depends(require_admin)])
+async def download_slow_requests_profile(route: Optional[str] = None):
+    """Pilas de las solicitudes lentas (opcionalmente de una ruta) en formato folded"""
+    return PlainTextResponse(
+        profiler.slow_profile(route),
+        headers={"Content-Disposition": "attachment; filename=slow-requests.folded"}
+    )
+
+@api_router.delete("/profiling/slow-requests", dependencies=[Depends(require_admin)])
+async def clear_slow_requests():
+    profiler.clear_slow()
+    return {"message": "Solicitudes lentas descartadas"}
 
 # Endpoint para descargar ZIP del proyecto
 @api_router.get("/download/proyecto")
-async def download_proyecto():
-    """Descarga el archivo ZIP del proyecto completo"""
+@api_router.head("/download/proyecto")
+async def download_proyecto(request: Request):
+    """Descarga el archivo ZIP del proyecto completo (reanudable con Range)"""
     zip_path = ROOT_DIR / "static" / "proyecto_LISFA_completo.zip"
     if not zip_path.exists():
         # Fallback al archivo anterior
         zip_path = ROOT_DIR / "static" / "proyecto_LISFA.zip"
     if not zip_path.exists():
         raise HTTPException(status_code=404, detail="Archivo no encontrado")
-    return FileResponse(
-        path=str(zip_path),
-        filename="proyecto_LISFA_completo.zip",
-        media_type="application/zip"
+    return ranged_file_response(
+        zip_path, request.headers, "proyecto_LISFA_completo.zip", "application/zip", method=request.method
     )
 
 # Include the router in the main app
 app.include_router(api_router)
 
+def tenant_response_cache(scope):
+    """Caché HTTP del campus de la solicitud (las rutas exentas no tienen)"""
+    tenant = scope.get('state', {}).get('tenant')
+    return tenant.response_cache if tenant is not None else None
+
+def tenant_partition(scope):
+    """Campus de la solicitud para separar las cubetas de admisión"""
+    tenant = scope.get('state', {}).get('tenant')
+    return tenant.id if tenant is not None else ''
+
+# Mide las rutas observadas por el perfilador (solo el tiempo del handler)
+app.add_middleware(SlowRequestMiddleware, profiler=profiler)
+# Las respuestas en caché no consumen cupo de admisión
+app.add_middleware(AdmissionMiddleware, controller=admission, partition=tenant_partition)
+app.add_middleware(ResponseCacheMiddleware, cache_for=tenant_response_cache)
+# Resuelve el campus antes de la caché (cada campus tiene la suya)
+app.add_middleware(TenantMiddleware, registry=tenants, exempt=('/health', '/api/health', '/static/'))
+app.add_middleware(CompressionMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
@@ -650,6 +1207,13 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def create_indexes():
+    await tenants.start()
+    profiler.start()
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+    profiler.stop()
+    await tenants.stop()
+    tenants.close()
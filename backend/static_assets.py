@@ -0,0 +1,299 @@
+import os
+import re
+import sys
+import json
+import time
+import asyncio
+import hashlib
+import logging
+from email.utils import formatdate
+from pathlib import Path
+from typing import Iterable, Optional, Set, Tuple
+
+from starlette.datastructures import Headers
+from starlette.responses import Response, StreamingResponse
+from starlette.staticfiles import StaticFiles
+
+logger = logging.getLogger(__name__)
+
+ROOT_DIR = Path(__file__).parent
+UPLOADS_DIR = ROOT_DIR / "static" / "uploads"
+UPLOADS_URL = "/static/uploads/"
+
+UPLOAD_MAX_BYTES = int(os.environ.get('UPLOAD_MAX_BYTES', str(5 * 1024 * 1024)))
+# Un archivo recién escrito puede no estar aún en la base: el GC no lo toca antes de esto
+UPLOAD_GC_GRACE_SECONDS = int(os.environ.get('UPLOAD_GC_GRACE_SECONDS', '3600'))
+DOWNLOAD_CHUNK_SIZE = 256 * 1024
+
+# El contenido de una URL con hash no cambia nunca: el navegador no vuelve a pedirla
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# Archivos sin hash (logos, fotos anteriores): revalidar con ETag (304 sin cuerpo)
+REVALIDATE_CACHE_CONTROL = "public, no-cache"
+
+IMAGE_EXTENSIONS = {'jpg': 'jpg', 'jpeg': 'jpg', 'png': 'png', 'webp': 'webp', 'gif': 'gif'}
+HASHED_NAME = re.compile(r'^[\w-]+\.[0-9a-f]{16}\.[a-z0-9]+$')
+
+
+class UploadError(ValueError):
+    """Archivo subido no aceptado"""
+
+
+class RangeNotSatisfiable(Exception):
+    """El rango pedido queda fuera del archivo"""
+
+
+def image_extension(filename: Optional[str]) -> str:
+    """Extensión normalizada de una imagen (jpeg -> jpg) o UploadError"""
+    ext = (filename or '').rsplit('.', 1)[-1].lower() if '.' in (filename or '') else ''
+    if ext not in IMAGE_EXTENSIONS:
+        raise UploadError(f"Formato no permitido, use: {', '.join(sorted(set(IMAGE_EXTENSIONS.values())))}")
+    return IMAGE_EXTENSIONS[ext]
+
+
+def hashed_name(prefix: str, content: bytes, ext: str) -> str:
+    """`{prefix}.{hash}.{ext}`: otra foto es otra URL"""
+    return f"{prefix}.{hashlib.sha256(content).hexdigest()[:16]}.{ext}"
+
+
+def is_hashed(name: str) -> bool:
+    return HASHED_NAME.match(name) is not None
+
+
+def upload_name(url: Optional[str]) -> Optional[str]:
+    """Nombre del archivo en uploads de una photo_url, o None si no es de uploads"""
+    if not url or not url.startswith(UPLOADS_URL):
+        return None
+    name = url[len(UPLOADS_URL):]
+    return name if name and '/' not in name and name not in ('.', '..') else None
+
+
+def save_upload(content: bytes, prefix: str, ext: str, directory: Path = UPLOADS_DIR) -> str:
+    """
+    Guarda el archivo con nombre por contenido y devuelve su URL. La escritura
+    es atómica (temporal + rename); si el mismo contenido ya existe no se reescribe.
+    """
+    if not content:
+        raise UploadError("El archivo está vacío")
+    if len(content) > UPLOAD_MAX_BYTES:
+        raise UploadError(f"El archivo supera {UPLOAD_MAX_BYTES // (1024 * 1024)} MB")
+    name = hashed_name(prefix, content, ext)
+    path = directory / name
+    if not path.exists():
+        directory.mkdir(parents=True, exist_ok=True)
+        tmp = directory / f".{name}.{os.getpid()}.tmp"
+        with open(tmp, 'wb') as f:
+            f.write(content)
+        os.replace(tmp, path)
+    return UPLOADS_URL + name
+
+
+def remove_upload(url: Optional[str], directory: Path = UPLOADS_DIR) -> bool:
+    """Borra el archivo de una photo_url anterior (si es de uploads)"""
+    name = upload_name(url)
+    if name is None:
+        return False
+    try:
+        (directory / name).unlink()
+        return True
+    except FileNotFoundError:
+        return False
+
+
+def collect_orphans(
+    referenced: Set[str],
+    directory: Path = UPLOADS_DIR,
+    grace_seconds: int = UPLOAD_GC_GRACE_SECONDS,
+    dry_run: bool = False,
+    now: Optional[float] = None
+) -> dict:
+    """Borra los archivos de uploads que ningún usuario referencia (más antiguos que la gracia)"""
+    now = now or time.time()
+    report = {'deleted': [], 'bytes_freed': 0, 'kept': 0, 'recent': 0, 'dry_run': dry_run}
+    if not directory.exists():
+        return report
+    for path in directory.iterdir():
+        if not path.is_file():
+            continue
+        if path.name in referenced:
+            report['kept'] += 1
+            continue
+        stat = path.stat()
+        if now - stat.st_mtime < grace_seconds:
+            report['recent'] += 1
+            continue
+        if not dry_run:
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                continue
+        report['deleted'].append(path.name)
+        report['bytes_freed'] += stat.st_size
+    return report
+
+
+async def migrate_legacy_photos(db, directory: Path = UPLOADS_DIR, dry_run: bool = False) -> int:
+    """Renombra fotos con URL fija ({user_id}.{ext}) a nombres por contenido"""
+    migrated = 0
+    cursor = db.users.find({"photo_url": {"$regex": f"^{re.escape(UPLOADS_URL)}"}}, {"_id": 0, "id": 1, "photo_url": 1})
+    async for user in cursor:
+        name = upload_name(user['photo_url'])
+        if name is None or is_hashed(name) or not (directory / name).is_file():
+            continue
+        migrated += 1
+        if dry_run:
+            continue
+        content = (directory / name).read_bytes()
+        ext = IMAGE_EXTENSIONS.get(name.rsplit('.', 1)[-1].lower(), name.rsplit('.', 1)[-1].lower())
+        url = save_upload(content, user['id'], ext, directory)
+        # Condicional: no pisar una foto subida mientras tanto
+        await db.users.update_one({"id": user['id'], "photo_url": user['photo_url']}, {"$set": {"photo_url": url}})
+    return migrated
+
+
+async def referenced_uploads(dbs: Iterable) -> Set[str]:
+    """Archivos de uploads referenciados por los usuarios de todas las bases (falla si alguna no responde)"""
+    referenced = set()
+    for db in dbs:
+        cursor = db.users.find({"photo_url": {"$regex": f"^{re.escape(UPLOADS_URL)}"}}, {"_id": 0, "photo_url": 1})
+        async for user in cursor:
+            name = upload_name(user['photo_url'])
+            if name:
+                referenced.add(name)
+    return referenced
+
+
+async def collect_uploads(dbs: list, directory: Path = UPLOADS_DIR, dry_run: bool = False) -> dict:
+    """
+    Recolector de uploads: migra fotos con nombre fijo y borra las huérfanas.
+    Recibe las bases de todos los campus (comparten el directorio).
+    """
+    migrated = 0
+    for db in dbs:
+        migrated += await migrate_legacy_photos(db, directory, dry_run)
+    referenced = await referenced_uploads(dbs)
+    report = await asyncio.get_running_loop().run_in_executor(
+        None, lambda: collect_orphans(referenced, directory, dry_run=dry_run)
+    )
+    report['migrated'] = migrated
+    if report['deleted']:
+        logger.info(f"Uploads huérfanos {'a borrar' if dry_run else 'borrados'}: {len(report['deleted'])}")
+    return report
+
+
+class ImmutableStaticFiles(StaticFiles):
+    """StaticFiles con caché de un año para nombres con hash y revalidación para el resto"""
+
+    def file_response(self, full_path, stat_result, scope, status_code: int = 200) -> Response:
+        response = super().file_response(full_path, stat_result, scope, status_code)
+        if is_hashed(os.path.basename(full_path)):
+            response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+        else:
+            response.headers['Cache-Control'] = REVALIDATE_CACHE_CONTROL
+        return response
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Rango (inicio, fin inclusivo) de `Range: bytes=...`. None si la cabecera
+    no aplica (otra unidad, varios rangos o sintaxis inválida: se envía todo).
+    """
+    unit, _, spec = header.partition('=')
+    if unit.strip().lower() != 'bytes' or ',' in spec:
+        return None
+    first, sep, last = spec.strip().partition('-')
+    if not sep:
+        return None
+    try:
+        if first == '':
+            # Sufijo: los últimos N bytes
+            length = int(last)
+            if length <= 0 or size == 0:
+                raise RangeNotSatisfiable()
+            return max(0, size - length), size - 1
+        start = int(first)
+        end = int(last) if last else size - 1
+    except ValueError:
+        return None
+    if start >= size:
+        raise RangeNotSatisfiable()
+    if start > end:
+        return None
+    return start, min(end, size - 1)
+
+
+def _file_chunks(path: Path, start: int, length: int):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(DOWNLOAD_CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def ranged_file_response(path: Path, request_headers: Headers, filename: str, media_type: str, method: str = 'GET') -> Response:
+    """
+    Descarga reanudable: Range (206 / 416), If-Range, ETag y GET condicional.
+    El archivo se lee por bloques en el threadpool.
+    """
+    stat = path.stat()
+    size = stat.st_size
+    etag = '"' + hashlib.md5(f"{stat.st_mtime_ns}-{size}".encode()).hexdigest() + '"'
+    last_modified = formatdate(stat.st_mtime, usegmt=True)
+    headers = {
+        'Accept-Ranges': 'bytes',
+        'ETag': etag,
+        'Last-Modified': last_modified,
+        'Cache-Control': REVALIDATE_CACHE_CONTROL,
+        'Content-Disposition': f'attachment; filename="{filename}"',
+    }
+
+    if request_headers.get('if-none-match') in (etag, f"W/{etag}"):
+        return Response(status_code=304, headers={k: v for k, v in headers.items() if k != 'Content-Disposition'})
+
+    byte_range = None
+    range_header = request_headers.get('range')
+    if_range = request_headers.get('if-range')
+    # If-Range: solo continuar si el archivo es el mismo que se empezó a bajar
+    if range_header and (not if_range or if_range in (etag, last_modified)):
+        try:
+            byte_range = parse_range(range_header, size)
+        except RangeNotSatisfiable:
+            return Response(status_code=416, headers={**headers, 'Content-Range': f"bytes */{size}"})
+
+    status_code = 200
+    start, length = 0, size
+    if byte_range is not None:
+        start, end = byte_range
+        length = end - start + 1
+        status_code = 206
+        headers['Content-Range'] = f"bytes {start}-{end}/{size}"
+    headers['Content-Length'] = str(length)
+
+    if method == 'HEAD':
+        return Response(status_code=status_code, headers=headers, media_type=media_type)
+    return StreamingResponse(_file_chunks(path, start, length), status_code=status_code, headers=headers, media_type=media_type)
+
+
+def main(argv=None):
+    import argparse
+    from dotenv import load_dotenv
+    from tenants import TenantRegistry, load_tenant_configs, TENANTS_FILE
+
+    parser = argparse.ArgumentParser(description="Recolector de fotos subidas sin referencia")
+    parser.add_argument('--dry-run', action='store_true', help="Solo listar, sin borrar ni renombrar")
+    args = parser.parse_args(argv)
+
+    load_dotenv(ROOT_DIR / '.env')
+    configs, default_id = load_tenant_configs(TENANTS_FILE, os.environ.get('DB_NAME', 'lisfa_attendance'))
+    registry = TenantRegistry(configs, default_id, os.environ.get('MONGO_URL', 'mongodb://localhost:27017'), [])
+
+    result = asyncio.run(collect_uploads([tenant.db for tenant in registry], dry_run=args.dry_run))
+    json.dump(result, sys.stdout, ensure_ascii=False, indent=2)
+    print()
+    registry.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,341 @@
+import os
+import re
+import json
+import inspect
+import logging
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from starlette.datastructures import Headers, QueryParams
+
+from database import Database
+from attendance_partitions import AttendancePartitions
+from attendance_calendar import AttendanceCalendar
+from analytics import AttendanceAnalytics
+from sequence_allocator import SequenceAllocator, STUDENT_SEQUENCE, max_existing_student_number
+from scan_debouncer import ScanDebouncer
+from scan_events import ScanEventLog
+from user_search import UserSearchIndex
+from idempotency import IdempotencyStore
+from response_cache import ResponseCache, CacheRule
+from carnet_generator import CarnetTemplate, INSTITUTION_LINES, FOOTER_TEXT, CONTACT_PHONE, DEFAULT_LOGO_PATH
+from notification_service import EmailBranding, INSTITUTION_NAME, EMAIL_COLOR, FROM_EMAIL
+from serialization import dumps
+
+logger = logging.getLogger(__name__)
+
+ROOT_DIR = Path(__file__).parent
+
+# Campus configurados (JSON, ver tenants.example.json). Sin archivo hay un solo
+# campus con la base DB_NAME, igual que antes.
+TENANTS_FILE = os.environ.get('TENANTS_FILE', str(ROOT_DIR / 'tenants.json'))
+DEFAULT_TENANT_ID = os.environ.get('DEFAULT_TENANT_ID', 'lisfa')
+
+# El campus se elige por cabecera, por parámetro (enlaces de descarga) o por host
+TENANT_HEADER = 'x-tenant-id'
+TENANT_QUERY_PARAM = 'tenant'
+
+ISSUE_STUDENT_ID_NOT_UNIQUE = 'student_id_not_unique'
+ISSUE_ATTENDANCE_DAY_NOT_UNIQUE = 'attendance_day_not_unique'
+
+_TENANT_ID = re.compile(r'^[a-z0-9][a-z0-9_-]{0,31}$')
+
+
+class TenantConfigError(ValueError):
+    """Configuración de campus inválida"""
+
+
+class TenantConfig:
+    """
+    Un campus: su base de datos (y opcionalmente su propio clúster), los
+    hosts que lo identifican y su marca para carnets y correos.
+    """
+
+    def __init__(
+        self,
+        id: str,
+        db_name: str,
+        name: str = INSTITUTION_NAME,
+        mongo_url: Optional[str] = None,
+        hosts: Tuple[str, ...] = (),
+        institution_lines: Tuple[str, str] = INSTITUTION_LINES,
+        footer: str = FOOTER_TEXT,
+        contact: str = CONTACT_PHONE,
+        logo: str = str(DEFAULT_LOGO_PATH),
+        email_color: str = EMAIL_COLOR,
+        from_email: str = FROM_EMAIL
+    ):
+        if not _TENANT_ID.match(id or ''):
+            raise TenantConfigError(f"Identificador de campus inválido: {id!r}")
+        if len(institution_lines) != 2:
+            raise TenantConfigError(f"institution_lines de {id} debe tener dos líneas")
+        self.id = id
+        self.db_name = db_name
+        self.name = name
+        self.mongo_url = mongo_url
+        self.hosts = tuple(h.lower() for h in hosts)
+        self.institution_lines = tuple(institution_lines)
+        self.footer = footer
+        self.contact = contact
+        # Rutas relativas al directorio del backend (ej: static/logos/norte.png)
+        self.logo = logo if Path(logo).is_absolute() else str(ROOT_DIR / logo)
+        self.email_color = email_color
+        self.from_email = from_email
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "TenantConfig":
+        unknown = set(data) - set(inspect.signature(cls).parameters)
+        if unknown:
+            raise TenantConfigError(f"Campos desconocidos en el campus {data.get('id')}: {sorted(unknown)}")
+        if 'db_name' not in data:
+            raise TenantConfigError(f"Falta db_name en el campus {data.get('id')}")
+        return cls(**data)
+
+
+def load_tenant_configs(path: str, default_db_name: str) -> Tuple[List[TenantConfig], str]:
+    """
+    Campus del archivo `path` y el id del campus por defecto.
+    Sin archivo: un solo campus (DEFAULT_TENANT_ID) sobre `default_db_name`.
+    """
+    if not path or not Path(path).exists():
+        return [TenantConfig(DEFAULT_TENANT_ID, default_db_name)], DEFAULT_TENANT_ID
+
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    configs = [TenantConfig.from_dict(item) for item in data.get('tenants', [])]
+    if not configs:
+        raise TenantConfigError(f"{path} no define ningún campus")
+
+    ids = [c.id for c in configs]
+    if len(set(ids)) != len(ids):
+        raise TenantConfigError("Hay campus con el mismo id")
+    locations = [(c.mongo_url, c.db_name) for c in configs]
+    if len(set(locations)) != len(locations):
+        raise TenantConfigError("Dos campus no pueden compartir base de datos")
+    hosts = [h for c in configs for h in c.hosts]
+    if len(set(hosts)) != len(hosts):
+        raise TenantConfigError("Un host está asignado a más de un campus")
+
+    default_id = data.get('default', configs[0].id)
+    if default_id is not None and default_id not in ids:
+        raise TenantConfigError(f"Campus por defecto desconocido: {default_id}")
+    return configs, default_id
+
+
+class Tenant:
+    """
+    Servicios de un campus sobre su propia base: asistencia, calendario,
+    reportes, secuencias, bitácora, búsqueda, idempotencia y caché HTTP.
+    Nada se comparte entre campus salvo el pool de conexiones del clúster.
+    """
+
+    def __init__(self, config: TenantConfig, database: Database, cache_rules: List[CacheRule]):
+        self.id = config.id
+        self.config = config
+        self.database = database
+        self.db = database.db
+
+        self.attendance_store = AttendancePartitions(self.db)
+        self.attendance_calendar = AttendanceCalendar(self.db)
+        self.analytics = AttendanceAnalytics(database.reports_db, self.attendance_store)
+        self.sequences = SequenceAllocator(self.db)
+        self.sequences.register_seed(STUDENT_SEQUENCE, lambda: max_existing_student_number(self.db))
+        self.scan_debouncer = ScanDebouncer()
+        self.scan_log = ScanEventLog(database.log_db)
+        self.user_search = UserSearchIndex()
+        self.idempotency = IdempotencyStore(self.db)
+        self.response_cache = ResponseCache(cache_rules)
+
+        self.carnet_template = CarnetTemplate(
+            institution_lines=config.institution_lines,
+            contact=config.contact,
+            footer=config.footer,
+            logo_path=config.logo
+        )
+        self.email_branding = EmailBranding(config.name, config.email_color, config.from_email)
+        # Garantías que no se pudieron establecer al iniciar (se informan en /health)
+        self.issues: List[str] = []
+
+    async def start(self):
+        """Índices, índice de búsqueda y bitácora del campus"""
+        try:
+            if not await self.attendance_store.ensure_indexes():
+                self.issues.append(ISSUE_ATTENDANCE_DAY_NOT_UNIQUE)
+        except Exception as e:
+            logger.warning(f"[{self.id}] No se pudieron crear los índices de asistencia: {e}")
+        try:
+            await self.attendance_calendar.ensure_indexes()
+        except Exception as e:
+            logger.warning(f"[{self.id}] No se pudieron crear los índices del calendario: {e}")
+        try:
+            await self.sequences.ensure_student_id_index()
+        except Exception as e:
+            # Ocurre si ya existen códigos duplicados asignados con el conteo anterior:
+            # sin el índice los códigos no son únicos, por eso /health queda degradado
+            logger.error(f"[{self.id}] No se pudo crear el índice único de student_id: {e}")
+            self.issues.append(ISSUE_STUDENT_ID_NOT_UNIQUE)
+        try:
+            await self.scan_log.ensure_indexes()
+        except Exception as e:
+            logger.warning(f"[{self.id}] No se pudieron crear los índices de la bitácora de lecturas: {e}")
+        try:
+            await self.idempotency.ensure_indexes()
+        except Exception as e:
+            logger.warning(f"[{self.id}] No se pudieron crear los índices de idempotencia: {e}")
+        try:
+            await self.user_search.load(self.db)
+        except Exception as e:
+            # Se vuelve a intentar en la primera búsqueda
+            logger.warning(f"[{self.id}] No se pudo cargar el índice de búsqueda de usuarios: {e}")
+        self.scan_log.start()
+
+    async def stop(self):
+        try:
+            await self.scan_log.stop()
+        except Exception as e:
+            logger.warning(f"[{self.id}] No se pudo vaciar la bitácora de lecturas: {e}")
+
+    def info(self) -> dict:
+        return {'id': self.id, 'name': self.config.name}
+
+
+class TenantRegistry:
+    """
+    Campus de la instalación. Cada uno tiene su base de datos; los que
+    están en el mismo clúster comparten un solo cliente (y pool) de Motor.
+    `database_options` se pasan a cada `Database` (ej: event_listeners).
+    """
+
+    def __init__(
+        self,
+        configs: List[TenantConfig],
+        default_id: Optional[str],
+        default_mongo_url: str,
+        cache_rules: List[CacheRule],
+        database_options: Optional[dict] = None
+    ):
+        self.default_id = default_id
+        self.tenants: Dict[str, Tenant] = {}
+        self._clusters: Dict[str, Database] = {}
+        self._hosts: Dict[str, Tenant] = {}
+        for config in configs:
+            url = config.mongo_url or default_mongo_url
+            cluster = self._clusters.get(url)
+            if cluster is None:
+                database = cluster = self._clusters[url] = Database(url, config.db_name, **(database_options or {}))
+            else:
+                database = cluster.sibling(config.db_name)
+            tenant = self.tenants[config.id] = Tenant(config, database, cache_rules)
+            for host in config.hosts:
+                self._hosts[host] = tenant
+
+    def __iter__(self):
+        return iter(self.tenants.values())
+
+    def __len__(self):
+        return len(self.tenants)
+
+    @property
+    def default(self) -> Optional[Tenant]:
+        return self.tenants.get(self.default_id) if self.default_id else None
+
+    def get(self, tenant_id: str) -> Optional[Tenant]:
+        return self.tenants.get(tenant_id)
+
+    def resolve(self, scope) -> Tuple[Optional[Tenant], bool]:
+        """
+        Campus de la solicitud: host, cabecera X-Tenant-Id, parámetro ?tenant=
+        o el campus por defecto. Devuelve (campus, se pidió explícitamente).
+
+        La cabecera y el parámetro no están autenticados: en un host asignado a
+        un campus solo se aceptan si nombran ese mismo campus; cualquier otro
+        se trata como campus no encontrado en lugar de cambiar de base de datos.
+        """
+        headers = Headers(scope=scope)
+        requested = headers.get(TENANT_HEADER)
+        if not requested and scope.get('query_string'):
+            requested = QueryParams(scope['query_string']).get(TENANT_QUERY_PARAM)
+        host = (headers.get('host') or '').split(':')[0].lower()
+        tenant = self._hosts.get(host)
+        if tenant is not None:
+            if requested and requested != tenant.id:
+                return None, True
+            return tenant, True
+        if requested:
+            return self.tenants.get(requested), True
+        return self.default, False
+
+    async def start(self):
+        for tenant in self:
+            await tenant.start()
+
+    async def stop(self):
+        for tenant in self:
+            await tenant.stop()
+
+    async def health(self) -> dict:
+        """
+        Salud de cada clúster; el estado general es el peor de ellos. Un campus
+        con garantías faltantes (ej: índice único) deja el estado al menos degradado.
+        """
+        order = ['healthy', 'degraded', 'unhealthy']
+        if len(self._clusters) == 1:
+            result = await next(iter(self._clusters.values())).health()
+        else:
+            clusters = []
+            for url, cluster in self._clusters.items():
+                health = await cluster.health()
+                # Los campus del clúster, no su URL (incluye credenciales)
+                health['tenants'] = [t.id for t in self if t.database.client is cluster.client]
+                clusters.append(health)
+            status = max((c['status'] for c in clusters), key=order.index)
+            result = {'status': status, 'clusters': clusters}
+
+        issues = {t.id: t.issues for t in self if t.issues}
+        if issues:
+            result['issues'] = issues
+            result['status'] = max(result['status'], 'degraded', key=order.index)
+        return result
+
+    def close(self):
+        for cluster in self._clusters.values():
+            cluster.close()
+
+
+class TenantMiddleware:
+    """
+    Middleware ASGI que resuelve el campus y lo deja en el estado de la
+    solicitud (`request.state.tenant`). Un campus pedido que no existe es 404.
+    Las rutas de `exempt` (salud, archivos estáticos) no requieren campus.
+    """
+
+    def __init__(self, app, registry: TenantRegistry, exempt: Tuple[str, ...] = ()):
+        self.app = app
+        self.registry = registry
+        self.exempt = exempt
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        tenant, explicit = self.registry.resolve(scope)
+        if tenant is None and not explicit and scope['path'].startswith(self.exempt):
+            await self.app(scope, receive, send)
+            return
+        if tenant is None:
+            detail = "Campus no encontrado" if explicit else "Indique el campus (cabecera X-Tenant-Id)"
+            body = dumps({"detail": detail})
+            await send({
+                'type': 'http.response.start',
+                'status': 404 if explicit else 400,
+                'headers': [
+                    (b'content-type', b'application/json'),
+                    (b'content-length', str(len(body)).encode()),
+                ],
+            })
+            await send({'type': 'http.response.body', 'body': body})
+            return
+
+        scope.setdefault('state', {})['tenant'] = tenant
+        await self.app(scope, receive, send)
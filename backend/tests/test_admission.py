@@ -0,0 +1,127 @@
+import sys
+sys.path.append('..')
+from admission import (
+    AdmissionController, AdmissionRule, PRIORITY_HIGH, PRIORITY_LOW, KEY_DEVICE, KEY_ACCOUNT,
+    SHED_RATE, SHED_CONCURRENCY, SHED_PRIORITY, AdmissionMiddleware, client_key
+)
+from starlette.datastructures import Headers
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, PlainTextResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_token_bucket_per_key():
+    """Test cada dispositivo tiene su propia cubeta de fichas"""
+    clock = FakeClock()
+    rule = AdmissionRule("scan", r"^/api/attendance$", rate=1, burst=2)
+    controller = AdmissionController([rule], clock=clock)
+    for _ in range(2):
+        assert controller.admit(rule, "device:a") == (None, 0.0)
+        controller.release(rule)
+    reason, retry_after = controller.admit(rule, "device:a")
+    assert reason == SHED_RATE and retry_after == 1.0
+    assert controller.admit(rule, "device:b")[0] is None
+    controller.release(rule)
+    clock.now += 1
+    assert controller.admit(rule, "device:a")[0] is None
+    stats = controller.stats()['rules']['scan']
+    assert stats['shed_rate'] == 1 and stats['peak_key_rate'] == 3 and stats['keys'] == 2
+
+
+def test_concurrency_cap_and_priority():
+    """Test el cupo por ruta rechaza de inmediato y lo de baja prioridad cede primero"""
+    scan = AdmissionRule("scan", r"^/api/attendance$", priority=PRIORITY_HIGH, concurrency=3)
+    reports = AdmissionRule("reports", r"^/api/reports", priority=PRIORITY_LOW, concurrency=5)
+    controller = AdmissionController([scan, reports], max_inflight=4, low_priority_share=0.5)
+
+    assert controller.match('GET', '/api/reports/summary') is reports
+    assert controller.admit(reports, '')[0] is None
+    assert controller.admit(None, '')[0] is None
+    # Carga total 2 = límite de baja prioridad: los reportes se rechazan
+    assert controller.admit(reports, '')[0] == SHED_PRIORITY
+    # El escáner sigue entrando hasta su propio cupo
+    for _ in range(3):
+        assert controller.admit(scan, '')[0] is None
+    assert controller.admit(scan, '')[0] == SHED_CONCURRENCY
+    # Con el proceso lleno, las rutas normales se rechazan
+    assert controller.admit(None, '')[0] == SHED_PRIORITY
+    controller.release(scan)
+    assert controller.admit(scan, '')[0] is None
+    assert controller.stats()['peak_in_flight'] == 5
+
+
+def test_rotating_device_id_hits_ip_cap():
+    """Test rotar X-Device-Id da cubetas nuevas por dispositivo pero no evade el tope por IP"""
+    clock = FakeClock()
+    rule = AdmissionRule("scan", r"^/api/attendance$", rate=1, burst=1, key=KEY_DEVICE, ip_rate=1, ip_burst=3)
+    controller = AdmissionController([rule], clock=clock)
+
+    def scope(device, ip="10.0.0.5"):
+        return {"type": "http", "headers": [(b"x-device-id", device.encode())], "client": (ip, 5000)}
+
+    assert client_key(scope("a"), KEY_DEVICE) == "device:10.0.0.5:a"
+    assert client_key(scope("a", ip="10.0.0.9"), KEY_DEVICE) != client_key(scope("a"), KEY_DEVICE)
+    for i in range(3):
+        assert controller.admit(rule, client_key(scope(f"rot-{i}"), KEY_DEVICE), "ip:10.0.0.5")[0] is None
+        controller.release(rule)
+    assert controller.admit(rule, client_key(scope("rot-3"), KEY_DEVICE), "ip:10.0.0.5")[0] == SHED_RATE
+    # Otra IP no se ve afectada
+    assert controller.admit(rule, client_key(scope("a", ip="10.0.0.9"), KEY_DEVICE), "ip:10.0.0.9")[0] is None
+
+
+def test_rate_buckets_are_per_partition():
+    """Test el mismo cliente tiene cubetas separadas en cada campus"""
+    rule = AdmissionRule("login", r"^/api/auth/login$", methods=('POST',), rate=1, burst=1)
+    controller = AdmissionController([rule], clock=FakeClock())
+    app = AdmissionMiddleware(
+        PlainTextResponse("ok"), controller,
+        partition=lambda scope: Headers(scope=scope).get('x-tenant-id', '')
+    )
+    client = TestClient(app)
+
+    assert client.post("/api/auth/login", headers={"X-Tenant-Id": "lisfa"}).status_code == 200
+    assert client.post("/api/auth/login", headers={"X-Tenant-Id": "lisfa"}).status_code == 429
+    assert client.post("/api/auth/login", headers={"X-Tenant-Id": "norte"}).status_code == 200
+    assert sorted(rule.buckets) == ["lisfa|ip:testclient", "norte|ip:testclient"]
+
+
+def test_rejected_request_does_not_spend_ip_budget():
+    """Test si la cubeta del dispositivo rechaza, la ficha de la IP no se consume"""
+    clock = FakeClock()
+    rule = AdmissionRule("scan", r"^/api/attendance$", rate=1, burst=1, key=KEY_DEVICE, ip_rate=1, ip_burst=2)
+    controller = AdmissionController([rule], clock=clock)
+    assert controller.admit(rule, "device:a", "ip:x")[0] is None
+    controller.release(rule)
+    for _ in range(5):
+        assert controller.admit(rule, "device:a", "ip:x")[0] == SHED_RATE
+    # La IP conserva su segunda ficha para otro dispositivo
+    assert controller.admit(rule, "device:b", "ip:x")[0] is None
+
+
+def test_login_limited_per_account_behind_shared_ip():
+    """Test detrás de una sola IP cada cuenta tiene su cubeta y la ruta sigue leyendo el cuerpo"""
+    rule = AdmissionRule("login", r"^/api/auth/login$", methods=('POST',), rate=1, burst=1,
+                         key=KEY_ACCOUNT, ip_rate=1, ip_burst=3)
+    controller = AdmissionController([rule], clock=FakeClock())
+
+    async def login(request):
+        return JSONResponse({"body": (await request.body()).decode()})
+
+    client = TestClient(AdmissionMiddleware(Starlette(routes=[Route("/api/auth/login", login, methods=["POST"])]), controller))
+    first = client.post("/api/auth/login", json={"email": "Ana@lisfa.edu", "password": "x"})
+    assert first.status_code == 200 and '"Ana@lisfa.edu"' in first.json()["body"]
+    assert client.post("/api/auth/login", json={"email": "ana@lisfa.edu"}).status_code == 429
+    assert client.post("/api/auth/login", json={"email": "luis@lisfa.edu"}).status_code == 200
+    assert client.post("/api/auth/login", content=b"no es json").status_code == 200
+    # Tope por IP: rotar cuentas no da intentos ilimitados
+    assert client.post("/api/auth/login", json={"email": "otro@lisfa.edu"}).status_code == 429
+    assert "account:testclient:luis@lisfa.edu" in rule.buckets and "ip:testclient" in rule.buckets
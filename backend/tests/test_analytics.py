@@ -0,0 +1,139 @@
+import asyncio
+import sys
+sys.path.append('..')
+from datetime import date
+import pytest
+from analytics import (
+    AttendanceAnalytics, InvalidReportRange, UnknownReport, school_days_between, school_dates,
+    chronic_absence, lateness_by_category, by_weekday, arrival_distribution, summary
+)
+
+USERS = [
+    {"id": "u1", "full_name": "Ana", "role": "student", "category": "Kinder"},
+    {"id": "u2", "full_name": "Luis", "role": "student", "category": "Primero"},
+    {"id": "u3", "full_name": "Doc", "role": "teacher", "category": None, "grade": "Docentes"},
+    {"id": "p1", "full_name": "Padre", "role": "parent"},
+    {"id": "a1", "full_name": "Admin", "role": "admin"},
+]
+
+# Lunes 3 a miércoles 5 de marzo de 2025 (hora local -6)
+RECORDS = [
+    {"user_id": "u1", "user_role": "student", "date": "2025-03-03", "status": "present", "check_in_time": "2025-03-03T13:05:00+00:00"},
+    {"user_id": "u1", "user_role": "student", "date": "2025-03-04", "status": "late", "check_in_time": "2025-03-04T14:20:00+00:00"},
+    {"user_id": "u1", "user_role": "student", "date": "2025-03-05", "status": "present", "check_in_time": "2025-03-05T13:10:00+00:00"},
+    {"user_id": "u2", "user_role": "student", "date": "2025-03-03", "status": "late", "check_in_time": "2025-03-03T14:40:00+00:00"},
+    {"user_id": "u3", "user_role": "teacher", "date": "2025-03-03", "status": "present", "check_in_time": "2025-03-03T12:50:00+00:00"},
+]
+
+
+def matches(doc, query):
+    for field, cond in query.items():
+        value = doc.get(field)
+        if isinstance(cond, dict):
+            if '$in' in cond and value not in cond['$in']:
+                return False
+            if '$gte' in cond and not value >= cond['$gte']:
+                return False
+            if '$lte' in cond and not value <= cond['$lte']:
+                return False
+        elif value != cond:
+            return False
+    return True
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    async def to_list(self, length):
+        return self.docs
+
+
+class FakeUsers:
+    def find(self, query, projection=None):
+        return FakeCursor([dict(u) for u in USERS if matches(u, query)])
+
+
+class FakeStore:
+    async def find(self, query, start_date=None, end_date=None, limit=None, projection=None, db=None):
+        return [dict(r) for r in RECORDS if matches(r, query)]
+
+
+class FakeDB:
+    def __init__(self):
+        self.users = FakeUsers()
+
+
+def make_analytics(**kwargs):
+    return AttendanceAnalytics(FakeDB(), FakeStore(), **kwargs)
+
+
+def test_reports_over_small_frames():
+    """Test las métricas agrupadas sobre un rango pequeño conocido"""
+    analytics = make_analytics()
+    frame, roster = asyncio.run(analytics.load("2025-03-03", "2025-03-05"))
+    ctx = {'school_days': school_days_between(date(2025, 3, 3), date(2025, 3, 5)), 'threshold': None}
+    assert ctx['school_days'] == 3
+
+    rows = {r['category']: r for r in lateness_by_category(frame, roster, ctx)['rows']}
+    assert rows['Kinder']['records'] == 3 and rows['Kinder']['late'] == 1
+    assert rows['Primero']['late_rate'] == 100.0
+    assert rows['Docentes']['late'] == 0
+
+    weekday = {r['weekday']: r for r in by_weekday(frame, roster, ctx)['rows']}
+    assert weekday['Lunes']['records'] == 3 and weekday['Lunes']['late'] == 1
+
+    arrival = arrival_distribution(frame, roster, ctx)
+    assert arrival['percentiles']['p50'] == "07:10"
+    assert sum(b['count'] for b in arrival['buckets']) == 5
+
+    totals = summary(frame, roster, ctx)
+    assert totals['records'] == 5 and totals['late'] == 2 and totals['users_with_records'] == 3
+
+
+def test_chronic_absence_roster_excludes_non_scanning_roles():
+    """Test sin rol, padres y administradores no entran al padrón ni se marcan como ausentes"""
+    analytics = make_analytics()
+    frame, roster = asyncio.run(analytics.load("2025-03-03", "2025-03-05"))
+    assert sorted(roster['user_id']) == ["u1", "u2", "u3"]
+
+    dates = school_dates(date(2025, 3, 3), date(2025, 3, 5))
+    result = chronic_absence(frame, roster, {'school_days': 3, 'school_dates': dates, 'threshold': 90})
+    assert result['total_users'] == 3
+    assert [(r['user_id'], r['present_days']) for r in result['rows']] == [("u2", 1), ("u3", 1)]
+
+
+def test_chronic_absence_counts_only_school_days():
+    """Test lecturas fuera de los días contados (ej: hoy) no suben la tasa sobre 100; umbral 0 se respeta"""
+    analytics = make_analytics()
+    frame, roster = asyncio.run(analytics.load("2025-03-03", "2025-03-05"))
+    # El 5 es "hoy": school_days no lo cuenta, pero u1 tiene lectura ese día
+    dates = school_dates(date(2025, 3, 3), date(2025, 3, 4))
+    ctx = {'school_days': len(dates), 'school_dates': dates, 'threshold': 101}
+    rows = {r['user_id']: r for r in chronic_absence(frame, roster, ctx)['rows']}
+    assert rows['u1']['present_days'] == 2 and rows['u1']['attendance_rate'] == 100.0
+    assert rows['u2']['absent_days'] == 1
+
+    result = chronic_absence(frame, roster, dict(ctx, threshold=0))
+    assert result['threshold'] == 0 and result['rows'] == []
+
+
+def test_report_validates_dates_and_bounds_cache():
+    """Test fechas inválidas se rechazan y la caché no crece sin límite"""
+    analytics = make_analytics(frame_cache_size=2, result_cache_size=2)
+
+    async def run():
+        with pytest.raises(UnknownReport):
+            await analytics.report('no-existe', "2025-03-03", "2025-03-05")
+        for start, end in [("2025-13-01", "2025-03-05"), ("ayer", "hoy"), ("2025-03-05", "2025-03-03")]:
+            with pytest.raises(InvalidReportRange):
+                await analytics.report('summary', start, end)
+
+        first = await analytics.report('summary', "2025-03-03", "2025-03-05")
+        assert await analytics.report('summary', "2025-03-03", "2025-03-05") is first
+        for day in ("06", "07", "08"):
+            await analytics.report('summary', "2025-03-03", f"2025-03-{day}")
+
+    asyncio.run(run())
+    assert len(analytics._frames) == 2 and len(analytics._results) == 2
+    assert ('summary', "2025-03-03", "2025-03-05", None, None, None) not in analytics._results
@@ -2,7 +2,8 @@ import pytest
 from fastapi.testclient import TestClient
 import sys
 sys.path.append('..')
-from server import app
+from server import app, CACHE_RULES, ATTENDANCE_ALL
+from response_cache import ResponseCache, CacheEntry
 
 client = TestClient(app)
 
@@ -40,3 +41,32 @@ def test_generate_card_not_found():
     """Test generar carnet de usuario inexistente"""
     response = client.get("/api/cards/generate/usuario-inexistente")
     assert response.status_code == 404
+
+def test_categories_conditional_get():
+    """Test caché HTTP: ETag y respuesta 304"""
+    response = client.get("/api/categories")
+    etag = response.headers["etag"]
+    response = client.get("/api/categories", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+
+def test_categories_gzip():
+    """Test compresión negociada con Accept-Encoding"""
+    response = client.get("/api/categories", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert "student" in response.json()
+
+
+def test_cache_rules():
+    """Test la búsqueda no se cachea y una reconstrucción invalida las respuestas por usuario"""
+    cache = ResponseCache(CACHE_RULES)
+    assert cache.match("/api/users/search")[0] is None
+    assert cache.match("/api/users/u1")[0] is not None
+
+    for path in ("/api/attendance/stats/u1", "/api/attendance/calendar/u2"):
+        rule, tags = cache.match(path)
+        cache.put(path, CacheEntry(b"{}", [], '"x"', float('inf'), tags), cache.generation)
+    cache.invalidate("attendance", "attendance:u1")
+    assert cache.get("/api/attendance/stats/u1") is None
+    assert cache.get("/api/attendance/calendar/u2") is not None
+    cache.invalidate("attendance", ATTENDANCE_ALL)
+    assert cache.get("/api/attendance/calendar/u2") is None
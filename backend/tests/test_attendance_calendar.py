@@ -0,0 +1,59 @@
+import sys
+sys.path.append('..')
+import asyncio
+import numpy as np
+from attendance_calendar import (
+    AttendanceCalendar, CALENDAR_COLLECTION, longest_runs, trailing_runs, school_days_mask, valid_days_mask
+)
+
+
+def test_streaks():
+    """Test rachas vectorizadas por estudiante"""
+    attended = np.array([
+        [1, 1, 0, 1, 1, 1],
+        [0, 0, 0, 0, 0, 0],
+        [1, 1, 1, 1, 1, 1],
+    ], dtype=bool)
+    assert longest_runs(attended).tolist() == [3, 0, 6]
+    assert trailing_runs(attended).tolist() == [3, 0, 6]
+
+
+def test_school_days_mask():
+    """Test días hábiles: sin fines de semana ni fechas inexistentes"""
+    mask = school_days_mask(2026)
+    assert not (mask & ~valid_days_mask(2026)).any()
+    # 2 de marzo de 2026 es lunes; 7 y 8 son fin de semana
+    assert mask[2, 1] and not mask[2, 6] and not mask[2, 7]
+
+
+class FakeCalendarCollection:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def find(self, query, projection=None):
+        docs = [d for d in self.docs if d['year'] == query['year'] and d['user_id'] in query['user_id']['$in']]
+        return FakeCursor(docs)
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    async def to_list(self, length):
+        return self.docs
+
+
+def test_summary_includes_users_without_check_ins():
+    """Test quien nunca registró entrada aparece en el resumen con cero asistencias"""
+    # 3 al 6 de marzo de 2025: lunes a jueves
+    year = 2025
+    calendar = AttendanceCalendar({CALENDAR_COLLECTION: FakeCalendarCollection([
+        {"user_id": "u1", "year": year, "present": {"03": 0b111100}, "late": {}},
+    ])})
+    summary = asyncio.run(calendar.school_summary(year, ["u1", "ausente"]))
+
+    assert [s['user_id'] for s in summary] == ["u1", "ausente"]
+    assert summary[0]['present_days'] == 4
+    assert summary[1]['present_days'] == 0 and summary[1]['attendance_rate'] == 0
+    assert summary[1]['absent_days'] == summary[0]['absent_days'] + 4 > 0
+    assert asyncio.run(calendar.school_summary(year, [])) == []
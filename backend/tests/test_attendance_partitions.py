@@ -0,0 +1,176 @@
+import asyncio
+import sys
+sys.path.append('..')
+import pytest
+from pymongo.errors import DuplicateKeyError
+import attendance_partitions
+from attendance_partitions import AttendancePartitions
+
+
+def matches(doc, query):
+    """Filtros por igualdad, $gte, $lte e $in"""
+    for field, cond in query.items():
+        value = doc.get(field)
+        if isinstance(cond, dict):
+            if '$gte' in cond and not (value is not None and value >= cond['$gte']):
+                return False
+            if '$lte' in cond and not (value is not None and value <= cond['$lte']):
+                return False
+            if '$in' in cond and value not in cond['$in']:
+                return False
+        elif value != cond:
+            return False
+    return True
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, field, direction):
+        self.docs.sort(key=lambda d: d.get(field) or '')
+        return self
+
+    async def to_list(self, length):
+        return self.docs if length is None else self.docs[:length]
+
+
+class FakeCollection:
+    def __init__(self, name):
+        self.name = name
+        self.docs = []
+        self.queries = []
+        self.indexes = {}
+
+    def find(self, query, projection=None):
+        self.queries.append(query)
+        return FakeCursor([dict(d) for d in self.docs if matches(d, query)])
+
+    async def distinct(self, field, query):
+        return list({d[field] for d in self.docs if matches(d, query)})
+
+    async def insert_many(self, docs, ordered=True):
+        self.docs.extend(dict(d) for d in docs)
+
+    async def delete_many(self, query):
+        self.docs = [d for d in self.docs if not matches(d, query)]
+
+    async def create_index(self, keys, unique=False, name=None, **kwargs):
+        fields = [k for k, _ in keys]
+        name = name or '_'.join(f"{k}_1" for k in fields)
+        if unique:
+            seen = [tuple(d.get(f) for f in fields) for d in self.docs]
+            if len(seen) != len(set(seen)):
+                raise DuplicateKeyError("E11000", code=11000)
+        self.indexes[name] = {'key': keys, 'unique': unique}
+
+    async def index_information(self):
+        return dict(self.indexes)
+
+    async def drop_index(self, name):
+        del self.indexes[name]
+
+    def aggregate(self, pipeline):
+        """Solo el agrupamiento de duplicados por (user_id, date)"""
+        counts = {}
+        for doc in self.docs:
+            key = (doc['user_id'], doc['date'])
+            counts[key] = counts.get(key, 0) + 1
+        groups = [{"_id": {"user_id": u, "date": d}, "count": n} for (u, d), n in counts.items() if n > 1]
+        return FakeCursor(groups)
+
+    async def update_one(self, query, update, upsert=False):
+        doc = next((d for d in self.docs if matches(d, query)), None)
+        if doc is None:
+            doc = dict(query, **update.get('$setOnInsert', {}))
+            self.docs.append(doc)
+        doc.update(update.get('$set', {}))
+        for field, amount in update.get('$inc', {}).items():
+            doc[field] = doc.get(field, 0) + amount
+
+
+class FakeDB(dict):
+    def __missing__(self, name):
+        self[name] = FakeCollection(name)
+        return self[name]
+
+
+def record(id, user_id, date):
+    return {"id": id, "user_id": user_id, "date": date, "status": "present"}
+
+
+def test_archive_and_find_across_partitions(monkeypatch):
+    """Test el archivado mueve el ciclo por lotes y find recorre solo las particiones del rango"""
+    monkeypatch.setattr(attendance_partitions, 'ARCHIVE_BATCH_SIZE', 2)
+    db = FakeDB()
+    store = AttendancePartitions(db)
+    db['attendance'].docs = [
+        record("a1", "u1", "2023-05-02"),
+        record("a2", "u2", "2023-05-02"),
+        record("a3", "u1", "2023-09-10"),
+        record("a4", "u1", "2024-03-04"),
+    ]
+    # Una ejecución anterior interrumpida ya copió a1
+    db['attendance_2023'].docs = [record("a1", "u1", "2023-05-02")]
+
+    async def run():
+        with pytest.raises(ValueError):
+            await store.archive_year(9999)
+        result = await store.archive_year(2023)
+        assert result == {"year": 2023, "collection": "attendance_2023", "moved": 3}
+        assert [d['id'] for d in db['attendance'].docs] == ["a4"]
+        assert sorted(d['id'] for d in db['attendance_2023'].docs) == ["a1", "a2", "a3"]
+        assert await store.archived_years() == [2023]
+        assert db['attendance_partitions'].docs[0]['records'] == 3
+
+        everything = await store.find({"user_id": "u1"}, limit=None)
+        assert [d['id'] for d in everything] == ["a4", "a1", "a3"]
+        assert len(await store.find({"user_id": "u1"}, limit=2)) == 2
+
+        db['attendance_2023'].queries.clear()
+        recent = await store.find({"user_id": "u1"}, start_date="2024-01-01")
+        assert [d['id'] for d in recent] == ["a4"]
+        assert db['attendance_2023'].queries == []
+
+    asyncio.run(run())
+
+
+def test_duplicate_days_are_not_merged_at_startup():
+    """Test con duplicados el arranque no borra nada: la fusión es una migración explícita"""
+    db = FakeDB()
+    store = AttendancePartitions(db)
+    first = dict(record("a1", "u1", "2025-03-03"), check_in_time="07:00", check_out_time=None)
+    second = dict(record("a2", "u1", "2025-03-03"), check_in_time="07:01", check_out_time="13:00")
+    db['attendance'].docs = [first, second]
+    db['attendance'].indexes['user_id_1_date_1'] = {'unique': False}
+
+    async def run():
+        assert await store.ensure_indexes() is False
+        assert len(db['attendance'].docs) == 2
+        assert db['attendance'].indexes['user_id_1_date_1']['unique'] is False
+
+        assert await store.merge_duplicate_days() == 1
+        assert await store.ensure_indexes() is True
+        assert db['attendance'].indexes['user_id_1_date_1']['unique'] is True
+
+    asyncio.run(run())
+    [kept] = db['attendance'].docs
+    assert kept['id'] == "a1" and kept['check_out_time'] == "13:00"
+
+
+def test_other_workers_see_archived_year_after_cache_expires():
+    """Test un worker que no archivó relee los años archivados al vencer su caché"""
+    now = [1000.0]
+    db = FakeDB()
+    db['attendance'].docs = [record("a1", "u1", "2023-05-02")]
+    archiver = AttendancePartitions(db)
+    other = AttendancePartitions(db, cache_seconds=30, clock=lambda: now[0])
+
+    async def run():
+        assert await other.archived_years() == []
+        await archiver.archive_year(2023)
+        assert await other.archived_years() == []
+        now[0] += 30
+        assert [d['id'] for d in await other.find({"user_id": "u1"}, limit=None)] == ["a1"]
+
+    asyncio.run(run())
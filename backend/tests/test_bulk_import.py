@@ -0,0 +1,35 @@
+import sys
+sys.path.append('..')
+import pytest
+from bulk_import import SpreadsheetError, read_spreadsheet, validate_rows
+
+
+def test_validate_rows():
+    """Test validación vectorizada de filas de importación"""
+    csv = (
+        "Correo,Nombre,Rol,Categoría,Contraseña\n"
+        "ana@lisfa.edu,Ana,student,Kinder,clave\n"
+        "ANA@lisfa.edu,Ana Dos,student,,clave\n"
+        "sin-arroba,Luis,student,,clave\n"
+        "doc@lisfa.edu,Doc,teacher,Kinder,clave\n"
+        "viejo@lisfa.edu,Viejo,staff,,clave\n"
+        "x@lisfa.local,Local,staff,,clave\n"
+    ).encode()
+    df = read_spreadsheet(csv, "usuarios.csv")
+    errors = validate_rows(df, ["viejo@lisfa.edu"]).tolist()
+    assert df['row'].tolist() == [2, 3, 4, 5, 6, 7]
+    assert errors == [
+        "",
+        "Email duplicado en el archivo",
+        "Email inválido",
+        "Categoría de personal inválida",
+        "Email ya registrado",
+        # Dominio reservado: EmailStr lo rechaza, la importación también
+        "Email inválido",
+    ]
+
+
+def test_legacy_xls_rejected():
+    """Test .xls se rechaza con un mensaje claro en lugar de un error de dependencia"""
+    with pytest.raises(SpreadsheetError, match="XLSX o CSV"):
+        read_spreadsheet(b"\xd0\xcf\x11\xe0", "usuarios.XLS")
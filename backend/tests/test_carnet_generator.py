@@ -0,0 +1,76 @@
+import re
+import sys
+sys.path.append('..')
+from datetime import datetime
+from io import BytesIO
+from PIL import Image
+from reportlab.pdfgen import canvas
+import carnet_generator
+from carnet_generator import CarnetGenerator, CarnetTemplate, FORM_BASE, FORM_BLOCK
+
+
+def make_users(count):
+    return [{
+        'id': f'u{i}',
+        'full_name': f'Estudiante {i}',
+        'student_id': f'LISFA-{i:04d}',
+        'category': 'Kinder',
+        'role': 'student',
+    } for i in range(count)]
+
+
+def test_batch_reuses_template_forms():
+    """Test el diseño fijo se define una sola vez como XObject y cada página lo reutiliza"""
+    pdf = CarnetGenerator.generate_carnets(make_users(5), CarnetTemplate(), qr_mode='vector').getvalue()
+    assert pdf.startswith(b'%PDF')
+    assert len(re.findall(rb'/Type /Page\b', pdf)) == 5
+    # Dos forms (base y bloque QR/contacto), sin importar cuántas páginas
+    assert pdf.count(b'/Subtype /Form') == 2
+    resources = re.findall(rb'/XObject <<[^>]*>>', pdf)
+    pages_with_forms = [r for r in resources if f'/FormXob.{FORM_BASE}'.encode() in r and f'/FormXob.{FORM_BLOCK}'.encode() in r]
+    assert len(pages_with_forms) == 5
+
+    single = CarnetGenerator.generate_carnet(make_users(1)[0], qr_mode='vector').getvalue()
+    # Cada carnet extra cuesta mucho menos que el primero
+    assert (len(pdf) - len(single)) / 4 < len(single) / 2
+
+
+def test_raster_mode_embeds_qr_image():
+    """Test el modo raster agrega una imagen por carnet y el vectorial no"""
+    users = make_users(2)
+    vector = CarnetGenerator.generate_carnets(users, qr_mode='vector').getvalue()
+    raster = CarnetGenerator.generate_carnets(users, qr_mode='raster').getvalue()
+    assert raster.count(b'/Subtype /Image') > vector.count(b'/Subtype /Image')
+
+
+def test_vector_qr_matches_raster_modules():
+    """Test el QR vectorial dibuja los mismos módulos que la imagen PNG del mismo contenido"""
+    data = "3f2b9c1e-7a4d-4e8b-9c0f-1a2b3c4d5e6f"
+    c = canvas.Canvas(BytesIO(), pageCompression=0)
+    CarnetGenerator.draw_qr_vector(c, data, 0, 0, 100)
+    count = len(CarnetGenerator.qr_matrix(data))
+    vector = [[False] * count for _ in range(count)]
+    for x, y, width in re.findall(r'^(\d+) (\d+) (\d+) 1 re$', "\n".join(c._code), re.M):
+        for col in range(int(x), int(x) + int(width)):
+            vector[count - 1 - int(y)][col] = True
+
+    image = Image.open(CarnetGenerator.generate_qr_image(data, size=count * 10)).convert('L')
+    raster = [[image.getpixel((col * 10 + 5, row * 10 + 5)) < 128 for col in range(count)] for row in range(count)]
+
+    assert vector == raster
+    assert any(any(row) for row in vector)
+
+
+def test_template_year_follows_clock(monkeypatch):
+    """Test el año del carnet se calcula al dibujar, no al importar el módulo"""
+    class NextYear(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return datetime(2031, 1, 2)
+
+    monkeypatch.setattr(carnet_generator, 'CARNET_YEAR', '')
+    monkeypatch.setattr(carnet_generator, 'CARNET_VALID_UNTIL', '')
+    template = CarnetTemplate()
+    monkeypatch.setattr(carnet_generator, 'datetime', NextYear)
+    assert template.year == "2031" and template.valid_until == "Dic 2031"
+    assert CarnetTemplate(year="2030").valid_until == "Dic 2030"
@@ -0,0 +1,36 @@
+import sys
+sys.path.append('..')
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+from compression import CompressionMiddleware, strip_etag_suffixes
+from response_cache import ResponseCache, ResponseCacheMiddleware, CacheRule
+
+
+def make_client():
+    async def categories(request):
+        return JSONResponse({"categorias": ["Kinder"] * 500})
+
+    app = Starlette(routes=[Route("/api/categories", categories)])
+    cache = ResponseCache([CacheRule(r"^/api/categories$", 60, ["categories"])])
+    return TestClient(CompressionMiddleware(ResponseCacheMiddleware(app, cache=cache)))
+
+
+def test_compressed_representation_has_its_own_etag():
+    """Test la respuesta comprimida no comparte el ETag fuerte de la identidad y ambas revalidan"""
+    client = make_client()
+    plain = client.get("/api/categories", headers={"Accept-Encoding": "identity"})
+    packed = client.get("/api/categories", headers={"Accept-Encoding": "gzip"})
+    assert packed.headers['content-encoding'] == 'gzip'
+    assert packed.headers['etag'] == plain.headers['etag'][:-1] + '-gzip"'
+
+    revalidated = client.get("/api/categories", headers={"Accept-Encoding": "gzip", "If-None-Match": packed.headers['etag']})
+    assert revalidated.status_code == 304 and revalidated.headers['etag'] == packed.headers['etag']
+    revalidated = client.get("/api/categories", headers={"Accept-Encoding": "identity", "If-None-Match": plain.headers['etag']})
+    assert revalidated.status_code == 304 and revalidated.headers['etag'] == plain.headers['etag']
+
+
+def test_strip_etag_suffixes():
+    """Test If-None-Match vuelve al ETag original antes de llegar a la caché"""
+    assert strip_etag_suffixes('"abc-gzip", W/"d-br", "e"') == '"abc", W/"d", "e"'
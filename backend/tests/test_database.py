@@ -0,0 +1,23 @@
+import sys
+sys.path.append('..')
+from types import SimpleNamespace
+from database import PoolMonitor
+
+
+def test_pool_monitor_saturation():
+    """Test la saturación del pool se calcula con las conexiones en uso"""
+    monitor = PoolMonitor()
+    event = SimpleNamespace(address=("db1", 27017))
+    for _ in range(3):
+        monitor.connection_created(event)
+        monitor.connection_checked_out(event)
+    monitor.connection_checked_in(event)
+    monitor.connection_check_out_failed(event)
+
+    snapshot = monitor.snapshot(max_pool_size=4)
+    assert snapshot['in_use'] == 2
+    assert snapshot['peak_in_use'] == 3
+    assert snapshot['saturation'] == 0.5
+    assert snapshot['in_use_by_server'] == {"db1:27017": 2}
+    assert snapshot['open_connections'] == 3
+    assert snapshot['checkout_failures'] == 1
@@ -0,0 +1,24 @@
+import asyncio
+import sys
+sys.path.append('..')
+from dataloader import DataLoader
+
+
+def test_loads_are_batched_and_memoized():
+    """Test búsquedas concurrentes se agrupan en una sola consulta"""
+    calls = []
+
+    async def batch(keys):
+        calls.append(list(keys))
+        return {k: {"id": k} for k in keys if k != "missing"}
+
+    async def run():
+        loader = DataLoader(batch)
+        results = await asyncio.gather(loader.load("a"), loader.load("b"), loader.load("a"), loader.load("missing"))
+        again = await loader.load("b")
+        return results, again
+
+    results, again = asyncio.run(run())
+    assert calls == [["a", "b", "missing"]]
+    assert results == [{"id": "a"}, {"id": "b"}, {"id": "a"}, None]
+    assert again == {"id": "b"}
@@ -0,0 +1,80 @@
+import asyncio
+import sys
+sys.path.append('..')
+from datetime import timedelta
+import pytest
+from pymongo.errors import DuplicateKeyError
+from idempotency import IdempotencyStore, IdempotencyInProgress, IdempotencyMismatch, fingerprint
+
+
+class FakeKeys:
+    """Colección mínima: _id único y filtros por igualdad o $lt"""
+
+    def __init__(self):
+        self.docs = {}
+
+    def _matches(self, doc, query):
+        for field, cond in query.items():
+            if isinstance(cond, dict):
+                if not doc.get(field) < cond['$lt']:
+                    return False
+            elif doc.get(field) != cond:
+                return False
+        return True
+
+    async def insert_one(self, doc):
+        if doc['_id'] in self.docs:
+            raise DuplicateKeyError("E11000")
+        self.docs[doc['_id']] = dict(doc)
+
+    async def find_one(self, query):
+        return next((dict(d) for d in self.docs.values() if self._matches(d, query)), None)
+
+    async def find_one_and_update(self, query, update):
+        doc = await self.find_one(query)
+        if doc:
+            self.docs[doc['_id']].update(update['$set'])
+        return doc
+
+    async def update_one(self, query, update):
+        if query['_id'] in self.docs:
+            self.docs[query['_id']].update(update['$set'])
+
+    async def delete_one(self, query):
+        doc = self.docs.get(query['_id'])
+        if doc and self._matches(doc, query):
+            del self.docs[query['_id']]
+
+
+def test_idempotency_key_replays_response():
+    """Test un reintento con la misma clave devuelve la respuesta guardada"""
+    store = IdempotencyStore({'idempotency_keys': FakeKeys()})
+    scan = fingerprint("u1", "admin")
+
+    async def run():
+        assert await store.begin("k1", scan) is None
+        with pytest.raises(IdempotencyInProgress):
+            await store.begin("k1", scan)
+        await store.complete("k1", {"id": "a1"})
+        assert await store.begin("k1", scan) == {"id": "a1"}
+        with pytest.raises(IdempotencyMismatch):
+            await store.begin("k1", fingerprint("u2", "admin"))
+
+    asyncio.run(run())
+
+
+def test_abandoned_key_runs_again():
+    """Test una clave liberada o vencida permite volver a ejecutar la solicitud"""
+    keys = FakeKeys()
+    store = IdempotencyStore({'idempotency_keys': keys}, pending_timeout=30)
+    scan = fingerprint("u1", "admin")
+
+    async def run():
+        assert await store.begin("k1", scan) is None
+        await store.abandon("k1")
+        assert await store.begin("k1", scan) is None
+        # Proceso caído a mitad de la solicitud: la reserva vence
+        keys.docs["k1"]['created_at'] -= timedelta(seconds=31)
+        assert await store.begin("k1", scan) is None
+
+    asyncio.run(run())
@@ -0,0 +1,65 @@
+import sys
+sys.path.append('..')
+import time
+import threading
+from types import SimpleNamespace
+from profiling import Profiler, SlowRoute, QueryTimingListener, current_trace
+
+
+def busy_loop(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        sum(range(1000))
+
+
+def test_profile_session_samples_threads():
+    """Test la sesión bajo demanda registra las pilas de los hilos en formato folded"""
+    profiler = Profiler([])
+    profiler.start()
+    try:
+        profiler.start_session(seconds=5, interval_ms=1)
+        worker = threading.Thread(target=busy_loop, args=(0.2,), name='busy')
+        worker.start()
+        worker.join()
+        status = profiler.stop_session()
+    finally:
+        profiler.stop()
+
+    assert not status['active'] and status['samples'] > 0
+    lines = profiler.session_profile().splitlines()
+    busy = [line for line in lines if line.startswith('busy;') and 'busy_loop (test_profiling.py:' in line]
+    assert busy
+    stack, count = busy[0].rsplit(' ', 1)
+    assert int(count) > 0
+
+
+def test_slow_request_keeps_queries():
+    """Test una solicitud sobre el umbral guarda sus consultas; una rápida se descarta"""
+    profiler = Profiler([SlowRoute("scan", r"^/api/attendance$", methods=('POST',))], threshold_ms=20)
+    listener = QueryTimingListener()
+    assert profiler.match('POST', '/api/attendance') == "scan"
+    assert profiler.match('GET', '/api/attendance') is None
+
+    fast = profiler.begin("scan", 'POST', '/api/attendance')
+    profiler.end(fast, 200)
+    assert profiler.slow_summary() == []
+
+    trace = profiler.begin("scan", 'POST', '/api/attendance', tenant="norte")
+    token = current_trace.set(trace)
+    try:
+        listener.started(SimpleNamespace(
+            request_id=7, command_name='find', command={'find': 'users', 'filter': {}}, database_name='lisfa_norte'
+        ))
+        listener.succeeded(SimpleNamespace(request_id=7, duration_micros=12500))
+    finally:
+        current_trace.reset(token)
+    time.sleep(0.03)
+    profiler.end(trace, 200)
+
+    [record] = profiler.slow_summary()
+    assert record['route'] == "scan" and record['tenant'] == "norte"
+    assert record['duration_ms'] >= 20
+    assert record['queries'] == [
+        {'command': 'find', 'collection': 'users', 'database': 'lisfa_norte', 'duration_ms': 12.5, 'ok': True}
+    ]
+    assert record['query_ms'] == 12.5
@@ -0,0 +1,45 @@
+import sys
+sys.path.append('..')
+from scan_debouncer import ScanDebouncer, REASON_DUPLICATE, REASON_CHECKOUT_TOO_SOON
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_duplicate_scan_suppressed():
+    """Test lecturas repetidas dentro de la ventana son rechazadas"""
+    clock = FakeClock()
+    debouncer = ScanDebouncer(duplicate_window=3, min_checkout_gap=60, clock=clock)
+    assert debouncer.admit("u1") is None
+    clock.now += 0.5
+    assert debouncer.admit("u1") == REASON_DUPLICATE
+    assert debouncer.admit("u2") is None
+    assert debouncer.stats()['suppressed_duplicate'] == 1
+
+
+def test_checkout_gap():
+    """Test la salida requiere un tiempo mínimo después de la entrada"""
+    clock = FakeClock()
+    debouncer = ScanDebouncer(duplicate_window=3, min_checkout_gap=60, clock=clock)
+    assert debouncer.admit("u1") is None
+    debouncer.record("u1", "check_in")
+    clock.now += 10
+    assert debouncer.admit("u1") == REASON_CHECKOUT_TOO_SOON
+    clock.now += 60
+    assert debouncer.admit("u1") is None
+    assert debouncer.stats()['suppressed_total'] == 1
+
+
+def test_forget_allows_retry():
+    """Test una lectura admitida que falló no bloquea el reintento"""
+    clock = FakeClock()
+    debouncer = ScanDebouncer(duplicate_window=3, min_checkout_gap=60, clock=clock)
+    assert debouncer.admit("u1") is None
+    debouncer.forget("u1")
+    clock.now += 0.5
+    assert debouncer.admit("u1") is None
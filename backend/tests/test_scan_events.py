@@ -0,0 +1,129 @@
+import asyncio
+import sys
+sys.path.append('..')
+from datetime import datetime, timedelta, timezone
+from pymongo.errors import AutoReconnect
+from scan_events import (
+    ScanEventLog, make_event, derive_attendance, replay,
+    RESULT_CHECK_IN, RESULT_CHECK_OUT, RESULT_DUPLICATE
+)
+
+
+class FakeCollection:
+    def __init__(self, fail_times=0):
+        self.docs = []
+        self.calls = []
+        self.fail_times = fail_times
+
+    async def insert_many(self, docs, ordered=True):
+        self.calls.append(len(docs))
+        if self.fail_times:
+            self.fail_times -= 1
+            raise AutoReconnect("sin conexión")
+        self.docs.extend(docs)
+
+    def find(self, query, projection=None):
+        return FakeCursor([dict(d) for d in self.docs])
+
+    async def bulk_write(self, operations, ordered=True):
+        for op in operations:
+            doc = next((d for d in self.docs if d['id'] == op._filter['id']), None)
+            if doc is None:
+                doc = dict(op._filter, **op._doc.get('$setOnInsert', {}))
+                self.docs.append(doc)
+            doc.update(op._doc.get('$set', {}))
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, field, direction):
+        self.docs.sort(key=lambda d: d[field])
+        return self
+
+    async def to_list(self, length):
+        return self.docs
+
+
+class FakeStore:
+    def __init__(self, db):
+        self.db = db
+        self.hot = db['attendance']
+
+    async def archived_years(self):
+        return []
+
+
+class FakeDB(dict):
+    def __missing__(self, name):
+        self[name] = FakeCollection()
+        self[name].name = name
+        return self[name]
+
+
+def test_derive_attendance_from_events():
+    """Test los registros se derivan de las lecturas aceptadas, en orden"""
+    t0 = datetime(2025, 3, 3, 12, 30, tzinfo=timezone.utc)
+    events = [
+        make_event("u1", "scanner-1", RESULT_CHECK_OUT, ts=t0 + timedelta(hours=6), attendance_id="a1"),
+        make_event("u1", "scanner-1", RESULT_CHECK_IN, ts=t0, attendance_id="a1",
+                   status="late", user_name="Ana", user_role="student", recorded_by="admin-1"),
+        make_event("u1", "scanner-2", RESULT_DUPLICATE, ts=t0 + timedelta(seconds=1)),
+    ]
+    records = derive_attendance(events)
+    assert records == [{
+        "id": "a1",
+        "user_id": "u1",
+        "user_name": "Ana",
+        "user_role": "student",
+        "check_in_time": t0.isoformat(),
+        "check_out_time": (t0 + timedelta(hours=6)).isoformat(),
+        "date": "2025-03-03",
+        "status": "late",
+        "recorded_by": "admin-1",
+    }]
+
+
+def test_buffer_flushes_in_batches_and_retries():
+    """Test la bitácora inserta en lotes y conserva los eventos si la base falla"""
+    db = FakeDB()
+    db['scan_events'] = FakeCollection(fail_times=1)
+    log = ScanEventLog(db, batch_size=2)
+    for i in range(5):
+        log.append(make_event(f"u{i}", "scanner-1", RESULT_DUPLICATE))
+
+    async def run():
+        try:
+            await log.flush()
+        except AutoReconnect:
+            pass
+        assert log.stats()['buffered'] == 5
+        return await log.flush()
+
+    assert asyncio.run(run()) == 5
+    assert db['scan_events'].calls == [2, 2, 2, 1]
+    assert [d['u'] for d in db['scan_events'].docs] == ["u0", "u1", "u2", "u3", "u4"]
+    assert log.stats()['written'] == 5
+
+
+def test_replay_does_not_clobber_stored_check_out():
+    """Test una salida perdida en la bitácora no borra la guardada; lo que falta se inserta"""
+    t0 = datetime(2025, 3, 3, 12, 30, tzinfo=timezone.utc)
+    db = FakeDB()
+    # La salida de a1 nunca llegó a la bitácora (búfer lleno o caída)
+    db['scan_events'].docs = [
+        make_event("u1", "scanner-1", RESULT_CHECK_IN, ts=t0, attendance_id="a1", user_name="Ana"),
+        make_event("u2", "scanner-1", RESULT_CHECK_IN, ts=t0, attendance_id="a2", user_name="Luis"),
+    ]
+    stored_out = (t0 + timedelta(hours=6)).isoformat()
+    db['attendance'].docs = [{
+        "id": "a1", "user_id": "u1", "user_name": "Ana", "date": "2025-03-03",
+        "check_in_time": t0.isoformat(), "check_out_time": stored_out, "status": "present",
+    }]
+
+    result = asyncio.run(replay(ScanEventLog(db), FakeStore(db), None, "2025-03-03", "2025-03-03"))
+    assert result['records'] == 2
+    kept, inserted = db['attendance'].docs
+    assert kept['check_out_time'] == stored_out
+    assert inserted['id'] == "a2" and inserted['user_name'] == "Luis" and inserted['check_out_time'] is None
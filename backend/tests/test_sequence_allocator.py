@@ -0,0 +1,80 @@
+import asyncio
+import re
+import sys
+sys.path.append('..')
+from sequence_allocator import SequenceAllocator, STUDENT_SEQUENCE, format_student_id, max_existing_student_number
+
+
+class FakeCounters:
+    """Colección `counters` mínima: $inc, $max y upsert por _id"""
+
+    def __init__(self):
+        self.docs = {}
+
+    async def find_one(self, query):
+        doc = self.docs.get(query['_id'])
+        return dict(doc) if doc else None
+
+    async def find_one_and_update(self, query, update, upsert=False, return_document=None):
+        # Sin await entre leer y escribir: atómico como en MongoDB
+        doc = self.docs.setdefault(query['_id'], {"_id": query['_id'], "seq": 0})
+        doc['seq'] += update['$inc']['seq']
+        return dict(doc)
+
+    async def update_one(self, query, update, upsert=False):
+        doc = self.docs.setdefault(query['_id'], {"_id": query['_id'], "seq": 0})
+        doc['seq'] = max(doc['seq'], update['$max']['seq'])
+
+
+class FakeUsers:
+    def __init__(self, docs):
+        self.docs = docs
+
+    async def _iterate(self, pattern):
+        for doc in self.docs:
+            if re.match(pattern, doc.get('student_id') or ''):
+                await asyncio.sleep(0)
+                yield doc
+
+    def find(self, query, projection=None):
+        return self._iterate(query['student_id']['$regex'])
+
+
+class FakeDB(dict):
+    def __init__(self, users=()):
+        super().__init__(counters=FakeCounters())
+        self.users = FakeUsers(list(users))
+
+
+def test_format_student_id():
+    """Test el código tiene al menos cuatro dígitos"""
+    assert format_student_id(7) == "LISFA-0007"
+    assert format_student_id(12345) == "LISFA-12345"
+
+
+def test_seed_and_concurrent_blocks():
+    """Test el contador arranca en el mayor código existente y los bloques concurrentes no se solapan"""
+    db = FakeDB([{"student_id": "LISFA-0041"}, {"student_id": "LISFA-0009"}, {"student_id": "OTRO-9999"}])
+    allocator = SequenceAllocator(db)
+    allocator.register_seed(STUDENT_SEQUENCE, lambda: max_existing_student_number(db))
+
+    async def run():
+        assert await allocator.reserve(STUDENT_SEQUENCE, 0) == []
+        blocks = await asyncio.gather(*(allocator.reserve(STUDENT_SEQUENCE, 3) for _ in range(4)))
+        single = await allocator.next(STUDENT_SEQUENCE)
+        return blocks, single
+
+    blocks, single = asyncio.run(run())
+    numbers = sorted(n for block in blocks for n in block)
+    assert numbers == list(range(42, 54))
+    assert all(block == list(range(block[0], block[0] + 3)) for block in blocks)
+    assert single == 54
+
+
+def test_existing_counter_is_not_reseeded():
+    """Test un contador existente no se reinicializa: no se reutilizan códigos de usuarios eliminados"""
+    db = FakeDB([{"student_id": "LISFA-0005"}])
+    db['counters'].docs[STUDENT_SEQUENCE] = {"_id": STUDENT_SEQUENCE, "seq": 100}
+    allocator = SequenceAllocator(db)
+    allocator.register_seed(STUDENT_SEQUENCE, lambda: max_existing_student_number(db))
+    assert asyncio.run(allocator.next(STUDENT_SEQUENCE)) == 101
@@ -0,0 +1,106 @@
+import sys
+sys.path.append('..')
+import os
+import time
+import asyncio
+import pytest
+from types import SimpleNamespace
+from starlette.datastructures import Headers
+from static_assets import (
+    UploadError, RangeNotSatisfiable, parse_range, save_upload, is_hashed, image_extension,
+    collect_uploads, ranged_file_response
+)
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = list(docs)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self.docs:
+            raise StopAsyncIteration
+        return dict(self.docs.pop(0))
+
+
+class FakeUsers:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def find(self, query, projection=None):
+        return FakeCursor(d for d in self.docs if d.get('photo_url', '').startswith('/static/uploads/'))
+
+    async def update_one(self, query, update):
+        for doc in self.docs:
+            if all(doc.get(k) == v for k, v in query.items()):
+                doc.update(update['$set'])
+
+
+def test_parse_range():
+    """Test rangos simples, abiertos y por sufijo; varios rangos o sintaxis inválida envían todo"""
+    assert parse_range("bytes=0-99", 1000) == (0, 99)
+    assert parse_range("bytes=500-", 1000) == (500, 999)
+    assert parse_range("bytes=-100", 1000) == (900, 999)
+    assert parse_range("bytes=900-5000", 1000) == (900, 999)
+    assert parse_range("bytes=0-1,5-9", 1000) is None
+    assert parse_range("items=0-1", 1000) is None
+    assert parse_range("bytes=abc", 1000) is None
+    with pytest.raises(RangeNotSatisfiable):
+        parse_range("bytes=1000-", 1000)
+
+
+def test_hashed_upload_and_resumed_download(tmp_path):
+    """Test el nombre depende del contenido y una descarga cortada se retoma con If-Range"""
+    first = save_upload(b"foto-1", "user-1", image_extension("retrato.JPEG"), tmp_path)
+    assert first.startswith("/static/uploads/user-1.") and first.endswith(".jpg")
+    assert is_hashed(first.rsplit('/', 1)[-1]) and not is_hashed("user-1.jpg")
+    assert save_upload(b"foto-1", "user-1", "jpg", tmp_path) == first
+    assert save_upload(b"foto-2", "user-1", "jpg", tmp_path) != first
+    with pytest.raises(UploadError):
+        image_extension("script.svg")
+
+    path = tmp_path / "proyecto.zip"
+    path.write_bytes(bytes(range(256)) * 4)
+    full = ranged_file_response(path, Headers({}), "proyecto.zip", "application/zip")
+    etag = full.headers['etag']
+    assert full.status_code == 200 and full.headers['accept-ranges'] == 'bytes'
+
+    resumed = ranged_file_response(path, Headers({'range': 'bytes=1000-', 'if-range': etag}), "proyecto.zip", "application/zip")
+    assert resumed.status_code == 206
+    assert resumed.headers['content-range'] == "bytes 1000-1023/1024"
+    assert resumed.headers['content-length'] == "24"
+
+    # El archivo cambió: If-Range no coincide y se envía completo
+    stale = ranged_file_response(path, Headers({'range': 'bytes=1000-', 'if-range': '"otro"'}), "proyecto.zip", "application/zip")
+    assert stale.status_code == 200
+
+    beyond = ranged_file_response(path, Headers({'range': 'bytes=5000-'}), "proyecto.zip", "application/zip")
+    assert beyond.status_code == 416 and beyond.headers['content-range'] == "bytes */1024"
+    assert ranged_file_response(path, Headers({'if-none-match': etag}), "proyecto.zip", "application/zip").status_code == 304
+
+
+def test_collect_uploads(tmp_path):
+    """Test el recolector migra fotos con nombre fijo y borra solo las huérfanas antiguas"""
+    legacy = tmp_path / "u1.png"
+    legacy.write_bytes(b"legacy")
+    kept = save_upload(b"actual", "u2", "png", tmp_path)
+    orphan = tmp_path / "u3.1234567890abcdef.png"
+    orphan.write_bytes(b"vieja")
+    recent = tmp_path / "u4.png"
+    recent.write_bytes(b"recien subida")
+    old = time.time() - 2 * 86400
+    for path in (legacy, orphan):
+        os.utime(path, (old, old))
+
+    users = [{"id": "u1", "photo_url": "/static/uploads/u1.png"}, {"id": "u2", "photo_url": kept}]
+    db = SimpleNamespace(users=FakeUsers(users))
+
+    report = asyncio.run(collect_uploads([db], tmp_path))
+    user = users[0]
+    assert report['migrated'] == 1
+    assert is_hashed(user['photo_url'].rsplit('/', 1)[-1])
+    assert (tmp_path / user['photo_url'].rsplit('/', 1)[-1]).read_bytes() == b"legacy"
+    assert sorted(report['deleted']) == ["u1.png", orphan.name]
+    assert recent.exists() and (tmp_path / kept.rsplit('/', 1)[-1]).exists()
@@ -0,0 +1,88 @@
+import sys
+sys.path.append('..')
+import json
+import asyncio
+import pytest
+from tenants import TenantRegistry, TenantConfigError, load_tenant_configs, ISSUE_STUDENT_ID_NOT_UNIQUE
+
+
+def write_config(tmp_path, data):
+    path = tmp_path / "tenants.json"
+    path.write_text(json.dumps(data))
+    return str(path)
+
+
+def make_registry(tmp_path):
+    configs, default_id = load_tenant_configs(write_config(tmp_path, {"tenants": [
+        {"id": "lisfa", "db_name": "lisfa_attendance"},
+        {"id": "norte", "db_name": "lisfa_norte", "name": "Campus Norte", "hosts": ["Norte.Example.com"]},
+    ]}), "unused")
+    return TenantRegistry(configs, default_id, "mongodb://localhost:27017", [])
+
+
+def scope(headers=(), query=b""):
+    return {"type": "http", "headers": [(k.encode(), v.encode()) for k, v in headers], "query_string": query}
+
+
+def test_single_tenant_without_file(tmp_path):
+    """Test sin archivo de campus hay uno solo sobre DB_NAME"""
+    configs, default_id = load_tenant_configs(str(tmp_path / "missing.json"), "lisfa_attendance")
+    assert [c.db_name for c in configs] == ["lisfa_attendance"]
+    assert default_id == configs[0].id
+
+
+def test_invalid_configs_rejected(tmp_path):
+    """Test ids inválidos, bases compartidas y campos desconocidos se rechazan"""
+    invalid = [
+        {"tenants": [{"id": "Campus Norte", "db_name": "a"}]},
+        {"tenants": [{"id": "a", "db_name": "x"}, {"id": "b", "db_name": "x"}]},
+        {"tenants": [{"id": "a", "db_name": "x", "colour": "red"}]},
+        {"tenants": [{"id": "a", "db_name": "x"}], "default": "b"},
+    ]
+    for data in invalid:
+        with pytest.raises(TenantConfigError):
+            load_tenant_configs(write_config(tmp_path, data), "unused")
+
+
+def test_resolve_and_isolation(tmp_path):
+    """Test el campus se resuelve por cabecera, parámetro o host, y cada uno tiene sus servicios"""
+    registry = make_registry(tmp_path)
+    lisfa, norte = registry.get("lisfa"), registry.get("norte")
+
+    assert registry.resolve(scope()) == (lisfa, False)
+    assert registry.resolve(scope([("x-tenant-id", "norte")])) == (norte, True)
+    assert registry.resolve(scope(query=b"tenant=norte")) == (norte, True)
+    assert registry.resolve(scope([("host", "norte.example.com:8001")])) == (norte, True)
+    assert registry.resolve(scope([("x-tenant-id", "sur")])) == (None, True)
+
+    # En un host asignado, la cabecera o el parámetro no pueden saltar a otro campus
+    norte_host = ("host", "norte.example.com")
+    assert registry.resolve(scope([norte_host, ("x-tenant-id", "norte")])) == (norte, True)
+    assert registry.resolve(scope([norte_host, ("x-tenant-id", "lisfa")])) == (None, True)
+    assert registry.resolve(scope([norte_host], query=b"tenant=lisfa")) == (None, True)
+
+    # Mismo clúster: un solo cliente, bases y cachés separadas
+    assert lisfa.database.client is norte.database.client
+    assert lisfa.db.name == "lisfa_attendance" and norte.db.name == "lisfa_norte"
+    assert lisfa.response_cache is not norte.response_cache
+    assert lisfa.user_search is not norte.user_search
+    assert norte.email_branding.institution_name == "Campus Norte"
+    registry.close()
+
+
+def test_missing_unique_index_degrades_health(tmp_path):
+    """Test un campus sin índice único de student_id deja /health degradado"""
+    registry = make_registry(tmp_path)
+
+    async def healthy():
+        return {'status': 'healthy', 'ping_ms': 1.0}
+
+    for cluster in registry._clusters.values():
+        cluster.health = healthy
+    assert asyncio.run(registry.health()) == {'status': 'healthy', 'ping_ms': 1.0}
+
+    registry.get("norte").issues.append(ISSUE_STUDENT_ID_NOT_UNIQUE)
+    health = asyncio.run(registry.health())
+    assert health['status'] == 'degraded'
+    assert health['issues'] == {"norte": [ISSUE_STUDENT_ID_NOT_UNIQUE]}
+    registry.close()
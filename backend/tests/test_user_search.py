@@ -0,0 +1,67 @@
+import sys
+sys.path.append('..')
+import asyncio
+from types import SimpleNamespace
+from user_search import UserSearchIndex, normalize
+
+
+def _index():
+    index = UserSearchIndex()
+    index.build([
+        {"id": "1", "full_name": "José Hernández", "email": "jose.h@lisfa.edu", "role": "student",
+         "student_id": "LISFA-0001", "category": "1ro. Primaria"},
+        {"id": "2", "full_name": "Josefina Peña", "email": "jpena@gmail.com", "role": "parent"},
+        {"id": "3", "full_name": "Ana Ortiz", "email": "ana@lisfa.edu", "role": "teacher", "category": "Docente"},
+    ])
+    return index
+
+
+def test_accent_insensitive_prefix_search():
+    """Test 'jose' encuentra 'José' y los prefijos ordenan después de la palabra exacta"""
+    assert normalize("José Peña") == "jose pena"
+    index = _index()
+    assert [u['id'] for u in index.search("jose")] == ["1", "2"]
+    assert [u['id'] for u in index.search("JOSÉ her")] == ["1"]
+    assert [u['id'] for u in index.search("jose", roles=["parent"])] == ["2"]
+    assert [u['id'] for u in index.search("primaria")] == ["1"]
+    assert index.search("zz") == []
+
+
+def test_codes_and_typos():
+    """Test códigos con o sin guion y coincidencias aproximadas por trigramas"""
+    index = _index()
+    assert [u['id'] for u in index.search("lisfa-0001")] == ["1"]
+    assert [u['id'] for u in index.search("lisfa0001")] == ["1"]
+    assert [u['id'] for u in index.search("hernadez")] == ["1"]
+
+
+def test_index_follows_mutations():
+    """Test altas, cambios y bajas actualizan el índice sin reconstruirlo"""
+    index = _index()
+    index.upsert({"id": "1", "full_name": "Pedro Alvarado"})
+    assert [u['id'] for u in index.search("hernandez")] == []
+    result = index.search("pedro")
+    assert [u['id'] for u in result] == ["1"] and result[0]['student_id'] == "LISFA-0001"
+    index.remove("2")
+    assert [u['id'] for u in index.search("josefina")] == []
+    index.upsert({"id": "4", "full_name": "Zoe Núñez", "role": "student"})
+    assert [u['id'] for u in index.search("nunez")] == ["4"]
+
+
+def test_changes_during_reload_are_kept():
+    """Test un alta o baja que llega mientras se lee la instantánea no se pierde al recargar"""
+    index = _index()
+    snapshot = [{"id": "1", "full_name": "José Hernández"}, {"id": "2", "full_name": "Josefina Peña"}]
+
+    class SlowCursor:
+        async def to_list(self, length):
+            # La instantánea ya se leyó; los cambios llegan antes de reemplazar el índice
+            index.upsert({"id": "5", "full_name": "Nuevo Usuario", "role": "student"})
+            index.remove("2")
+            return [dict(u) for u in snapshot]
+
+    db = SimpleNamespace(users=SimpleNamespace(find=lambda query, projection: SlowCursor()))
+    asyncio.run(index.load(db))
+    assert [u['id'] for u in index.search("nuevo")] == ["5"]
+    assert index.search("josefina") == []
+    assert index._journals == []
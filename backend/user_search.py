@@ -0,0 +1,304 @@
+import os
+import re
+import time
+import asyncio
+import logging
+import unicodedata
+import heapq
+from bisect import bisect_left, insort
+from typing import Dict, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+# Cada proceso tiene su índice: se recarga completo pasado este tiempo para
+# recoger cambios hechos por otros workers
+USER_SEARCH_REFRESH_SECONDS = float(os.environ.get('USER_SEARCH_REFRESH_SECONDS', '300'))
+# Similitud mínima (trigramas compartidos / trigramas del término) para coincidencias aproximadas
+USER_SEARCH_MIN_SIMILARITY = float(os.environ.get('USER_SEARCH_MIN_SIMILARITY', '0.5'))
+
+# Campos indexados y su peso en el orden de resultados
+SEARCH_FIELDS = {'full_name': 4, 'student_id': 3, 'email': 2, 'category': 1}
+RESULT_FIELDS = ['id', 'full_name', 'email', 'role', 'student_id', 'category', 'grade', 'photo_url']
+
+# Puntaje por término: palabra exacta, prefijo o aproximado (trigramas)
+SCORE_EXACT = 3.0
+SCORE_PREFIX = 2.0
+SCORE_FUZZY = 1.0
+
+# Con pocos candidatos, los términos siguientes se comparan contra sus palabras
+# en vez de recorrer el índice
+CANDIDATE_SCAN_LIMIT = 256
+
+_SEPARATORS = re.compile(r'[^0-9a-z]+')
+
+
+def normalize(text: str) -> str:
+    """Minúsculas sin acentos: 'José Peña' -> 'jose pena'"""
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    return ''.join(c for c in decomposed if not unicodedata.combining(c)).casefold()
+
+
+def tokenize(text: str, joined: bool = False) -> List[str]:
+    """
+    Palabras normalizadas. Con `joined`, los códigos como LISFA-0001 también
+    se indexan unidos ("lisfa0001") para encontrarlos escritos sin guion.
+    """
+    normalized = normalize(text).strip()
+    words = [w for w in _SEPARATORS.split(normalized) if w]
+    if joined and len(words) > 1 and '@' not in normalized and ' ' not in normalized:
+        words.append(''.join(words))
+    return words
+
+
+def trigrams(word: str) -> Set[str]:
+    padded = f"  {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class UserSearchIndex:
+    """
+    Índice en memoria para búsqueda mientras se escribe (typeahead) sobre
+    nombre, email, código de estudiante y categoría, sin distinguir acentos.
+
+    - Prefijos: lista ordenada de palabras + bisect ("jos" -> "jose", "josefina").
+    - Trigramas: para errores de tipeo o fragmentos ("hernadez" -> "hernandez").
+
+    Cada término de la consulta debe coincidir con alguna palabra del usuario;
+    los resultados se ordenan por tipo de coincidencia y peso del campo.
+    """
+
+    def __init__(self, refresh_seconds: float = USER_SEARCH_REFRESH_SECONDS):
+        self.refresh_seconds = refresh_seconds
+        self._users: Dict[str, dict] = {}
+        self._sort_names: Dict[str, str] = {}                 # user_id -> nombre normalizado (desempate)
+        self._user_words: Dict[str, Dict[str, int]] = {}   # user_id -> palabra -> peso del campo
+        self._postings: Dict[str, Set[str]] = {}            # palabra -> user_ids
+        self._words: List[str] = []                          # palabras ordenadas (prefijos)
+        self._trigrams: Dict[str, Set[str]] = {}             # trigrama -> palabras
+        self._loaded_at: Optional[float] = None
+        self._reload_task: Optional[asyncio.Task] = None
+        self._bulk = False
+        # Cambios recibidos durante cada recarga en curso (se reaplican antes del cambio)
+        self._journals: List[list] = []
+
+    def __len__(self):
+        return len(self._users)
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded_at is not None
+
+    async def load(self, db):
+        """
+        Reconstruye el índice desde la colección de usuarios (fuera del event loop).
+        Los upsert/remove que llegan mientras tanto se anotan y se reaplican al
+        índice nuevo: la instantánea pudo leerse antes de esos cambios.
+        """
+        projection = {"_id": 0, **{field: 1 for field in RESULT_FIELDS}}
+        journal: list = []
+        self._journals.append(journal)
+        try:
+            users = await db.users.find({}, projection).to_list(None)
+            fresh = UserSearchIndex(self.refresh_seconds)
+            await asyncio.get_running_loop().run_in_executor(None, fresh.build, users)
+        finally:
+            self._journals.remove(journal)
+        for op, value in journal:
+            if op == 'upsert':
+                fresh.upsert(value)
+            else:
+                fresh.remove(value)
+        self._users, self._sort_names = fresh._users, fresh._sort_names
+        self._user_words, self._postings = fresh._user_words, fresh._postings
+        self._words, self._trigrams, self._loaded_at = fresh._words, fresh._trigrams, fresh._loaded_at
+        logger.info(f"Índice de búsqueda de usuarios cargado: {len(users)} usuarios")
+
+    def build(self, users: List[dict]):
+        self._users.clear()
+        self._sort_names.clear()
+        self._user_words.clear()
+        self._postings.clear()
+        self._words.clear()
+        self._trigrams.clear()
+        # Carga masiva: se ordena la lista de palabras una sola vez al final
+        self._bulk = True
+        try:
+            for user in users:
+                self.upsert(user)
+        finally:
+            self._bulk = False
+            self._words = sorted(self._postings)
+        self._loaded_at = time.monotonic()
+
+    async def ensure_fresh(self, db):
+        """Carga el índice si no existe; si está vencido lo recarga en segundo plano"""
+        if not self.loaded:
+            await self.load(db)
+        elif time.monotonic() - self._loaded_at > self.refresh_seconds:
+            if self._reload_task is None or self._reload_task.done():
+                self._reload_task = asyncio.get_running_loop().create_task(self.load(db))
+
+    def upsert(self, user: dict):
+        """Agrega o actualiza un usuario (solo cambian las palabras que difieren)"""
+        for journal in self._journals:
+            journal.append(('upsert', dict(user)))
+        user_id = user['id']
+        record = {field: user.get(field) for field in RESULT_FIELDS}
+        if user_id in self._users:
+            record = {**self._users[user_id], **{k: v for k, v in record.items() if k in user}}
+        self._users[user_id] = record
+        self._sort_names[user_id] = normalize(record.get('full_name') or '')
+
+        words: Dict[str, int] = {}
+        for field, weight in SEARCH_FIELDS.items():
+            value = record.get(field) or (record.get('grade') if field == 'category' else None)
+            for word in tokenize(str(value or ''), joined=True):
+                words[word] = max(words.get(word, 0), weight)
+
+        old = self._user_words.get(user_id, {})
+        for word in old.keys() - words.keys():
+            self._unlink(word, user_id)
+        for word in words.keys() - old.keys():
+            self._link(word, user_id)
+        self._user_words[user_id] = words
+
+    def remove(self, user_id: str):
+        for journal in self._journals:
+            journal.append(('remove', user_id))
+        for word in self._user_words.pop(user_id, {}):
+            self._unlink(word, user_id)
+        self._users.pop(user_id, None)
+        self._sort_names.pop(user_id, None)
+
+    def _link(self, word: str, user_id: str):
+        postings = self._postings.get(word)
+        if postings is None:
+            postings = self._postings[word] = set()
+            if not self._bulk:
+                insort(self._words, word)
+            for gram in trigrams(word):
+                self._trigrams.setdefault(gram, set()).add(word)
+        postings.add(user_id)
+
+    def _unlink(self, word: str, user_id: str):
+        postings = self._postings.get(word)
+        if postings is None:
+            return
+        postings.discard(user_id)
+        if not postings:
+            del self._postings[word]
+            del self._words[bisect_left(self._words, word)]
+            for gram in trigrams(word):
+                words = self._trigrams.get(gram)
+                if words is not None:
+                    words.discard(word)
+                    if not words:
+                        del self._trigrams[gram]
+
+    def _estimate(self, term: str) -> int:
+        """Usuarios (aprox.) bajo el prefijo: los términos más selectivos se evalúan primero"""
+        total = 0
+        words = self._words
+        for i in range(bisect_left(words, term), len(words)):
+            if not words[i].startswith(term) or total > CANDIDATE_SCAN_LIMIT:
+                break
+            total += len(self._postings[words[i]])
+        return total
+
+    def _score_candidates(self, term: str, candidates: Dict[str, float]) -> Dict[str, float]:
+        """Puntaje del término solo para los candidatos, revisando sus propias palabras"""
+        grams = trigrams(term) if len(term) >= 3 else None
+        scores: Dict[str, float] = {}
+        for user_id in candidates:
+            best = 0.0
+            for word, weight in self._user_words[user_id].items():
+                if word.startswith(term):
+                    score = (SCORE_EXACT if word == term else SCORE_PREFIX) + weight / 10
+                elif grams:
+                    similarity = len(grams & trigrams(word)) / len(grams)
+                    if similarity < USER_SEARCH_MIN_SIMILARITY:
+                        continue
+                    score = SCORE_FUZZY * similarity + weight / 10
+                else:
+                    continue
+                best = max(best, score)
+            if best:
+                scores[user_id] = best
+        return scores
+
+    def _term_matches(self, term: str) -> Dict[str, float]:
+        """user_id -> puntaje del término (exacto > prefijo > aproximado)"""
+        scores: Dict[str, float] = {}
+        words = self._words
+        for i in range(bisect_left(words, term), len(words)):
+            word = words[i]
+            if not word.startswith(term):
+                break
+            # Coincidencias en nombre pesan más que en email o categoría
+            base = SCORE_EXACT if word == term else SCORE_PREFIX
+            for user_id in self._postings[word]:
+                score = base + self._user_words[user_id][word] / 10
+                if score > scores.get(user_id, 0):
+                    scores[user_id] = score
+
+        if scores or len(term) < 3:
+            return scores
+
+        grams = trigrams(term)
+        shared: Dict[str, int] = {}
+        for gram in grams:
+            for word in self._trigrams.get(gram, ()):
+                shared[word] = shared.get(word, 0) + 1
+        for word, count in shared.items():
+            similarity = count / len(grams)
+            if similarity < USER_SEARCH_MIN_SIMILARITY:
+                continue
+            for user_id in self._postings[word]:
+                score = SCORE_FUZZY * similarity + self._user_words[user_id][word] / 10
+                if score > scores.get(user_id, 0):
+                    scores[user_id] = score
+        return scores
+
+    def search(
+        self,
+        query: str,
+        roles: Optional[List[str]] = None,
+        category: Optional[str] = None,
+        limit: int = 10
+    ) -> List[dict]:
+        """Los `limit` usuarios con mayor puntaje; todos los términos deben coincidir"""
+        terms = tokenize(query)
+        if not terms:
+            return []
+
+        totals: Optional[Dict[str, float]] = None
+        for term in sorted(dict.fromkeys(terms), key=self._estimate):
+            if totals is not None and len(totals) <= CANDIDATE_SCAN_LIMIT:
+                scores = self._score_candidates(term, totals)
+            else:
+                scores = self._term_matches(term)
+            if totals is None:
+                totals = scores
+            else:
+                totals = {uid: totals[uid] + s for uid, s in scores.items() if uid in totals}
+            if not totals:
+                return []
+
+        candidates = []
+        for user_id, score in totals.items():
+            user = self._users[user_id]
+            if roles and user.get('role') not in roles:
+                continue
+            if category and (user.get('category') or user.get('grade')) != category:
+                continue
+            candidates.append((-score, self._sort_names[user_id], user_id))
+        top = heapq.nsmallest(limit, candidates)
+        return [{**self._users[user_id], 'score': round(-score, 3)} for score, _, user_id in top]
+
+    def stats(self) -> dict:
+        return {
+            'users': len(self._users),
+            'words': len(self._words),
+            'trigrams': len(self._trigrams),
+            'age_seconds': round(time.monotonic() - self._loaded_at, 1) if self.loaded else None,
+        }
@@ -9,6 +9,19 @@ import { toast } from "sonner";
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
 
+// Identificador estable de este equipo lector (queda en la bitácora de lecturas)
+const getDeviceId = () => {
+  let deviceId = localStorage.getItem("scanner_device_id");
+  if (!deviceId) {
+    deviceId = `scanner-${Math.random().toString(36).slice(2, 10)}`;
+    localStorage.setItem("scanner_device_id", deviceId);
+  }
+  return deviceId;
+};
+
+const newIdempotencyKey = () =>
+  window.crypto?.randomUUID?.() || `${Date.now()}-${Math.random().toString(36).slice(2)}`;
+
 const USBQRScanner = ({ user }) => {
   const [recentScans, setRecentScans] = useState([]);
   const [isActive, setIsActive] = useState(true);
@@ -85,10 +98,23 @@ const USBQRScanner = ({ user }) => {
     setScannerStatus("scanning");
     
     try {
-      const response = await axios.post(`${API}/attendance`, {
+      const payload = {
         qr_data: qrData.trim(),
         recorded_by: user?.id || "system"
-      });
+      };
+      // La misma clave en el reintento: el servidor devuelve la respuesta original
+      const config = {
+        headers: { "X-Device-Id": getDeviceId(), "Idempotency-Key": newIdempotencyKey() },
+        timeout: 8000
+      };
+      let response;
+      try {
+        response = await axios.post(`${API}/attendance`, payload, config);
+      } catch (err) {
+        // Sin respuesta (timeout o red): reintentar una vez
+        if (err.response) throw err;
+        response = await axios.post(`${API}/attendance`, payload, config);
+      }
 
       const attendance = response.data;
       
@@ -117,6 +143,19 @@ const USBQRScanner = ({ user }) => {
       setTimeout(() => setScannerStatus("waiting"), 2000);
       
     } catch (error) {
+      // Lectura repetida del escáner: el backend la ignora, no es un error
+      if (error.response?.status === 409) {
+        toast.warning(error.response.data?.detail || "Lectura duplicada ignorada", { duration: 2000 });
+        setScannerStatus("waiting");
+        return;
+      }
+      // Servidor saturado o escáner enviando demasiado rápido: volver a leer en unos segundos
+      if (error.response?.status === 429) {
+        const retryAfter = error.response.headers?.["retry-after"] || 1;
+        toast.warning(`${error.response.data?.detail || "Servicio ocupado"} (${retryAfter}s)`, { duration: 3000 });
+        setScannerStatus("waiting");
+        return;
+      }
       setScannerStatus("error");
       const message = error.response?.data?.detail || "Error al registrar asistencia";
       toast.error(message, { duration: 4000 });
@@ -0,0 +1,93 @@
+import { useState, useEffect, useRef } from "react";
+import axios from "axios";
+import { Input } from "@/components/ui/input";
+import { Search } from "lucide-react";
+
+const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
+const API = `${BACKEND_URL}/api`;
+
+// Espera entre teclas antes de consultar el servidor
+const SEARCH_DELAY_MS = 200;
+
+/**
+ * Búsqueda de usuarios mientras se escribe (GET /api/users/search).
+ * No descarga el listado completo: el servidor devuelve los mejores resultados.
+ */
+const UserSearch = ({ role, placeholder = "Buscar por nombre, email o código", limit = 10, onSelect, renderItem, selectedIds = [] }) => {
+  const [query, setQuery] = useState("");
+  const [results, setResults] = useState([]);
+  const [searching, setSearching] = useState(false);
+  const latestRequest = useRef(0);
+
+  useEffect(() => {
+    const q = query.trim();
+    if (!q) {
+      setResults([]);
+      return;
+    }
+    const timer = setTimeout(async () => {
+      const requestId = ++latestRequest.current;
+      setSearching(true);
+      try {
+        const response = await axios.get(`${API}/users/search`, { params: { q, role, limit } });
+        // Ignorar respuestas de consultas ya reemplazadas por otra tecla
+        if (requestId === latestRequest.current) {
+          setResults(response.data);
+        }
+      } catch (error) {
+        if (requestId === latestRequest.current) {
+          setResults([]);
+        }
+      } finally {
+        if (requestId === latestRequest.current) {
+          setSearching(false);
+        }
+      }
+    }, SEARCH_DELAY_MS);
+    return () => clearTimeout(timer);
+  }, [query, role, limit]);
+
+  return (
+    <div className="space-y-1">
+      <div className="relative">
+        <Search className="absolute left-3 top-3 h-4 w-4 text-gray-400" />
+        <Input
+          className="pl-9"
+          placeholder={placeholder}
+          value={query}
+          onChange={(e) => setQuery(e.target.value)}
+        />
+      </div>
+      {query.trim() && (
+        <div className="max-h-64 overflow-y-auto border rounded-lg p-1 space-y-1 bg-white">
+          {searching && results.length === 0 ? (
+            <p className="text-sm text-gray-500 p-2">Buscando...</p>
+          ) : results.length === 0 ? (
+            <p className="text-sm text-gray-500 p-2">Sin resultados</p>
+          ) : (
+            results.map((u) => (
+              <div
+                key={u.id}
+                onClick={() => onSelect(u)}
+                className={`p-2 rounded-md cursor-pointer transition-colors ${
+                  selectedIds.includes(u.id) ? "bg-green-100" : "hover:bg-gray-100"
+                }`}
+              >
+                {renderItem ? renderItem(u) : (
+                  <>
+                    <p className="font-medium text-sm">{u.full_name}</p>
+                    <p className="text-xs text-gray-500">
+                      {[u.student_id, u.category || u.grade, u.email].filter(Boolean).join(" · ")}
+                    </p>
+                  </>
+                )}
+              </div>
+            ))
+          )}
+        </div>
+      )}
+    </div>
+  );
+};
+
+export default UserSearch;
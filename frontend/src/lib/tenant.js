@@ -0,0 +1,18 @@
+import axios from "axios";
+
+// Campus de esta instalación del frontend. Sin valor, el backend usa el
+// campus de su host o el campus por defecto.
+export const TENANT_ID = process.env.REACT_APP_TENANT_ID || "";
+
+// Las peticiones con axios llevan el campus en la cabecera X-Tenant-Id
+export function configureTenant() {
+  if (TENANT_ID) {
+    axios.defaults.headers.common["X-Tenant-Id"] = TENANT_ID;
+  }
+}
+
+// Los enlaces de descarga no envían cabeceras: el campus va como ?tenant=
+export function withTenant(url) {
+  if (!TENANT_ID) return url;
+  return `${url}${url.includes("?") ? "&" : "?"}tenant=${encodeURIComponent(TENANT_ID)}`;
+}
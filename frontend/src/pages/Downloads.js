@@ -3,6 +3,7 @@ import { Card, CardContent, CardHeader, CardTitle } from "../components/ui/card"
 import { Button } from "../components/ui/button";
 import { Download, FileText, Package } from "lucide-react";
 import { toast } from "sonner";
+import { withTenant } from "../lib/tenant";
 
 const API = process.env.REACT_APP_BACKEND_URL;
 
@@ -16,7 +17,7 @@ export default function Downloads() {
 
   const fetchStudents = async () => {
     try {
-      const res = await fetch(`${API}/api/users?role=student`);
+      const res = await fetch(withTenant(`${API}/api/users?role=student`));
       const data = await res.json();
       setStudents(data);
     } catch (error) {
@@ -27,7 +28,7 @@ export default function Downloads() {
   const downloadZip = () => {
     setLoading(true);
     const link = document.createElement("a");
-    link.href = `${API}/api/download/proyecto`;
+    link.href = withTenant(`${API}/api/download/proyecto`);
     link.download = "proyecto_LISFA.zip";
     document.body.appendChild(link);
     link.click();
@@ -38,7 +39,7 @@ export default function Downloads() {
 
   const downloadCarnet = (studentId, studentName) => {
     const link = document.createElement("a");
-    link.href = `${API}/api/cards/generate/${studentId}`;
+    link.href = withTenant(`${API}/api/cards/generate/${studentId}`);
     link.download = `carnet_${studentName.replace(/\s+/g, "_")}.pdf`;
     document.body.appendChild(link);
     link.click();
@@ -129,7 +130,7 @@ export default function Downloads() {
             <p className="text-sm text-gray-600">Si los botones no funcionan, usa estos enlaces:</p>
             <div className="space-y-1">
               <a 
-                href={`${API}/api/download/proyecto`}
+                href={withTenant(`${API}/api/download/proyecto`)}
                 className="block text-blue-600 hover:underline"
                 target="_blank"
                 rel="noopener noreferrer"
@@ -139,7 +140,7 @@ export default function Downloads() {
               {students.map((student) => (
                 <a 
                   key={student.id}
-                  href={`${API}/api/cards/generate/${student.id}`}
+                  href={withTenant(`${API}/api/cards/generate/${student.id}`)}
                   className="block text-blue-600 hover:underline"
                   target="_blank"
                   rel="noopener noreferrer"
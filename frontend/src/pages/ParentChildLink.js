@@ -5,17 +5,18 @@ import { Card, CardContent, CardHeader, CardTitle } from "@/components/ui/card";
 import { Button } from "@/components/ui/button";
 import { Input } from "@/components/ui/input";
 import { Label } from "@/components/ui/label";
-import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from "@/components/ui/select";
 import { Dialog, DialogContent, DialogHeader, DialogTitle } from "@/components/ui/dialog";
 import { ArrowLeft, Link as LinkIcon, Users, Mail, Plus, X, UserPlus, Baby } from "lucide-react";
 import { toast } from "sonner";
+import UserSearch from "@/components/UserSearch";
 
 const API = `${process.env.REACT_APP_BACKEND_URL}/api`;
 
 export default function ParentChildLink({ user, onLogout }) {
   const navigate = useNavigate();
   const [parents, setParents] = useState([]);
-  const [students, setStudents] = useState([]);
+  // Solo los estudiantes vinculados o elegidos: id -> estudiante
+  const [students, setStudents] = useState({});
   const [linkedData, setLinkedData] = useState([]);
   const [loading, setLoading] = useState(true);
   const [isDialogOpen, setIsDialogOpen] = useState(false);
@@ -31,15 +32,12 @@ export default function ParentChildLink({ user, onLogout }) {
 
   const fetchData = async () => {
     try {
-      const [parentsRes, studentsRes] = await Promise.all([
-        axios.get(`${API}/users?role=parent`),
-        axios.get(`${API}/users?role=student`)
-      ]);
+      const parentsRes = await axios.get(`${API}/users?role=parent&fields=-qr_code`);
       setParents(parentsRes.data);
-      setStudents(studentsRes.data);
       
       // Cargar vinculaciones existentes
-      await fetchLinkedData(parentsRes.data);
+      const linked = await fetchLinkedData(parentsRes.data);
+      await fetchStudents(linked.flatMap((l) => l.studentIds));
     } catch (error) {
       toast.error("Error al cargar datos");
     } finally {
@@ -49,21 +47,42 @@ export default function ParentChildLink({ user, onLogout }) {
 
   const fetchLinkedData = async (parentsList) => {
     const linked = [];
-    for (const parent of parentsList) {
+    if (parentsList.length > 0) {
       try {
-        const res = await axios.get(`${API}/parents/${parent.id}`);
-        if (res.data && res.data.student_ids?.length > 0) {
-          linked.push({
-            parent,
-            studentIds: res.data.student_ids,
-            email: res.data.notification_email
-          });
+        // Una sola petición para todas las vinculaciones
+        const res = await axios.get(`${API}/parents`, {
+          params: { user_ids: parentsList.map((p) => p.id).join(",") }
+        });
+        const byUserId = Object.fromEntries(res.data.map((link) => [link.user_id, link]));
+        for (const parent of parentsList) {
+          const link = byUserId[parent.id];
+          if (link && link.student_ids?.length > 0) {
+            linked.push({
+              parent,
+              studentIds: link.student_ids,
+              email: link.notification_email
+            });
+          }
         }
       } catch (error) {
-        // Parent not linked yet
+        // Sin vinculaciones
       }
     }
     setLinkedData(linked);
+    return linked;
+  };
+
+  const fetchStudents = async (studentIds) => {
+    const ids = [...new Set(studentIds)];
+    if (ids.length === 0) return;
+    try {
+      const res = await axios.get(`${API}/users`, {
+        params: { ids: ids.join(","), fields: "id,full_name,student_id,category,grade" }
+      });
+      setStudents((prev) => ({ ...prev, ...Object.fromEntries(res.data.map((s) => [s.id, s])) }));
+    } catch (error) {
+      // Se muestran como "Desconocido"
+    }
   };
 
   const openLinkDialog = (parent = null) => {
@@ -89,6 +108,11 @@ export default function ParentChildLink({ user, onLogout }) {
     );
   };
 
+  const handleSearchSelect = (student) => {
+    setStudents((prev) => ({ ...prev, [student.id]: student }));
+    toggleStudent(student.id);
+  };
+
   const handleLinkMultiple = async () => {
     if (!selectedParent || selectedStudents.length === 0) {
       toast.error("Selecciona al menos un estudiante");
@@ -123,8 +147,7 @@ export default function ParentChildLink({ user, onLogout }) {
   };
 
   const getStudentName = (studentId) => {
-    const student = students.find(s => s.id === studentId);
-    return student?.full_name || "Desconocido";
+    return students[studentId]?.full_name || "Desconocido";
   };
 
   return (
@@ -279,32 +302,29 @@ export default function ParentChildLink({ user, onLogout }) {
             <div className="space-y-2">
               <Label>Seleccionar Hijos</Label>
               <p className="text-xs text-gray-500 mb-2">
-                Haz clic en los estudiantes que son hijos de este padre
+                Busca y haz clic en los estudiantes que son hijos de este padre
               </p>
               
-              <div className="max-h-64 overflow-y-auto border rounded-lg p-2 space-y-1">
-                {students.map((student) => (
-                  <div
-                    key={student.id}
-                    onClick={() => toggleStudent(student.id)}
-                    className={`flex items-center justify-between p-3 rounded-lg cursor-pointer transition-colors ${
-                      selectedStudents.includes(student.id)
-                        ? "bg-green-100 border-green-500 border"
-                        : "bg-gray-50 hover:bg-gray-100"
-                    }`}
-                  >
-                    <div>
-                      <p className="font-medium">{student.full_name}</p>
-                      <p className="text-sm text-gray-500">
-                        {student.category || student.grade || "Sin grado"} - {student.student_id}
-                      </p>
-                    </div>
-                    {selectedStudents.includes(student.id) && (
-                      <span className="text-green-600 font-bold">✓</span>
-                    )}
-                  </div>
-                ))}
-              </div>
+              <UserSearch
+                role="student"
+                placeholder="Buscar estudiante por nombre, código o grado"
+                selectedIds={selectedStudents}
+                onSelect={handleSearchSelect}
+              />
+
+              {selectedStudents.length > 0 && (
+                <div className="flex flex-wrap gap-1">
+                  {selectedStudents.map((sid) => (
+                    <span
+                      key={sid}
+                      className="inline-flex items-center px-2 py-0.5 rounded-full text-xs bg-green-100 text-green-800"
+                    >
+                      {getStudentName(sid)}
+                      <X className="h-3 w-3 ml-1 cursor-pointer" onClick={() => toggleStudent(sid)} />
+                    </span>
+                  ))}
+                </div>
+              )}
 
               {selectedStudents.length > 0 && (
                 <p className="text-sm text-green-600 font-medium">
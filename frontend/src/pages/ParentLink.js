@@ -1,22 +1,30 @@
-import { useState, useEffect } from "react";
+import { useState } from "react";
 import { useNavigate } from "react-router-dom";
 import axios from "axios";
 import { Card, CardContent, CardHeader, CardTitle } from "@/components/ui/card";
 import { Button } from "@/components/ui/button";
 import { Input } from "@/components/ui/input";
 import { Label } from "@/components/ui/label";
-import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from "@/components/ui/select";
-import { ArrowLeft, Link as LinkIcon, Users, Mail } from "lucide-react";
+import { ArrowLeft, Link as LinkIcon, Users, Mail, X } from "lucide-react";
 import { toast } from "sonner";
+import UserSearch from "@/components/UserSearch";
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
 
+const SelectedUser = ({ label, onClear }) => (
+  <div className="flex items-center justify-between p-3 bg-green-50 border border-green-200 rounded-lg">
+    <span className="text-sm font-medium">{label}</span>
+    <Button type="button" variant="ghost" size="icon" onClick={onClear}>
+      <X className="h-4 w-4" />
+    </Button>
+  </div>
+);
+
 const ParentLink = ({ user, onLogout }) => {
   const navigate = useNavigate();
-  const [parents, setParents] = useState([]);
-  const [students, setStudents] = useState([]);
-  const [loading, setLoading] = useState(true);
+  const [selectedParent, setSelectedParent] = useState(null);
+  const [selectedStudent, setSelectedStudent] = useState(null);
   
   const [linkData, setLinkData] = useState({
     parent_user_id: "",
@@ -24,25 +32,6 @@ const ParentLink = ({ user, onLogout }) => {
     notification_email: ""
   });
 
-  useEffect(() => {
-    fetchData();
-  }, []);
-
-  const fetchData = async () => {
-    try {
-      const [parentsRes, studentsRes] = await Promise.all([
-        axios.get(`${API}/users?role=parent`),
-        axios.get(`${API}/users?role=student`)
-      ]);
-      setParents(parentsRes.data);
-      setStudents(studentsRes.data);
-    } catch (error) {
-      toast.error("Error al cargar datos");
-    } finally {
-      setLoading(false);
-    }
-  };
-
   const handleLink = async (e) => {
     e.preventDefault();
     
@@ -73,19 +62,27 @@ const ParentLink = ({ user, onLogout }) => {
         student_id: "",
         notification_email: ""
       });
+      setSelectedParent(null);
+      setSelectedStudent(null);
       
     } catch (error) {
       toast.error(error.response?.data?.detail || "Error al vincular");
     }
   };
 
-  const handleParentChange = (parentId) => {
-    setLinkData({ ...linkData, parent_user_id: parentId });
+  const handleParentChange = (parent) => {
+    setSelectedParent(parent);
     // Auto-llenar email del padre
-    const parent = parents.find(p => p.id === parentId);
-    if (parent && !linkData.notification_email) {
-      setLinkData(prev => ({ ...prev, notification_email: parent.email }));
-    }
+    setLinkData(prev => ({
+      ...prev,
+      parent_user_id: parent.id,
+      notification_email: prev.notification_email || parent.email
+    }));
+  };
+
+  const handleStudentChange = (student) => {
+    setSelectedStudent(student);
+    setLinkData(prev => ({ ...prev, student_id: student.id }));
   };
 
   return (
@@ -118,56 +115,37 @@ const ParentLink = ({ user, onLogout }) => {
             </p>
           </CardHeader>
           <CardContent>
-            {loading ? (
-              <div className="flex justify-center py-8">
-                <div className="spinner"></div>
-              </div>
-            ) : (
-              <form onSubmit={handleLink} className="space-y-6">
+            <form onSubmit={handleLink} className="space-y-6">
                 <div className="space-y-2">
-                  <Label htmlFor="parent">Padre de Familia</Label>
-                  <div className="relative">
-                    <Users className="absolute left-3 top-3 h-5 w-5 text-gray-400 z-10" />
-                    <Select
-                      value={linkData.parent_user_id}
-                      onValueChange={handleParentChange}
-                    >
-                      <SelectTrigger className="pl-10">
-                        <SelectValue placeholder="Seleccionar padre" />
-                      </SelectTrigger>
-                      <SelectContent>
-                        {parents.map((parent) => (
-                          <SelectItem key={parent.id} value={parent.id}>
-                            {parent.full_name} ({parent.email})
-                          </SelectItem>
-                        ))}
-                      </SelectContent>
-                    </Select>
-                  </div>
-                  {parents.length === 0 && (
-                    <p className="text-sm text-orange-600">
-                      ⚠️ No hay padres registrados. Por favor registra al menos un usuario con rol "Padre de Familia".
-                    </p>
+                  <Label htmlFor="parent" className="flex items-center gap-2">
+                    <Users className="h-4 w-4 text-gray-400" /> Padre de Familia
+                  </Label>
+                  {selectedParent ? (
+                    <SelectedUser
+                      label={`${selectedParent.full_name} (${selectedParent.email})`}
+                      onClear={() => {
+                        setSelectedParent(null);
+                        setLinkData(prev => ({ ...prev, parent_user_id: "" }));
+                      }}
+                    />
+                  ) : (
+                    <UserSearch role="parent" placeholder="Buscar padre por nombre o email" onSelect={handleParentChange} />
                   )}
                 </div>
 
                 <div className="space-y-2">
                   <Label htmlFor="student">Estudiante</Label>
-                  <Select
-                    value={linkData.student_id}
-                    onValueChange={(value) => setLinkData({ ...linkData, student_id: value })}
-                  >
-                    <SelectTrigger>
-                      <SelectValue placeholder="Seleccionar estudiante" />
-                    </SelectTrigger>
-                    <SelectContent className="max-h-60">
-                      {students.map((student) => (
-                        <SelectItem key={student.id} value={student.id}>
-                          {student.full_name} - {student.student_id} ({student.category || student.grade || 'Sin grado'})
-                        </SelectItem>
-                      ))}
-                    </SelectContent>
-                  </Select>
+                  {selectedStudent ? (
+                    <SelectedUser
+                      label={`${selectedStudent.full_name} - ${selectedStudent.student_id} (${selectedStudent.category || selectedStudent.grade || 'Sin grado'})`}
+                      onClear={() => {
+                        setSelectedStudent(null);
+                        setLinkData(prev => ({ ...prev, student_id: "" }));
+                      }}
+                    />
+                  ) : (
+                    <UserSearch role="student" placeholder="Buscar estudiante por nombre, código o grado" onSelect={handleStudentChange} />
+                  )}
                 </div>
 
                 <div className="space-y-2">
@@ -201,13 +179,12 @@ const ParentLink = ({ user, onLogout }) => {
                   type="submit" 
                   className="w-full"
                   style={{ background: 'linear-gradient(135deg, #7cb342 0%, #5a9032 100%)' }}
-                  disabled={parents.length === 0 || students.length === 0}
+                  disabled={!linkData.parent_user_id || !linkData.student_id}
                 >
                   <LinkIcon className="w-4 h-4 mr-2" />
                   Vincular y Activar Notificaciones
                 </Button>
               </form>
-            )}
           </CardContent>
         </Card>
 
@@ -9,6 +9,7 @@ import { Dialog, DialogContent, DialogDescription, DialogHeader, DialogTitle, Di
 import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from "@/components/ui/select";
 import { ArrowLeft, Plus, Edit, Trash2, Download, Upload, QrCode as QrCodeIcon } from "lucide-react";
 import { toast } from "sonner";
+import { withTenant } from "@/lib/tenant";
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
@@ -108,7 +109,7 @@ const StudentManagement = ({ user, onLogout }) => {
     toast.loading("Generando carnet...", { id: 'carnet-gen' });
     
     // Crear link directo al endpoint
-    const downloadUrl = `${API}/cards/generate/${studentId}`;
+    const downloadUrl = withTenant(`${API}/cards/generate/${studentId}`);
     
     // Usar window.location o crear link temporal
     const link = document.createElement('a');
@@ -8,8 +8,9 @@ import { Label } from "@/components/ui/label";
 import { Dialog, DialogContent, DialogHeader, DialogTitle } from "@/components/ui/dialog";
 import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from "@/components/ui/select";
 import { Tabs, TabsContent, TabsList, TabsTrigger } from "@/components/ui/tabs";
-import { ArrowLeft, Plus, Edit, Trash2, Download, Users, GraduationCap, Briefcase, UserCog } from "lucide-react";
+import { ArrowLeft, Plus, Edit, Trash2, Download, Users, GraduationCap, Briefcase, UserCog, Search } from "lucide-react";
 import { toast } from "sonner";
+import { withTenant } from "@/lib/tenant";
 
 const API = `${process.env.REACT_APP_BACKEND_URL}/api`;
 
@@ -26,6 +27,9 @@ export default function UserManagement({ user, onLogout }) {
   const [categories, setCategories] = useState({ student: [], staff: [] });
   const [loading, setLoading] = useState(true);
   const [activeTab, setActiveTab] = useState("student");
+  const [searchQuery, setSearchQuery] = useState("");
+  // ids ordenados por relevancia según /users/search; null = sin búsqueda
+  const [searchIds, setSearchIds] = useState(null);
   const [isDialogOpen, setIsDialogOpen] = useState(false);
   const [editingUser, setEditingUser] = useState(null);
   const [formData, setFormData] = useState({
@@ -41,9 +45,32 @@ export default function UserManagement({ user, onLogout }) {
     fetchCategories();
   }, []);
 
+  useEffect(() => {
+    const q = searchQuery.trim();
+    if (!q) {
+      setSearchIds(null);
+      return;
+    }
+    let cancelled = false;
+    const timer = setTimeout(async () => {
+      try {
+        const response = await axios.get(`${API}/users/search`, {
+          params: { q, role: activeTab === "staff" ? "staff,admin" : activeTab, limit: 50 }
+        });
+        if (!cancelled) setSearchIds(response.data.map((u) => u.id));
+      } catch (error) {
+        if (!cancelled) setSearchIds([]);
+      }
+    }, 200);
+    return () => {
+      cancelled = true;
+      clearTimeout(timer);
+    };
+  }, [searchQuery, activeTab]);
+
   const fetchUsers = async () => {
     try {
-      const response = await axios.get(`${API}/users`);
+      const response = await axios.get(`${API}/users?fields=-qr_code`);
       // Filtrar padres - ellos no necesitan carnet
       const filteredUsers = response.data.filter(u => u.role !== 'parent');
       setUsers(filteredUsers);
@@ -97,7 +124,7 @@ export default function UserManagement({ user, onLogout }) {
 
   const downloadCarnet = (userId, userName) => {
     const link = document.createElement("a");
-    link.href = `${API}/cards/generate/${userId}`;
+    link.href = withTenant(`${API}/cards/generate/${userId}`);
     link.download = `carnet_${userName.replace(/\s+/g, "_")}.pdf`;
     document.body.appendChild(link);
     link.click();
@@ -122,13 +149,17 @@ export default function UserManagement({ user, onLogout }) {
     setIsDialogOpen(true);
   };
 
-  const filteredUsers = users.filter(u => {
+  const tabUsers = users.filter(u => {
     if (activeTab === "staff") {
       return u.role === "staff" || u.role === "admin";
     }
     return u.role === activeTab;
   });
 
+  const filteredUsers = searchIds === null
+    ? tabUsers
+    : searchIds.map((id) => tabUsers.find((u) => u.id === id)).filter(Boolean);
+
   const getCategoryOptions = () => {
     if (formData.role === "student") return categories.student || [];
     return categories.staff || [];
@@ -172,6 +203,16 @@ export default function UserManagement({ user, onLogout }) {
             </TabsTrigger>
           </TabsList>
 
+          <div className="relative max-w-md">
+            <Search className="absolute left-3 top-3 h-4 w-4 text-gray-400" />
+            <Input
+              className="pl-9"
+              placeholder="Buscar por nombre, email, código o grado"
+              value={searchQuery}
+              onChange={(e) => setSearchQuery(e.target.value)}
+            />
+          </div>
+
           {/* Contenido de cada tab */}
           {Object.keys(ROLE_CONFIG).map(role => {
             const RoleIcon = ROLE_CONFIG[role]?.icon;
@@ -188,7 +229,9 @@ export default function UserManagement({ user, onLogout }) {
                   {loading ? (
                     <p className="text-center py-8 text-gray-500">Cargando...</p>
                   ) : filteredUsers.length === 0 ? (
-                    <p className="text-center py-8 text-gray-500">No hay usuarios registrados</p>
+                    <p className="text-center py-8 text-gray-500">
+                      {searchIds === null ? "No hay usuarios registrados" : "Sin resultados"}
+                    </p>
                   ) : (
                     <div className="space-y-2">
                       {filteredUsers.map((u) => (